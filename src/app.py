@@ -1,33 +1,75 @@
 """Streamlit App to run a RAG setup with Azure Open AI and Azure Cognitive Search"""
 
+from typing import TYPE_CHECKING, Optional
+
 import streamlit as st
 
-from rag.ui.chat import display_chat, display_conversation_summary
+from rag.core.scheduler import RequestScheduler
+from rag.ui.chat import display_chat, display_chat_stream, display_conversation_summary, display_scheduler_metrics
+from rag.ui.settings import display_model_routes
 from rag.ui.settings import display_pipeline_settings
 from rag.ui.settings import display_prompt_settings
 from rag.ui.settings import display_search_settings
-from rag.utils.config import load_config, create_chatbot
+from rag.utils.config import load_config, create_chatbot, create_llm, create_scheduler, create_search_service
+from rag.utils.config import create_response_cache
+from rag.utils.config import create_model_routes, create_transaction_history
+from rag.utils.config import AZURE_OPEN_AI_CHAT_DEPLOYMENT, AZURE_OPEN_AI_FALLBACK_DEPLOYMENT, MOCK_BACKEND
+
+# the clients (and the SDKs) are loaded with the first chat request, the settings are rendered without them
+if TYPE_CHECKING:
+    from rag.core.chatbot import Chatbot
+    from rag.core.llm import LLM
+    from rag.core.response_cache import SemanticResponseCache
+    from rag.core.search import SearchService
 
 st.set_page_config(layout="wide")
 
+
+@st.cache_resource
+def get_scheduler() -> RequestScheduler:
+    """The rate limits apply to the deployments, so all sessions share one scheduler."""
+    return create_scheduler(load_config())
+
+
+@st.cache_resource
+def get_llm() -> "LLM":
+    """The clients are shared by all sessions, so that they reuse the pooled connections and caches."""
+    return create_llm(load_config(), scheduler=get_scheduler())
+
+
+@st.cache_resource
+def get_search() -> "SearchService":
+    return create_search_service(load_config(), get_llm())
+
+
+@st.cache_resource
+def get_response_cache() -> Optional["SemanticResponseCache"]:
+    """The responses are cached for all sessions, so that a similar query of another user is a hit."""
+    return create_response_cache(load_config())
+
+
+def get_bot() -> "Chatbot":
+    if "bot" not in st.session_state:
+        st.session_state.bot = create_chatbot(load_config(), llm=get_llm(), search=get_search(),
+                                              response_cache=get_response_cache())
+    return st.session_state.bot
+
+
 # session state
-if "bot" not in st.session_state:
-    st.session_state.bot = create_chatbot(load_config())
 if "chat_history" not in st.session_state:
-    st.session_state.chat_history = []
+    st.session_state.chat_history = create_transaction_history(load_config())
 
 # settings sidebar
 with st.sidebar:
     st.title("Current Conversation")
-    display_conversation_summary(len(st.session_state.chat_history),
-                                 sum([t.get_completion_tokens() for t in st.session_state.chat_history]),
-                                 sum([t.get_embedding_tokens() for t in st.session_state.chat_history]))
+    display_conversation_summary(len(st.session_state.chat_history), st.session_state.chat_history.completion_tokens,
+                                 st.session_state.chat_history.embedding_tokens)
 
     if st.session_state.chat_history:
         reset = st.button("Restart Session")
         if reset:
-            st.session_state.chat_history = []
-            st.session_state.bot.chat_history = []
+            st.session_state.chat_history.clear()
+            get_bot().reset()
             st.rerun()
 
     st.title("Settings")
@@ -39,13 +81,21 @@ with st.sidebar:
     st.title("Prompts")
     prompts = display_prompt_settings()
 
+    with st.expander("Model Routing"):
+        config = load_config()
+        display_model_routes(create_model_routes(config), config.get(AZURE_OPEN_AI_CHAT_DEPLOYMENT, MOCK_BACKEND),
+                             config.get(AZURE_OPEN_AI_FALLBACK_DEPLOYMENT) or None)
+
+    with st.expander("Request Scheduler"):
+        display_scheduler_metrics(get_scheduler().get_metrics())
+
 # main section
 st.title("RAG Tester")
 display_chat(st.session_state.chat_history)
 prompt = st.chat_input("Say something", disabled=search_settings.invalid())
 if prompt:
-    with st.spinner("Processing..."):
-        st.session_state.bot.set_prompts(prompts)
-        chat_transaction = st.session_state.bot.chat(prompt, search_settings, pipeline_settings)
-        st.session_state.chat_history.append(chat_transaction)
+    bot = get_bot()
+    bot.set_prompts(prompts)
+    chat_transaction = display_chat_stream(prompt, bot.chat_stream(prompt, search_settings, pipeline_settings))
+    st.session_state.chat_history.append(chat_transaction)
     st.rerun()
@@ -0,0 +1,32 @@
+"""Command line tool to benchmark latency and throughput of the RAG setup at fixed concurrency levels"""
+
+import argparse
+
+from rag.evaluation.batch import load_conversations
+from rag.evaluation.benchmark import BenchmarkRunner, DEFAULT_CONCURRENCY_LEVELS, PERCENTILES, TOTAL_LATENCY_COLUMN
+from rag.evaluation.benchmark import OVERHEAD_LATENCY_COLUMN, write_benchmark
+from rag.utils.config import load_config, create_chatbot
+from rag.utils.settings_file import load_settings
+
+parser = argparse.ArgumentParser(description=__doc__)
+parser.add_argument("conversations", help="JSONL file with one conversation per line")
+parser.add_argument("output", help="json file the benchmark results are written to")
+parser.add_argument("--settings", required=True, help="json file with search, pipeline and prompt settings")
+parser.add_argument("--concurrency", type=int, nargs="+", default=DEFAULT_CONCURRENCY_LEVELS,
+                    help="numbers of conversations processed concurrently, one run per level")
+parser.add_argument("--repeat", type=int, default=1, help="number of times the conversations are replayed per level")
+args = parser.parse_args()
+
+search_settings, pipeline_settings, prompts = load_settings(args.settings)
+runner = BenchmarkRunner(create_chatbot(load_config()), search_settings, pipeline_settings, prompts,
+                         concurrency_levels=args.concurrency, repeat=args.repeat)
+results = runner.run(load_conversations(args.conversations))
+write_benchmark(results, args.output)
+
+for level in results["levels"]:
+    total = level["latency"].get(TOTAL_LATENCY_COLUMN, {})
+    overhead = level["latency"].get(OVERHEAD_LATENCY_COLUMN, {})
+    percentiles = ", ".join(f"p{p} {total.get(f'p{p}') or 0:.3f}s" for p in PERCENTILES)
+    print(f"concurrency {level['concurrency']}: {level['throughput'] or 0:.2f} turns/s, {percentiles}, "
+          f"overhead p50 {overhead.get('p50') or 0:.4f}s, {level['errors']} errors")
+print(f"results written to {args.output}")
@@ -0,0 +1,25 @@
+"""Command line tool to replay a set of conversations through the RAG setup and store the results"""
+
+import argparse
+
+from rag.core.scheduler import Priority
+from rag.evaluation.batch import BatchRunner, DEFAULT_MAX_CONCURRENCY
+from rag.evaluation.batch import load_conversations, write_results
+from rag.utils.config import load_config, create_chatbot
+from rag.utils.settings_file import load_settings
+
+parser = argparse.ArgumentParser(description=__doc__)
+parser.add_argument("conversations", help="JSONL file with one conversation per line")
+parser.add_argument("output", help="Parquet file the per-turn results are written to")
+parser.add_argument("--settings", required=True, help="json file with search, pipeline and prompt settings")
+parser.add_argument("--concurrency", type=int, default=DEFAULT_MAX_CONCURRENCY,
+                    help="maximum number of conversations processed concurrently")
+parser.add_argument("--rate", type=float, default=None, help="maximum number of turns started per second")
+args = parser.parse_args()
+
+search_settings, pipeline_settings, prompts = load_settings(args.settings)
+runner = BatchRunner(create_chatbot(load_config(), priority=Priority.BATCH), search_settings, pipeline_settings,
+                     prompts, max_concurrency=args.concurrency, max_turns_per_second=args.rate)
+results = runner.run(load_conversations(args.conversations))
+write_results(results, args.output)
+print(f"{len(results)} turns written to {args.output}")
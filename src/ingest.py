@@ -0,0 +1,29 @@
+"""Command line tool to ingest a directory of Markdown, text and HTML documents into the search index"""
+
+import argparse
+
+from rag.core.scheduler import Priority
+from rag.ingestion.chunking import DEFAULT_MAX_TOKENS, DEFAULT_OVERLAP_TOKENS
+from rag.ingestion.pipeline import Checkpoint, IngestionPipeline, DEFAULT_BATCH_SIZE, DEFAULT_MAX_CONCURRENCY
+from rag.utils.config import load_config, create_index_writer, create_llm
+
+parser = argparse.ArgumentParser(description=__doc__)
+parser.add_argument("directory", help="directory with the documents to ingest")
+parser.add_argument("--checkpoint", default="ingestion_checkpoint.json",
+                    help="json file with the ingestion state, used to resume and to update incrementally")
+parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="chunks embedded per request")
+parser.add_argument("--concurrency", type=int, default=DEFAULT_MAX_CONCURRENCY,
+                    help="maximum number of embedding requests in parallel")
+parser.add_argument("--max-tokens", type=int, default=DEFAULT_MAX_TOKENS, help="maximum number of tokens per chunk")
+parser.add_argument("--overlap-tokens", type=int, default=DEFAULT_OVERLAP_TOKENS,
+                    help="maximum number of tokens repeated from the previous chunk")
+args = parser.parse_args()
+
+config = load_config()
+pipeline = IngestionPipeline(create_llm(config, priority=Priority.BACKGROUND), create_index_writer(config),
+                             Checkpoint(args.checkpoint),
+                             batch_size=args.batch_size, max_concurrency=args.concurrency,
+                             max_tokens=args.max_tokens, overlap_tokens=args.overlap_tokens)
+stats = pipeline.run(args.directory)
+print(f"{stats.documents} documents, {stats.chunks} chunks: {stats.embedded_chunks} embedded, "
+      f"{stats.unchanged_chunks} unchanged, {stats.deleted_chunks} deleted ({stats.embedding_tokens} tokens)")
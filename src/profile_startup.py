@@ -0,0 +1,28 @@
+"""Command line tool to report the import time of the modules loaded when the Streamlit app starts"""
+
+import argparse
+import sys
+
+from rag.utils.import_profile import get_total_us, profile_imports
+
+# modules imported by app.py before the first page is rendered
+APP_MODULES = ["streamlit", "rag.ui.chat", "rag.ui.settings", "rag.utils.config"]
+# SDKs that should only be loaded when the first client is created
+DEFERRED_PACKAGES = ["openai", "azure", "aiohttp", "requests", "dotenv"]
+
+parser = argparse.ArgumentParser(description=__doc__)
+parser.add_argument("modules", nargs="*", default=APP_MODULES, help="modules to import")
+parser.add_argument("--top", type=int, default=20, help="number of modules with the highest import time shown")
+parser.add_argument("--deferred", nargs="*", default=DEFERRED_PACKAGES,
+                    help="packages that must not be imported, fails if they are")
+args = parser.parse_args()
+
+import_times = profile_imports(args.modules)
+print(f"total import time: {get_total_us(import_times) / 1000:.1f} ms")
+for import_time in sorted(import_times, key=lambda t: t.cumulative_us, reverse=True)[:args.top]:
+    print(f"{import_time.cumulative_us / 1000:9.1f} ms  {import_time.self_us / 1000:9.1f} ms  {import_time.module}")
+
+imported = sorted({t.get_package() for t in import_times} & set(args.deferred))
+if imported:
+    print(f"imported at startup although deferred: {', '.join(imported)}")
+    sys.exit(1)
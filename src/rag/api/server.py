@@ -0,0 +1,174 @@
+"""Server module that provides the ASGI application serving the chatbot over a REST API with streaming."""
+
+import asyncio
+import json
+import uuid
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, Iterator, Optional
+
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+
+from .sessions import SessionStore
+from ..core.chatbot import Chatbot
+from ..core.clients import DEFAULT_POOL_SIZE, create_openai_session, use_openai_session
+from ..core.memory import ConversationMemory
+from ..core.models.chat_transaction import ChatTransaction
+from ..utils.settings_file import parse_settings
+
+SSE_MEDIA_TYPE = "text/event-stream"
+
+
+class ChatRequest(BaseModel):
+    query: str
+
+
+class SettingsUpdate(BaseModel):
+    """Settings of a session to change, in the format of the settings file (see `load_settings`)."""
+    search: Optional[Dict[str, Any]] = None
+    pipeline: Optional[Dict[str, Any]] = None
+    prompts: Optional[Dict[str, Dict[str, Optional[str]]]] = None
+
+
+def transaction_to_dict(chat_transaction: ChatTransaction) -> Dict[str, Any]:
+    documents = chat_transaction.context.documents if chat_transaction.context else chat_transaction.get_documents()
+    return {
+        "response": chat_transaction.response,
+        "cached": chat_transaction.cached,
+        "documents": [{"path": doc["path"], "title": doc.get("title"), "section": doc.get("section"),
+                       "score": doc.get("@search.score"), "reranker_score": doc.get("@search.reranker_score")}
+                      for doc in documents],
+        "completion_tokens": chat_transaction.get_completion_tokens(),
+        "cached_tokens": chat_transaction.get_cached_tokens(),
+        "embedding_tokens": chat_transaction.get_embedding_tokens(),
+        "saved_context_tokens": chat_transaction.get_saved_context_tokens(),
+        "latency": {span.name: span.get_duration() for span in chat_transaction.span.children},
+        "total_latency": chat_transaction.get_latency(),
+    }
+
+
+def format_event(event: str, data: Dict[str, Any]) -> str:
+    """Formats a server-sent event."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def create_app(chatbot: Chatbot, session_store: SessionStore, default_settings: Dict[str, Any],
+               pool_size: int = DEFAULT_POOL_SIZE) -> FastAPI:
+    """
+    Creates the ASGI application.
+
+    All sessions share the clients of the given chatbot, and the async Open AI requests share one pooled aiohttp
+    session of up to `pool_size` connections, opened and closed with the application. The memory and settings of a
+    session are loaded from the session store for every request and saved afterwards, so the application holds no
+    session state and can run in several worker processes sharing the store. Concurrent requests of the same session
+    are not serialized, the last one to finish wins.
+    """
+    parse_settings(default_settings)  # fails early on invalid settings
+
+    @asynccontextmanager
+    async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+        # the requests run in their own contexts, so they bind the session (see `chat`) instead of the lifespan
+        async with create_openai_session(pool_size) as openai_session:
+            app.state.openai_session = openai_session
+            try:
+                yield
+            finally:
+                await chatbot.search.aclose()
+
+    app = FastAPI(title="RAG Chatbot", lifespan=lifespan)
+
+    def load_session(session_id: str) -> Dict[str, Any]:
+        session = session_store.get(session_id)
+        if session is None:
+            raise HTTPException(status_code=404, detail=f"Unknown session: {session_id}")
+        return session
+
+    def create_chatbot(session: Dict[str, Any]) -> Chatbot:
+        search_settings, pipeline_settings, prompts = parse_settings(session["settings"])
+        session_chatbot = chatbot.copy()
+        session_chatbot.memory = ConversationMemory.from_dict(session["memory"])
+        session_chatbot.set_prompts(prompts)
+        return session_chatbot
+
+    def save_memory(session_id: str, session: Dict[str, Any], session_chatbot: Chatbot) -> None:
+        session["memory"] = session_chatbot.memory.to_dict()
+        session_store.put(session_id, session)
+
+    @app.get("/health")
+    def health() -> Dict[str, str]:
+        return {"status": "ok"}
+
+    @app.post("/cache/invalidate")
+    def invalidate_cache() -> Dict[str, str]:
+        """Drops the cached search results and responses of this worker, e.g. after the index has been updated."""
+        chatbot.search.invalidate_cache()
+        if chatbot.response_cache is not None:
+            chatbot.response_cache.invalidate()
+        return {"status": "ok"}
+
+    @app.post("/sessions")
+    def create_session() -> Dict[str, str]:
+        session_id = uuid.uuid4().hex
+        session_store.put(session_id, {"memory": ConversationMemory().to_dict(), "settings": default_settings})
+        return {"session_id": session_id}
+
+    @app.delete("/sessions/{session_id}")
+    def delete_session(session_id: str) -> Dict[str, str]:
+        session_store.delete(session_id)
+        return {"session_id": session_id}
+
+    @app.get("/sessions/{session_id}/settings")
+    def get_settings(session_id: str) -> Dict[str, Any]:
+        return load_session(session_id)["settings"]
+
+    @app.put("/sessions/{session_id}/settings")
+    def update_settings(session_id: str, update: SettingsUpdate) -> Dict[str, Any]:
+        session = load_session(session_id)
+        settings = dict(session["settings"])
+        for key, value in update.model_dump(exclude_none=True).items():
+            settings[key] = {**settings.get(key, {}), **value}
+        try:
+            parse_settings(settings)
+        except (TypeError, ValueError, KeyError) as e:
+            raise HTTPException(status_code=422, detail=str(e))
+        session["settings"] = settings
+        session_store.put(session_id, session)
+        return settings
+
+    @app.post("/sessions/{session_id}/chat")
+    async def chat(session_id: str, request: ChatRequest) -> Dict[str, Any]:
+        session = await asyncio.to_thread(load_session, session_id)
+        session_chatbot = create_chatbot(session)
+        search_settings, pipeline_settings, _ = parse_settings(session["settings"])
+        with use_openai_session(app.state.openai_session):
+            chat_transaction = await session_chatbot.achat(request.query, search_settings, pipeline_settings)
+        await asyncio.to_thread(save_memory, session_id, session, session_chatbot)
+        return transaction_to_dict(chat_transaction)
+
+    @app.post("/sessions/{session_id}/chat/stream")
+    def chat_stream(session_id: str, request: ChatRequest) -> StreamingResponse:
+        """Streams the response as server-sent events: `delta` events with the content, then a `done` event."""
+        session = load_session(session_id)
+        session_chatbot = create_chatbot(session)
+        search_settings, pipeline_settings, _ = parse_settings(session["settings"])
+
+        def events() -> Iterator[str]:
+            stream = session_chatbot.chat_stream(request.query, search_settings, pipeline_settings)
+            try:
+                while True:
+                    yield format_event("delta", {"content": next(stream)})
+            except StopIteration as stop:
+                chat_transaction = stop.value
+            except Exception as e:
+                yield format_event("error", {"detail": repr(e)})
+                return
+            finally:
+                stream.close()  # ends the spans if the client disconnected before the response was complete
+            save_memory(session_id, session, session_chatbot)
+            yield format_event("done", transaction_to_dict(chat_transaction))
+
+        # the sync generator is iterated in a worker thread
+        return StreamingResponse(events(), media_type=SSE_MEDIA_TYPE)
+
+    return app
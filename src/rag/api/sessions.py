@@ -0,0 +1,80 @@
+"""Sessions module that provides the stores for the state of the chat sessions served by the API."""
+
+import json
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional
+
+
+class SessionStore:
+    """
+    Interface of a session store.
+
+    A session is a json-serializable dict with the conversation memory and the settings of the session. Since the
+    state is loaded for every request and saved afterwards, any worker process sharing the store can serve a session.
+    """
+
+    def get(self, session_id: str) -> Optional[Dict[str, Any]]:
+        raise NotImplementedError
+
+    def put(self, session_id: str, session: Dict[str, Any]) -> None:
+        raise NotImplementedError
+
+    def delete(self, session_id: str) -> None:
+        raise NotImplementedError
+
+
+class InMemorySessionStore(SessionStore):
+    """Session store of a single process, e.g. for development with one worker."""
+
+    def __init__(self) -> None:
+        self.__sessions: Dict[str, str] = {}
+        self.__lock = threading.Lock()
+
+    def get(self, session_id: str) -> Optional[Dict[str, Any]]:
+        with self.__lock:
+            session = self.__sessions.get(session_id)
+        return json.loads(session) if session is not None else None
+
+    def put(self, session_id: str, session: Dict[str, Any]) -> None:
+        # stored serialized, so that callers can not modify the stored state
+        with self.__lock:
+            self.__sessions[session_id] = json.dumps(session)
+
+    def delete(self, session_id: str) -> None:
+        with self.__lock:
+            self.__sessions.pop(session_id, None)
+
+
+class SqliteSessionStore(SessionStore):
+    """Session store in a SQLite database, shared by the worker processes on one host."""
+
+    def __init__(self, path: str, ttl_seconds: Optional[float] = None) -> None:
+        self.ttl_seconds = ttl_seconds
+        self.__lock = threading.Lock()
+        self.__db = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self.__db.execute("PRAGMA journal_mode=WAL")
+        self.__db.execute("CREATE TABLE IF NOT EXISTS sessions "
+                          "(id TEXT PRIMARY KEY, session TEXT NOT NULL, updated REAL NOT NULL)")
+        self.__db.commit()
+
+    def get(self, session_id: str) -> Optional[Dict[str, Any]]:
+        with self.__lock:
+            row = self.__db.execute("SELECT session, updated FROM sessions WHERE id = ?", (session_id,)).fetchone()
+        if row is None or (self.ttl_seconds is not None and time.time() - row[1] > self.ttl_seconds):
+            return None
+        return json.loads(row[0])
+
+    def put(self, session_id: str, session: Dict[str, Any]) -> None:
+        with self.__lock:
+            self.__db.execute("INSERT OR REPLACE INTO sessions (id, session, updated) VALUES (?, ?, ?)",
+                              (session_id, json.dumps(session), time.time()))
+            if self.ttl_seconds is not None:
+                self.__db.execute("DELETE FROM sessions WHERE updated < ?", (time.time() - self.ttl_seconds,))
+            self.__db.commit()
+
+    def delete(self, session_id: str) -> None:
+        with self.__lock:
+            self.__db.execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+            self.__db.commit()
@@ -0,0 +1,108 @@
+"""Azure search module that provides the retrieval backend based on Azure Cognitive Search."""
+
+import asyncio
+import itertools
+import weakref
+from typing import Any, Dict, List, Optional
+
+import requests
+from azure.core.credentials import AzureKeyCredential
+from azure.core.pipeline.transport import RequestsTransport
+from azure.search.documents import SearchClient
+from azure.search.documents.aio import SearchClient as AsyncSearchClient
+from azure.search.documents.models import Vector
+
+from .base import SearchBackend
+from ...utils.search_settings import SearchSettings
+
+
+class AzureSearchBackend(SearchBackend):
+    """
+    Retrieval backend that sends the search requests to an Azure Cognitive Search index.
+
+    Sync requests use the given pooled session, if any. Async requests use one client per event loop, since the
+    connections of an async client are bound to the loop.
+    """
+
+    name = "azure"
+
+    def __init__(self, endpoint: str, search_key: str, index_name: str, session: Optional[requests.Session] = None,
+                 timeout: Optional[float] = None) -> None:
+        self.endpoint = endpoint
+        self.index_name = index_name
+        self.credential = AzureKeyCredential(search_key)
+        # per call timeout (azure-core default if not set)
+        self.request_kwargs = {"timeout": timeout} if timeout else {}
+        client_kwargs = {}
+        if session is not None:
+            client_kwargs["transport"] = RequestsTransport(session=session, session_owner=False)
+        self.search_client = SearchClient(
+            endpoint=endpoint,
+            index_name=index_name,
+            credential=self.credential,
+            **client_kwargs,
+        )
+        self.__async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, AsyncSearchClient]" = \
+            weakref.WeakKeyDictionary()
+
+    @staticmethod
+    def __get_search_kwargs(text_query: Optional[str], vector: Optional[List[float]],
+                            search_settings: SearchSettings) -> Dict[str, Any]:
+        vectors = []
+        if vector is not None:
+            vectors = [Vector(
+                value=vector,
+                fields=",".join(search_settings.vector_fields),
+                k=search_settings.k,
+            )
+            ]
+
+        query_type = None
+        query_language = None
+        semantic_configuration_name = None
+        if search_settings.semantic_search and search_settings.semantic_configuration_name:
+            query_type = "semantic"
+            query_language = "en-US"
+            semantic_configuration_name = search_settings.semantic_configuration_name
+
+        scoring_profile = None
+        if search_settings.scoring_profile_name:
+            scoring_profile = search_settings.scoring_profile_name
+
+        return dict(search_text=text_query, vectors=vectors, query_language=query_language,
+                    semantic_configuration_name=semantic_configuration_name, query_type=query_type,
+                    top=search_settings.top, scoring_profile=scoring_profile,
+                    select=search_settings.select_fields)
+
+    def __get_async_client(self) -> AsyncSearchClient:
+        loop = asyncio.get_running_loop()
+        search_client = self.__async_clients.get(loop)
+        if search_client is None:
+            search_client = AsyncSearchClient(endpoint=self.endpoint, index_name=self.index_name,
+                                              credential=self.credential)
+            self.__async_clients[loop] = search_client
+        return search_client
+
+    def search(self, text_query: Optional[str], vector: Optional[List[float]],
+               search_settings: SearchSettings) -> List[Dict[str, Any]]:
+        documents = self.search_client.search(**self.__get_search_kwargs(text_query, vector, search_settings),
+                                              **self.request_kwargs)
+        # the pager requests further pages lazily, stop consuming it after the top documents
+        return list(itertools.islice(documents, search_settings.top))
+
+    async def asearch(self, text_query: Optional[str], vector: Optional[List[float]],
+                      search_settings: SearchSettings) -> List[Dict[str, Any]]:
+        search_client = self.__get_async_client()
+        documents = await search_client.search(**self.__get_search_kwargs(text_query, vector, search_settings),
+                                               **self.request_kwargs)
+        results = []
+        async for document in documents:
+            results.append(document)
+            if len(results) >= search_settings.top:
+                break
+        return results
+
+    async def aclose(self) -> None:
+        search_client = self.__async_clients.pop(asyncio.get_running_loop(), None)
+        if search_client is not None:
+            await search_client.close()
@@ -0,0 +1,35 @@
+"""Base module that defines the interface of the retrieval backends used by the search service."""
+
+import asyncio
+from typing import Any, Dict, List, Optional
+
+from ...utils.search_settings import SearchSettings
+
+
+def project_document(document: Dict[str, Any], fields: List[str]) -> Dict[str, Any]:
+    """Returns a copy of the document with only the given fields."""
+    return {field: document[field] for field in fields if field in document}
+
+
+class SearchBackend:
+    """
+    Interface of a retrieval backend.
+
+    A backend returns the documents for a text query and/or a query vector as dicts that contain the document fields as
+    well as the `@search.score` and `@search.reranker_score` of the hit, ordered by relevance. Only the document fields
+    in `SearchSettings.select_fields` are returned.
+    """
+
+    name = "backend"
+
+    def search(self, text_query: Optional[str], vector: Optional[List[float]],
+               search_settings: SearchSettings) -> List[Dict[str, Any]]:
+        raise NotImplementedError
+
+    async def asearch(self, text_query: Optional[str], vector: Optional[List[float]],
+                      search_settings: SearchSettings) -> List[Dict[str, Any]]:
+        """Async variant of `search`. Runs `search` in a worker thread unless overridden."""
+        return await asyncio.to_thread(self.search, text_query, vector, search_settings)
+
+    async def aclose(self) -> None:
+        """Closes the connections opened by `asearch` in the running event loop."""
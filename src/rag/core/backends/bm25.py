@@ -0,0 +1,126 @@
+"""BM25 module that provides a local inverted index for keyword search."""
+
+import hashlib
+import json
+import os
+import re
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+DEFAULT_K1 = 1.2
+DEFAULT_B = 0.75
+
+TOKEN_PATTERN = re.compile(r"\w+")
+VOCABULARY_FILE = "vocabulary.json"
+# written last by `save`, so an index without it is incomplete
+METADATA_FILE = "metadata.json"
+ARRAY_FILES = ["offsets", "doc_ids", "term_frequencies", "doc_lengths"]
+
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+def corpus_hash(texts: Iterable[str]) -> str:
+    """Returns a content hash of the indexed texts, to detect a saved index that no longer matches its corpus."""
+    digest = hashlib.sha256()
+    for text in texts:
+        digest.update(hashlib.sha256(text.encode("utf-8")).digest())
+    return digest.hexdigest()
+
+
+class BM25Index:
+    """
+    Inverted index that scores documents with Okapi BM25.
+
+    The postings are stored in compressed sparse row layout: the postings of the term with id `t` are
+    `doc_ids[offsets[t]:offsets[t + 1]]` together with their term frequencies. The arrays can be saved to a directory
+    and loaded memory-mapped, so large indexes are paged in on demand instead of being read into memory. The number
+    of documents and the hash of the corpus are saved along with the arrays (see `load_metadata`).
+    """
+
+    def __init__(self, vocabulary: Dict[str, int], offsets: np.ndarray, doc_ids: np.ndarray,
+                 term_frequencies: np.ndarray, doc_lengths: np.ndarray, k1: float = DEFAULT_K1,
+                 b: float = DEFAULT_B) -> None:
+        self.vocabulary = vocabulary
+        self.offsets = offsets
+        self.doc_ids = doc_ids
+        self.term_frequencies = term_frequencies
+        self.doc_lengths = doc_lengths
+        self.k1 = k1
+        self.b = b
+        self.num_docs = len(doc_lengths)
+        self.average_doc_length = float(np.mean(doc_lengths)) if self.num_docs else 0.0
+        relative_doc_lengths = np.asarray(doc_lengths, dtype=np.float32) / max(self.average_doc_length, 1)
+        self.length_norm = k1 * (1 - b + b * relative_doc_lengths)
+
+    @classmethod
+    def build(cls, texts: Iterable[str], k1: float = DEFAULT_K1, b: float = DEFAULT_B) -> "BM25Index":
+        vocabulary: Dict[str, int] = {}
+        postings: List[Dict[int, int]] = []
+        doc_lengths = []
+        for doc_id, text in enumerate(texts):
+            tokens = tokenize(text)
+            doc_lengths.append(len(tokens))
+            for token in tokens:
+                term_id = vocabulary.setdefault(token, len(vocabulary))
+                if term_id == len(postings):
+                    postings.append({})
+                postings[term_id][doc_id] = postings[term_id].get(doc_id, 0) + 1
+
+        offsets = np.zeros(len(postings) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(term_postings) for term_postings in postings])
+        doc_ids = np.fromiter((d for term_postings in postings for d in term_postings), dtype=np.int32,
+                              count=int(offsets[-1]))
+        term_frequencies = np.fromiter((f for term_postings in postings for f in term_postings.values()),
+                                       dtype=np.int32, count=int(offsets[-1]))
+        return cls(vocabulary, offsets, doc_ids, term_frequencies, np.asarray(doc_lengths, dtype=np.float32), k1, b)
+
+    def save(self, directory: str, corpus_hash: Optional[str] = None) -> None:
+        os.makedirs(directory, exist_ok=True)
+        metadata_path = os.path.join(directory, METADATA_FILE)
+        if os.path.exists(metadata_path):
+            os.remove(metadata_path)
+        with open(os.path.join(directory, VOCABULARY_FILE), "w", encoding="utf-8") as file:
+            json.dump(self.vocabulary, file)
+        for name in ARRAY_FILES:
+            np.save(os.path.join(directory, f"{name}.npy"), getattr(self, name))
+        with open(metadata_path, "w", encoding="utf-8") as file:
+            json.dump({"num_docs": self.num_docs, "corpus_hash": corpus_hash}, file)
+
+    @staticmethod
+    def load_metadata(directory: str) -> Optional[Dict[str, Any]]:
+        """Returns the metadata of an index saved with `save`, or None if there is no complete index."""
+        try:
+            with open(os.path.join(directory, METADATA_FILE), encoding="utf-8") as file:
+                return json.load(file)
+        except FileNotFoundError:
+            return None
+
+    @classmethod
+    def load(cls, directory: str, k1: float = DEFAULT_K1, b: float = DEFAULT_B) -> "BM25Index":
+        """Loads an index saved with `save`, the posting arrays are memory-mapped."""
+        with open(os.path.join(directory, VOCABULARY_FILE), encoding="utf-8") as file:
+            vocabulary = json.load(file)
+        arrays = {name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode="r") for name in ARRAY_FILES}
+        return cls(vocabulary, k1=k1, b=b, **arrays)
+
+    def search(self, query: str, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Returns the ids and BM25 scores of the k best matching documents in descending order of score."""
+        scores = np.zeros(self.num_docs, dtype=np.float32)
+        for token in set(tokenize(query)):
+            term_id = self.vocabulary.get(token)
+            if term_id is None:
+                continue
+            start, end = self.offsets[term_id], self.offsets[term_id + 1]
+            doc_ids = np.asarray(self.doc_ids[start:end])
+            term_frequencies = np.asarray(self.term_frequencies[start:end], dtype=np.float32)
+            idf = np.log(1 + (self.num_docs - len(doc_ids) + 0.5) / (len(doc_ids) + 0.5))
+            scores[doc_ids] += idf * term_frequencies * (self.k1 + 1) / (term_frequencies + self.length_norm[doc_ids])
+
+        matches = np.flatnonzero(scores)
+        if len(matches) > k:
+            matches = matches[np.argpartition(-scores[matches], k - 1)[:k]]
+        matches = matches[np.argsort(-scores[matches])]
+        return matches, scores[matches]
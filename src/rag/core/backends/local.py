@@ -0,0 +1,209 @@
+"""Local module that provides an in-process retrieval backend with in-memory vector indexes."""
+
+import json
+import os
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .base import SearchBackend, project_document
+from .bm25 import BM25Index, corpus_hash
+from ..fusion import reciprocal_rank_fusion
+from ..vectors import normalize_rows
+from ...utils.search_settings import SearchSettings
+
+# corpora with at least this many documents use the approximate index
+DEFAULT_IVF_THRESHOLD = 50000
+DEFAULT_TEXT_FIELDS = ["title", "section", "content"]
+# number of text search results that are fused with the vector search results in hybrid search
+HYBRID_TEXT_CANDIDATES = 50
+ASSIGNMENT_BATCH_SIZE = 65536
+
+
+def document_texts(documents: List[Dict[str, Any]], text_fields: List[str]) -> List[str]:
+    """Returns the texts of the documents that are indexed for text search."""
+    return [" ".join(str(doc.get(field) or "") for field in text_fields) for doc in documents]
+
+
+def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Returns the indices of the k highest scores in descending order of score."""
+    if k >= len(scores):
+        return np.argsort(-scores)
+    candidates = np.argpartition(-scores, k - 1)[:k]
+    return candidates[np.argsort(-scores[candidates])]
+
+
+class FlatIndex:
+    """Exact nearest neighbour index that compares the query with all vectors in a single matrix-vector product."""
+
+    def __init__(self, vectors: np.ndarray) -> None:
+        self.vectors = normalize_rows(vectors.astype(np.float32))
+
+    def search(self, query: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Returns the ids and cosine similarities of the k nearest neighbours of the (normalized) query."""
+        scores = self.vectors @ query
+        ids = top_k(scores, k)
+        return ids, scores[ids]
+
+    def get_vector(self, i: int) -> np.ndarray:
+        """Returns the (normalized) vector of the document with the id."""
+        return self.vectors[i]
+
+
+class IVFIndex:
+    """
+    Approximate nearest neighbour index based on an inverted file.
+
+    The vectors are clustered with spherical k-means and stored contiguously per cluster. A query is only compared with
+    the vectors of the `n_probe` clusters whose centroids are closest to it.
+    """
+
+    def __init__(self, vectors: np.ndarray, n_lists: Optional[int] = None, n_probe: int = 16, n_iterations: int = 10,
+                 seed: int = 0) -> None:
+        vectors = normalize_rows(vectors.astype(np.float32))
+        n_lists = n_lists or max(1, int(np.sqrt(len(vectors))))
+        self.n_probe = n_probe
+        self.centroids = self.__train(vectors, n_lists, n_iterations, np.random.default_rng(seed))
+
+        assignments = self.__assign(vectors)
+        self.ids = np.argsort(assignments, kind="stable")
+        self.vectors = vectors[self.ids]
+        self.offsets = np.searchsorted(assignments[self.ids], np.arange(n_lists + 1))
+        self.positions = np.argsort(self.ids)
+
+    @staticmethod
+    def __train(vectors: np.ndarray, n_lists: int, n_iterations: int, rng: np.random.Generator) -> np.ndarray:
+        # train on a sample to bound the cost for large corpora
+        sample = vectors[rng.choice(len(vectors), size=min(len(vectors), 256 * n_lists), replace=False)]
+        centroids = sample[rng.choice(len(sample), size=n_lists, replace=False)]
+        for _ in range(n_iterations):
+            assignments = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignments, sample)
+            empty = ~sums.any(axis=1)
+            sums[empty] = centroids[empty]
+            centroids = normalize_rows(sums)
+        return centroids
+
+    def __assign(self, vectors: np.ndarray) -> np.ndarray:
+        return np.concatenate([np.argmax(vectors[i:i + ASSIGNMENT_BATCH_SIZE] @ self.centroids.T, axis=1)
+                               for i in range(0, len(vectors), ASSIGNMENT_BATCH_SIZE)])
+
+    def search(self, query: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Returns the ids and cosine similarities of the (approximate) k nearest neighbours of the query."""
+        lists = top_k(self.centroids @ query, self.n_probe)
+        positions = np.concatenate([np.arange(self.offsets[i], self.offsets[i + 1]) for i in lists])
+        scores = self.vectors[positions] @ query
+        best = top_k(scores, k)
+        return self.ids[positions[best]], scores[best]
+
+    def get_vector(self, i: int) -> np.ndarray:
+        """Returns the (normalized) vector of the document with the id."""
+        return self.vectors[self.positions[i]]
+
+
+class LocalSearchBackend(SearchBackend):
+    """
+    Retrieval backend that searches documents held in memory.
+
+    For every vector field, the backend builds a brute force index for small corpora and an approximate IVF index for
+    large ones. Like Azure Cognitive Search, every vector field contributes its k nearest neighbours and the results of
+    several fields are merged with reciprocal rank fusion. For a single field, the score is `1 / (2 - cosine)`, which
+    is the score Azure reports for the cosine metric.
+    Text queries are scored with BM25 over the text fields. In hybrid search, the text and vector results are merged
+    with reciprocal rank fusion as well. Semantic search and scoring profiles are not supported.
+    Documents without a vector in a vector field are indexed with a zero vector, a ValueError is raised if no document
+    has a vector in the field or if the vectors of a field differ in their dimensions.
+    """
+
+    name = "local"
+
+    def __init__(self, documents: List[Dict[str, Any]], vector_fields: List[str],
+                 ivf_threshold: int = DEFAULT_IVF_THRESHOLD, text_index: Optional[BM25Index] = None,
+                 text_fields: Optional[List[str]] = None) -> None:
+        self.documents = documents
+        self.text_fields = text_fields or DEFAULT_TEXT_FIELDS
+        self.text_index = text_index or BM25Index.build(document_texts(documents, self.text_fields))
+        self.indexes = {}
+        for field in vector_fields:
+            dimensions = next((len(doc[field]) for doc in documents if doc.get(field)), None)
+            if dimensions is None:
+                raise ValueError(f"Vector field {field!r} not found in any document")
+            vectors = np.zeros((len(documents), dimensions), dtype=np.float32)
+            for i, doc in enumerate(documents):
+                if doc.get(field):
+                    if len(doc[field]) != dimensions:
+                        raise ValueError(f"Vector field {field!r} of document {i} has {len(doc[field])} dimensions, "
+                                         f"expected {dimensions}")
+                    vectors[i] = doc[field]
+            self.indexes[field] = IVFIndex(vectors) if len(documents) >= ivf_threshold else FlatIndex(vectors)
+        # the vectors are kept in the indexes only, selected vector fields are read from there
+        self.documents = [{key: value for key, value in doc.items() if key not in self.indexes} for doc in documents]
+
+    @classmethod
+    def from_jsonl(cls, path: str, vector_fields: List[str], ivf_threshold: int = DEFAULT_IVF_THRESHOLD,
+                   text_index_path: Optional[str] = None):
+        """
+        Loads the documents from a JSONL file with one document (including its vector fields) per line.
+
+        If a text index path is given, the BM25 index is loaded from there (memory-mapped) if it was built from the
+        same documents, otherwise it is built and saved there.
+        """
+        with open(path, encoding="utf-8") as file:
+            documents = [json.loads(line) for line in file if line.strip()]
+        text_index = None
+        text_hash = None
+        if text_index_path:
+            text_hash = corpus_hash(document_texts(documents, DEFAULT_TEXT_FIELDS))
+            metadata = BM25Index.load_metadata(text_index_path) if os.path.isdir(text_index_path) else None
+            if metadata == {"num_docs": len(documents), "corpus_hash": text_hash}:
+                text_index = BM25Index.load(text_index_path)
+        backend = cls(documents, vector_fields, ivf_threshold=ivf_threshold, text_index=text_index)
+        if text_index_path and text_index is None:
+            backend.text_index.save(text_index_path, corpus_hash=text_hash)
+        return backend
+
+    def vector_search(self, vector: List[float], fields: List[str], k: int) -> List[Tuple[int, float]]:
+        """Returns the ids and scores of the documents matching the vector in descending order of score."""
+        query = normalize_rows(np.asarray(vector, dtype=np.float32))
+        unknown_fields = [field for field in fields if field not in self.indexes]
+        if unknown_fields:
+            raise ValueError(f"Vector fields not in local index: {unknown_fields}")
+
+        if len(fields) == 1:
+            ids, similarities = self.indexes[fields[0]].search(query, k)
+            return [(int(i), float(1 / (2 - s))) for i, s in zip(ids, similarities)]
+
+        return reciprocal_rank_fusion([self.indexes[field].search(query, k)[0].tolist() for field in fields])
+
+    def text_search(self, text_query: str, top: int) -> List[Tuple[int, float]]:
+        """Returns the ids and BM25 scores of the documents matching the text query in descending order of score."""
+        ids, scores = self.text_index.search(text_query, top)
+        return [(int(i), float(s)) for i, s in zip(ids, scores)]
+
+    def hits_to_documents(self, hits: List[Tuple[int, float]],
+                          search_settings: SearchSettings) -> List[Dict[str, Any]]:
+        documents = []
+        vector_fields = [field for field in search_settings.select_fields if field in self.indexes]
+        for i, score in hits[:search_settings.top]:
+            document = project_document(self.documents[i], search_settings.select_fields)
+            for field in vector_fields:
+                document[field] = self.indexes[field].get_vector(i).tolist()
+            document["@search.score"] = score
+            document["@search.reranker_score"] = None
+            documents.append(document)
+        return documents
+
+    def search(self, text_query: Optional[str], vector: Optional[List[float]],
+               search_settings: SearchSettings) -> List[Dict[str, Any]]:
+        if text_query is not None and vector is not None:
+            text_hits = self.text_search(text_query, max(search_settings.top, HYBRID_TEXT_CANDIDATES))
+            vector_hits = self.vector_search(vector, search_settings.vector_fields, search_settings.k)
+            hits = reciprocal_rank_fusion([[i for i, _ in text_hits], [i for i, _ in vector_hits]])
+        elif text_query is not None:
+            hits = self.text_search(text_query, search_settings.top)
+        elif vector is not None:
+            hits = self.vector_search(vector, search_settings.vector_fields, search_settings.k)
+        else:
+            return []
+        return self.hits_to_documents(hits, search_settings)
@@ -1,120 +1,603 @@
 """Chatbot module that provides the main Chatbot class."""
 
+import asyncio
 import json
-from typing import Dict, Tuple, List
+from typing import Any, Dict, Generator, Optional, Tuple, List
 
+from .context import format_context, pack_context
+from .fusion import document_key, fuse_documents
 from .llm import LLM
+from .memory import SUMMARY, ConversationMemory, format_turns
 from .models.chat_transaction import ChatTransaction
 from .models.completion_transaction import CompletionTransaction
+from .models.search_transaction import SearchTransaction
+from .models.span import Span
 from .prompts import REPHRASE_USER_QUERY_PROMPT_NAME, KNOWLEDGE_BASE_QUERY_PROMPT_NAME, RAG_PROMPT_NAME
+from .prompts import PLAN_QUERY_PROMPT_NAME, SUMMARIZE_HISTORY_PROMPT_NAME, SUB_QUESTIONS_PROMPT_NAME
+from .prompts import RAG_CONTEXT_PROMPT, RAG_CONTEXT_REFERENCE
+from .response_cache import CachedResponse, SemanticResponseCache, fingerprint, prompts_fingerprint
+from .routing import StageRoute
 from .search import SearchService
+from .tracing import FileSpanExporter
 from ..utils.pipeline_settings import PipelineSettings
-from ..utils.prompt_pair import PromptPair
+from ..utils.prompt_pair import PromptPair, PromptTemplate
 from ..utils.search_settings import SearchSettings
 
-# constants used to stringify chat history
-ASSISTANT = "assistant"
-CHAT_GREETING = "How can I help you?"
-USER = "user"
+# names of the pipeline stages (completion transactions)
+REPHRASE_USER_INTENT_NAME = "Rephrase User Intent"
+KNOWLEDGE_BASE_QUERY_NAME = "Generate Knowledge Base Query"
+PLAN_QUERY_NAME = "Plan Query"
+GENERATE_SUB_QUESTIONS_NAME = "Generate Sub-Questions"
+GENERATE_RESPONSE_NAME = "Generate Response"
+SUMMARIZE_HISTORY_NAME = "Summarize History"
+RESPONSE_CACHE_NAME = "Response Cache"
+PACK_CONTEXT_NAME = "Pack Context"
+
+# stages whose chat requests can be routed to their own deployment
+ROUTED_STAGES = [REPHRASE_USER_INTENT_NAME, KNOWLEDGE_BASE_QUERY_NAME, PLAN_QUERY_NAME, GENERATE_SUB_QUESTIONS_NAME,
+                 GENERATE_RESPONSE_NAME, SUMMARIZE_HISTORY_NAME]
 
 
 class Chatbot:
     """
     Class that represents a session of the chatbot.
 
-    The chatbot is stateful and stores the history of the conversation.
+    The chatbot is stateful and stores the history of the conversation (see `ConversationMemory`).
     The prompts can be modified at any time.
     Settings regarding the RAG configuration are passed along together with each chat input.
+    If a span exporter is set, the timing spans of each chat transaction are exported.
+    User inputs are only rephrased if there is a history to take context from. If the knowledge base query is
+    generated as well, both are generated with a single request (query planning).
+    If a response cache is set, responses to semantically similar (rephrased) queries are served from the cache
+    without search and response generation.
+    With multi-query retrieval, the knowledge base is searched with several query variants concurrently and the merged
+    results are used for the response generation.
+    The chat requests of a stage are sent with its route (see `StageRoute`) if there is one, e.g. to let the short
+    query preparation stages use a smaller, faster deployment than the response generation.
+    The prompt templates are parsed once when the prompts are set. With the prefix-stable layout, the system message
+    of the response generation is the same for every request and the documents (in a deterministic order) and the
+    summary follow the history, so that the prompt cache of the service can serve the unchanged prefix.
     """
 
-    def __init__(self, llm: LLM, search: SearchService) -> None:
+    def __init__(self, llm: LLM, search: SearchService, span_exporter: Optional[FileSpanExporter] = None,
+                 response_cache: Optional[SemanticResponseCache] = None,
+                 routes: Optional[Dict[str, StageRoute]] = None) -> None:
+        unknown_stages = set(routes or {}) - set(ROUTED_STAGES)
+        if unknown_stages:
+            raise ValueError(f"Unknown pipeline stages in routes: {sorted(unknown_stages)}")
         self.llm = llm
         self.search = search
-        self.chat_history: List[Tuple[str, str]] = []
+        self.span_exporter = span_exporter
+        self.response_cache = response_cache
+        self.routes = routes or {}
+        self.memory = ConversationMemory()
         self.prompts = None  # will be set via setter
+        self.__templates: Dict[str, PromptTemplate] = {}  # user prompt templates, compiled in `set_prompts`
+        self.__rag_template: Optional[PromptTemplate] = None
+        self.__context_template = PromptTemplate(RAG_CONTEXT_PROMPT)
+        self.__stable_rag_system_message: Optional[str] = None
 
-    def __get_chat_history_str(self) -> str:
-        chat_history_str = f"{ASSISTANT}: {CHAT_GREETING.strip()}\n"
-        for (user_message, bot_message) in self.chat_history:
-            chat_history_str += f"{USER}: {user_message}\n"
-            chat_history_str += f"{ASSISTANT}: {bot_message}\n"
-        return chat_history_str
+    @property
+    def chat_history(self) -> List[Tuple[str, str]]:
+        """The recent turns of the conversation that are sent verbatim."""
+        return self.memory.turns
 
-    def __rephrase_user_intent(self, query: str, temperature: float = 0.7) -> CompletionTransaction:
+    def reset(self) -> None:
+        self.memory.clear()
+
+    def copy(self) -> "Chatbot":
+        """Returns a chatbot with an empty conversation that shares the clients, caches and routes of this one."""
+        return Chatbot(llm=self.llm, search=self.search, span_exporter=self.span_exporter,
+                       response_cache=self.response_cache, routes=self.routes)
+
+    def __rephrase_user_intent_request(self, query: str, temperature: float) -> Dict[str, Any]:
         prompt_pair = self.prompts[REPHRASE_USER_QUERY_PROMPT_NAME]
-        completion_transaction = self.llm.chat(system_message=prompt_pair.system_prompt,
-                                               user_message=prompt_pair.user_prompt.format(
-                                                   chat_history=self.__get_chat_history_str(), user_query=query),
-                                               temperature=temperature)
-        completion_transaction.set_name("Rephrase User Intent")
+        template = self.__templates[REPHRASE_USER_QUERY_PROMPT_NAME]
+        return dict(system_message=prompt_pair.system_prompt,
+                    user_message=template.format(chat_history=self.memory.get_history_str(), user_query=query),
+                    temperature=temperature, route=self.routes.get(REPHRASE_USER_INTENT_NAME))
+
+    def __knowledge_base_query_request(self, query: str, temperature: float) -> Dict[str, Any]:
+        prompt_pair = self.prompts[KNOWLEDGE_BASE_QUERY_PROMPT_NAME]
+        template = self.__templates[KNOWLEDGE_BASE_QUERY_PROMPT_NAME]
+        return dict(system_message=prompt_pair.system_prompt, user_message=template.format(query=query),
+                    temperature=temperature, max_tokens=200, route=self.routes.get(KNOWLEDGE_BASE_QUERY_NAME))
+
+    def __plan_query_request(self, query: str, temperature: float) -> Dict[str, Any]:
+        prompt_pair = self.prompts[PLAN_QUERY_PROMPT_NAME]
+        template = self.__templates[PLAN_QUERY_PROMPT_NAME]
+        return dict(system_message=prompt_pair.system_prompt,
+                    user_message=template.format(chat_history=self.memory.get_history_str(), user_query=query),
+                    temperature=temperature, max_tokens=400, route=self.routes.get(PLAN_QUERY_NAME))
+
+    def __sub_questions_request(self, query: str, num_questions: int) -> Dict[str, Any]:
+        prompt_pair = self.prompts[SUB_QUESTIONS_PROMPT_NAME]
+        template = self.__templates[SUB_QUESTIONS_PROMPT_NAME]
+        return dict(system_message=prompt_pair.system_prompt,
+                    user_message=template.format(query=query, num_questions=num_questions),
+                    temperature=0.0, max_tokens=400, route=self.routes.get(GENERATE_SUB_QUESTIONS_NAME))
+
+    @staticmethod
+    def __format_context(context_list: list, pipeline_settings: PipelineSettings) -> str:
+        if pipeline_settings.prefix_stable_layout:
+            context_list = sorted(context_list, key=document_key)
+        return format_context(context_list)
+
+    def __rag_request(self, context: str, query: str, pipeline_settings: PipelineSettings) -> Dict[str, Any]:
+        request = dict(user_message=query, history=self.memory.turns, temperature=pipeline_settings.rag_temperature,
+                       route=self.routes.get(GENERATE_RESPONSE_NAME))
+        if pipeline_settings.prefix_stable_layout:
+            # static instructions first, the volatile documents and summary after the history
+            context_message = self.__context_template.format(context=context)
+            if self.memory.summary:
+                context_message += f"\n{SUMMARY}: {self.memory.summary}"
+            return dict(request, system_message=self.__stable_rag_system_message, context_message=context_message)
+
+        system_message = self.__rag_template.format(context=context)
+        if self.memory.summary:
+            system_message += f"\n{SUMMARY}: {self.memory.summary}"
+        return dict(request, system_message=system_message)
+
+    def __summarize_history_request(self, turns: List[Tuple[str, str]]) -> Dict[str, Any]:
+        prompt_pair = self.prompts[SUMMARIZE_HISTORY_PROMPT_NAME]
+        template = self.__templates[SUMMARIZE_HISTORY_PROMPT_NAME]
+        return dict(system_message=prompt_pair.system_prompt,
+                    user_message=template.format(summary=self.memory.summary, turns=format_turns(turns)),
+                    temperature=0.0, max_tokens=300, route=self.routes.get(SUMMARIZE_HISTORY_NAME))
+
+    def __rephrase_user_intent(self, query: str, temperature: float = 0.7) -> CompletionTransaction:
+        completion_transaction = self.llm.chat(**self.__rephrase_user_intent_request(query, temperature))
+        completion_transaction.set_name(REPHRASE_USER_INTENT_NAME)
         completion_transaction.set_json_key("rephrased")
         return completion_transaction
 
+    async def __arephrase_user_intent(self, query: str, temperature: float = 0.7) -> CompletionTransaction:
+        completion_transaction = await self.llm.achat(**self.__rephrase_user_intent_request(query, temperature))
+        completion_transaction.set_name(REPHRASE_USER_INTENT_NAME)
+        completion_transaction.set_json_key("rephrased")
+        return completion_transaction
+
+    def __plan_query(self, query: str, temperature: float = 0.7) -> CompletionTransaction:
+        completion_transaction = self.llm.chat(**self.__plan_query_request(query, temperature))
+        completion_transaction.set_name(PLAN_QUERY_NAME)
+        return completion_transaction
+
+    async def __aplan_query(self, query: str, temperature: float = 0.7) -> CompletionTransaction:
+        completion_transaction = await self.llm.achat(**self.__plan_query_request(query, temperature))
+        completion_transaction.set_name(PLAN_QUERY_NAME)
+        return completion_transaction
+
+    @staticmethod
+    def __parse_query_plan(completion_transaction: CompletionTransaction) -> Tuple[str, str]:
+        """Returns the rephrased user input and the knowledge base query."""
+        plan = json.loads(completion_transaction.get_response())
+        return plan["rephrased"], plan["search_expression"]
+
+    def __rephrases(self, pipeline_settings: PipelineSettings) -> bool:
+        """Fast path: without history (e.g. in the first turn), there is no context to add by rephrasing."""
+        return pipeline_settings.input_summarization and bool(self.memory.turns or self.memory.summary)
+
+    def __plans_query(self, search_settings: SearchSettings, pipeline_settings: PipelineSettings) -> bool:
+        return self.__rephrases(pipeline_settings) and search_settings.requires_kb_query()
+
     def __generate_knowledge_base_query(self, query: str, temperature: float = 0.0) -> CompletionTransaction:
-        prompt_pair = self.prompts[KNOWLEDGE_BASE_QUERY_PROMPT_NAME]
-        completion_transaction = self.llm.chat(system_message=prompt_pair.system_prompt,
-                                               user_message=prompt_pair.user_prompt.format(query=query),
-                                               temperature=temperature, max_tokens=200)
-        completion_transaction.set_name("Generate Knowledge Base Query")
+        completion_transaction = self.llm.chat(**self.__knowledge_base_query_request(query, temperature))
+        completion_transaction.set_name(KNOWLEDGE_BASE_QUERY_NAME)
         completion_transaction.set_json_key("search_expression")
         return completion_transaction
 
-    def __rag(self, context_list: list, query: str, temperature: float = 0.7) -> CompletionTransaction:
-        context = json.dumps([{"source": doc["path"], "text": doc["content"]} for doc in context_list])
-        prompt_pair = self.prompts[RAG_PROMPT_NAME]
-        completion_transaction = self.llm.chat(system_message=prompt_pair.system_prompt.format(context=context),
-                                               user_message=query, history=self.chat_history, temperature=temperature)
-        completion_transaction.set_name("Generate Response")
+    async def __agenerate_knowledge_base_query(self, query: str, temperature: float = 0.0) -> CompletionTransaction:
+        completion_transaction = await self.llm.achat(**self.__knowledge_base_query_request(query, temperature))
+        completion_transaction.set_name(KNOWLEDGE_BASE_QUERY_NAME)
+        completion_transaction.set_json_key("search_expression")
         return completion_transaction
 
-    def __trim_history(self, max_history_length: int) -> None:
-        max_history_length = min(len(self.chat_history), max_history_length)
-        self.chat_history = self.chat_history[-max_history_length:] if max_history_length else []
+    def __generate_sub_questions(self, query: str, num_questions: int) -> CompletionTransaction:
+        completion_transaction = self.llm.chat(**self.__sub_questions_request(query, num_questions))
+        completion_transaction.set_name(GENERATE_SUB_QUESTIONS_NAME)
+        return completion_transaction
 
-    def set_prompts(self, prompts: Dict[str, PromptPair]) -> None:
-        """Set the LLM prompts that will be used for all further chat interactions."""
-        self.prompts = prompts
+    async def __agenerate_sub_questions(self, query: str, num_questions: int) -> CompletionTransaction:
+        completion_transaction = await self.llm.achat(**self.__sub_questions_request(query, num_questions))
+        completion_transaction.set_name(GENERATE_SUB_QUESTIONS_NAME)
+        return completion_transaction
 
-    def chat(self, query: str, search_settings: SearchSettings, pipeline_settings: PipelineSettings) -> ChatTransaction:
+    @staticmethod
+    def __parse_sub_questions(completion_transaction: CompletionTransaction, num_questions: int) -> List[str]:
+        """Returns the sub-questions, or none if the answer is malformed (the turn then searches with the query)."""
+        try:
+            questions = json.loads(completion_transaction.get_response())["questions"]
+            if not isinstance(questions, list):
+                return []
+            return [question for question in questions if isinstance(question, str) and question][:num_questions]
+        except (ValueError, KeyError, TypeError):
+            return []
+
+    @staticmethod
+    def __generates_sub_questions(pipeline_settings: PipelineSettings) -> bool:
+        return pipeline_settings.multi_query and pipeline_settings.num_sub_questions > 0
+
+    @staticmethod
+    def __search_queries(query: str, rephrased_query: str, knowledge_base_query: str,
+                         sub_questions: List[str]) -> List[Tuple[str, str]]:
         """
-        Main method to interact with chatbot.
+        Returns the pairs of user query and knowledge base query to search with in multi-query retrieval.
 
-        Apart from the query, the search settings and the pipeline settings used for this transaction need to be passed
-        along explicitly.
+        The first pair is the search as configured, the raw user input and the sub-questions are used for both queries.
         """
+        queries = [(rephrased_query, knowledge_base_query)]
+        for variant in [query] + sub_questions:
+            if all(variant != user_query for user_query, _ in queries):
+                queries.append((variant, variant))
+        return queries
 
-        # trim chat history for next request
-        self.__trim_history(pipeline_settings.num_history)
+    @staticmethod
+    def __merge_results(chat_transaction: ChatTransaction, search_transactions: List[SearchTransaction],
+                        search_settings: SearchSettings) -> list:
+        """Records the searches and returns the `top` documents of their results merged by rank fusion."""
+        for search_transaction in search_transactions:
+            chat_transaction.add_search_transaction(search_transaction)
+        if len(search_transactions) == 1:
+            return search_transactions[0].documents
+        documents = fuse_documents([t.documents for t in search_transactions])[:search_settings.top]
+        chat_transaction.set_documents(documents)
+        return documents
 
-        chat_transaction = ChatTransaction(query)
+    def __rag(self, context_list: list, query: str, pipeline_settings: PipelineSettings) -> CompletionTransaction:
+        context = self.__format_context(context_list, pipeline_settings)
+        completion_transaction = self.llm.chat(**self.__rag_request(context, query, pipeline_settings))
+        completion_transaction.set_name(GENERATE_RESPONSE_NAME)
+        completion_transaction.set_context(context)
+        return completion_transaction
+
+    async def __arag(self, context_list: list, query: str,
+                     pipeline_settings: PipelineSettings) -> CompletionTransaction:
+        context = self.__format_context(context_list, pipeline_settings)
+        completion_transaction = await self.llm.achat(**self.__rag_request(context, query, pipeline_settings))
+        completion_transaction.set_name(GENERATE_RESPONSE_NAME)
+        completion_transaction.set_context(context)
+        return completion_transaction
+
+    def __rag_stream(self, context_list: list, query: str,
+                     pipeline_settings: PipelineSettings) -> Generator[str, None, CompletionTransaction]:
+        context = self.__format_context(context_list, pipeline_settings)
+        completion_transaction = yield from self.llm.chat_stream(**self.__rag_request(context, query,
+                                                                                      pipeline_settings))
+        completion_transaction.set_name(GENERATE_RESPONSE_NAME)
+        completion_transaction.set_context(context)
+        return completion_transaction
+
+    def __trim_history(self, chat_transaction: ChatTransaction, pipeline_settings: PipelineSettings) -> None:
+        """Trims the history to the window, turns falling out of it are added to the summary if enabled."""
+        evicted_turns = self.memory.trim(pipeline_settings.num_history)
+        if evicted_turns and pipeline_settings.history_summarization:
+            completion_transaction = self.llm.chat(**self.__summarize_history_request(evicted_turns))
+            completion_transaction.set_name(SUMMARIZE_HISTORY_NAME)
+            chat_transaction.add_completion_transaction(completion_transaction)
+            self.memory.set_summary(completion_transaction.get_response())
+
+    async def __atrim_history(self, chat_transaction: ChatTransaction, pipeline_settings: PipelineSettings) -> None:
+        """Async variant of `__trim_history`."""
+        evicted_turns = self.memory.trim(pipeline_settings.num_history)
+        if evicted_turns and pipeline_settings.history_summarization:
+            completion_transaction = await self.llm.achat(**self.__summarize_history_request(evicted_turns))
+            completion_transaction.set_name(SUMMARIZE_HISTORY_NAME)
+            chat_transaction.add_completion_transaction(completion_transaction)
+            self.memory.set_summary(completion_transaction.get_response())
+
+    def __uses_response_cache(self, pipeline_settings: PipelineSettings) -> bool:
+        # with history, only a rephrased query stands on its own, the raw query may need the context of the conversation
+        return self.response_cache is not None and (pipeline_settings.input_summarization
+                                                    or not (self.memory.turns or self.memory.summary))
+
+    def __reuses_embedding(self, search_settings: SearchSettings) -> bool:
+        # the response cache is looked up with the embedding of the rephrased query, which vector search can reuse
+        return bool(search_settings.vector_fields) and search_settings.vector_search == "user query"
+
+    def __lookup_response(self, chat_transaction: ChatTransaction, rephrased_query: str,
+                          embedding: Tuple[Dict[str, Any], Span], search_settings: SearchSettings,
+                          pipeline_settings: PipelineSettings) -> bool:
+        """Looks up the response cache and records the lookup. On a hit, the cached response is set."""
+        embedding_completion, embedding_span = embedding
+        with Span(RESPONSE_CACHE_NAME) as span:
+            cached_response = self.response_cache.lookup(embedding_completion["data"][0]["embedding"],
+                                                         fingerprint(self.prompts, search_settings,
+                                                                     pipeline_settings))
+
+        # the embedding is recorded with the search if it is reused for vector search
+        owns_embedding = cached_response is not None or not self.__reuses_embedding(search_settings)
+        if owns_embedding:
+            span.add_child(embedding_span)
+        lookup_transaction = SearchTransaction(documents=cached_response.documents if cached_response else [],
+                                               embedding_completion=embedding_completion if owns_embedding else None,
+                                               text_query=None, vector_query=rephrased_query, span=span)
+        if cached_response is None:
+            chat_transaction.set_cache_lookup(lookup_transaction)
+            return False
+
+        chat_transaction.add_search_transaction(lookup_transaction)
+        chat_transaction.set_response(cached_response.response)
+        chat_transaction.set_cached(True)
+        return True
+
+    def __cache_response(self, chat_transaction: ChatTransaction, query_vector: List[float], documents: list,
+                         search_settings: SearchSettings, pipeline_settings: PipelineSettings) -> None:
+        self.response_cache.add(query_vector, CachedResponse(query=chat_transaction.query,
+                                                             response=chat_transaction.response, documents=documents,
+                                                             fingerprint=fingerprint(self.prompts, search_settings,
+                                                                                     pipeline_settings)))
+
+    @staticmethod
+    def __pack_context(chat_transaction: ChatTransaction, documents: list,
+                       pipeline_settings: PipelineSettings) -> list:
+        """Selects the documents for the response generation within the token budget of the pipeline settings."""
+        with Span(PACK_CONTEXT_NAME) as span:
+            context = pack_context(documents, max_tokens=pipeline_settings.context_max_tokens,
+                                   dedup_threshold=pipeline_settings.context_dedup_threshold)
+            span.set_attribute("saved_tokens", context.get_saved_tokens())
+        chat_transaction.span.add_child(span)
+        chat_transaction.set_context(context)
+        return context.documents
+
+    def __end_span(self, chat_transaction: ChatTransaction) -> None:
+        chat_transaction.span.end()
+        if self.span_exporter is not None:
+            self.span_exporter.export(chat_transaction.span)
+
+    def __finish(self, chat_transaction: ChatTransaction, pipeline_settings: PipelineSettings) -> ChatTransaction:
+        # keep history, turns falling out of the window are summarized now that the response has been produced
+        self.memory.append(chat_transaction.query, chat_transaction.response)
+        self.__trim_history(chat_transaction, pipeline_settings)
+
+        self.__end_span(chat_transaction)
+        chat_transaction.compact()
+        return chat_transaction
+
+    async def __afinish(self, chat_transaction: ChatTransaction,
+                        pipeline_settings: PipelineSettings) -> ChatTransaction:
+        """Async variant of `__finish`."""
+        self.memory.append(chat_transaction.query, chat_transaction.response)
+        await self.__atrim_history(chat_transaction, pipeline_settings)
 
-        # rephrase query (optional)
+        self.__end_span(chat_transaction)
+        chat_transaction.compact()
+        return chat_transaction
+
+    def set_prompts(self, prompts: Dict[str, PromptPair]) -> None:
+        """
+        Set the LLM prompts that will be used for all further chat interactions.
+
+        If the prompts differ from the previous ones, their templates are compiled. The response cache is kept, since
+        it may be shared with other sessions and its entries only match the prompts they were generated with.
+        """
+        if self.prompts is not None and prompts_fingerprint(prompts) == prompts_fingerprint(self.prompts):
+            self.prompts = prompts
+            return
+        self.__templates = {name: PromptTemplate(prompt_pair.user_prompt) for name, prompt_pair in prompts.items()
+                            if prompt_pair.user_prompt is not None}
+        self.__rag_template = PromptTemplate(prompts[RAG_PROMPT_NAME].system_prompt)
+        self.__stable_rag_system_message = self.__rag_template.format(context=RAG_CONTEXT_REFERENCE)
+        self.prompts = prompts
+
+    def __retrieve(self, chat_transaction: ChatTransaction, search_settings: SearchSettings,
+                   pipeline_settings: PipelineSettings) -> Tuple[Optional[list], Optional[List[float]]]:
+        """
+        Runs the stages before response generation.
+
+        Returns the documents found (None if the response was cached) and the query vector for the response cache.
+        """
+        query = chat_transaction.query
+
+        # rephrase query and generate knowledge base query with one request or rephrase query only (optional)
+        plans_query = self.__plans_query(search_settings, pipeline_settings)
         rephrased_query = query
-        if pipeline_settings.input_summarization:
+        knowledge_base_query = None
+        if plans_query:
+            plan_transaction = self.__plan_query(query, temperature=pipeline_settings.input_summarization_temperature)
+            chat_transaction.add_completion_transaction(plan_transaction)
+            rephrased_query, knowledge_base_query = self.__parse_query_plan(plan_transaction)
+        elif self.__rephrases(pipeline_settings):
             rephrased_query_transaction = self.__rephrase_user_intent(query,
                                                                       temperature=pipeline_settings.input_summarization_temperature)
             chat_transaction.add_completion_transaction(rephrased_query_transaction)
             rephrased_query = rephrased_query_transaction.get_response()
 
+        # look up response cache (optional)
+        embedding = None
+        if self.__uses_response_cache(pipeline_settings):
+            embedding = self.search.embedding(rephrased_query)
+            if self.__lookup_response(chat_transaction, rephrased_query, embedding, search_settings,
+                                      pipeline_settings):
+                return None, None
+
         # generate knowledge base query (optional)
-        knowledge_base_query = rephrased_query
-        if search_settings.requires_kb_query():
+        if knowledge_base_query is None:
+            knowledge_base_query = rephrased_query
+        if search_settings.requires_kb_query() and not plans_query:
             knowledge_base_query_transaction = self.__generate_knowledge_base_query(rephrased_query,
                                                                                     temperature=search_settings.temperature_kb_query)
             chat_transaction.add_completion_transaction(knowledge_base_query_transaction)
             knowledge_base_query = knowledge_base_query_transaction.get_response()
 
-        # perform search in knowledge base
-        search_transaction = self.search.search(user_query=rephrased_query, kb_query=knowledge_base_query,
-                                                search_settings=search_settings)
-        chat_transaction.add_search_transaction(search_transaction)
+        # generate sub-questions for multi-query retrieval (optional)
+        sub_questions = []
+        if self.__generates_sub_questions(pipeline_settings):
+            sub_questions_transaction = self.__generate_sub_questions(rephrased_query,
+                                                                      pipeline_settings.num_sub_questions)
+            chat_transaction.add_completion_transaction(sub_questions_transaction)
+            sub_questions = self.__parse_sub_questions(sub_questions_transaction, pipeline_settings.num_sub_questions)
+
+        # perform search in knowledge base, with several query variants concurrently for multi-query retrieval
+        search_embedding = embedding if self.__reuses_embedding(search_settings) else None
+        if pipeline_settings.multi_query:
+            queries = self.__search_queries(query, rephrased_query, knowledge_base_query, sub_questions)
+            search_transactions = self.search.search_many(queries, search_settings, embedding=search_embedding)
+            documents = self.__merge_results(chat_transaction, search_transactions, search_settings)
+        else:
+            search_transaction = self.search.search(user_query=rephrased_query, kb_query=knowledge_base_query,
+                                                    search_settings=search_settings, embedding=search_embedding)
+            chat_transaction.add_search_transaction(search_transaction)
+            documents = search_transaction.documents
+
+        return documents, embedding[0]["data"][0]["embedding"] if embedding else None
+
+    def chat(self, query: str, search_settings: SearchSettings, pipeline_settings: PipelineSettings) -> ChatTransaction:
+        """
+        Main method to interact with chatbot.
+
+        Apart from the query, the search settings and the pipeline settings used for this transaction need to be passed
+        along explicitly.
+        """
+
+        chat_transaction = ChatTransaction(query)
+
+        # trim chat history for next request (only if the window was reduced, the history is trimmed after each turn)
+        self.__trim_history(chat_transaction, pipeline_settings)
+        documents, query_vector = self.__retrieve(chat_transaction, search_settings, pipeline_settings)
+        if documents is None:
+            return self.__finish(chat_transaction, pipeline_settings)
 
         # generate response based on found documents
-        rag_transaction = self.__rag(search_transaction.documents, query, temperature=pipeline_settings.rag_temperature)
+        documents = self.__pack_context(chat_transaction, documents, pipeline_settings)
+        rag_transaction = self.__rag(documents, query, pipeline_settings)
         chat_transaction.add_completion_transaction(rag_transaction)
         chat_transaction.set_response(rag_transaction.get_response())
 
-        # keep history
-        self.chat_history.append((query, rag_transaction.get_response()))
+        if query_vector is not None:
+            self.__cache_response(chat_transaction, query_vector, documents, search_settings, pipeline_settings)
+        return self.__finish(chat_transaction, pipeline_settings)
 
-        return chat_transaction
+    def chat_stream(self, query: str, search_settings: SearchSettings,
+                    pipeline_settings: PipelineSettings) -> Generator[str, None, ChatTransaction]:
+        """
+        Streaming variant of `chat`.
+
+        The stages before the response generation run as in `chat`, then the response is yielded in deltas as it is
+        generated. The complete chat transaction is returned once the generator is exhausted. If the generator is
+        closed early (e.g. the client stops reading) or fails, the span is ended and exported with the attribute
+        `incomplete`, and the turn is not added to the history.
+        """
+
+        chat_transaction = ChatTransaction(query)
+        try:
+            # trim chat history for next request (only if the window was reduced, see `chat`)
+            self.__trim_history(chat_transaction, pipeline_settings)
+            documents, query_vector = self.__retrieve(chat_transaction, search_settings, pipeline_settings)
+            if documents is None:
+                yield chat_transaction.response
+                return self.__finish(chat_transaction, pipeline_settings)
+
+            # stream response based on found documents
+            documents = self.__pack_context(chat_transaction, documents, pipeline_settings)
+            rag_transaction = yield from self.__rag_stream(documents, query, pipeline_settings)
+            chat_transaction.add_completion_transaction(rag_transaction)
+            chat_transaction.set_response(rag_transaction.get_response())
+
+            if query_vector is not None:
+                self.__cache_response(chat_transaction, query_vector, documents, search_settings, pipeline_settings)
+            return self.__finish(chat_transaction, pipeline_settings)
+        finally:
+            if chat_transaction.span.end_time_ns is None:
+                chat_transaction.span.set_attribute("incomplete", True)
+                self.__end_span(chat_transaction)
+
+    @staticmethod
+    async def __cancel_tasks(*tasks: Optional[asyncio.Task]) -> None:
+        """Cancels the tasks that are still pending and waits for them, so that their errors are retrieved as well."""
+        tasks = [task for task in tasks if task is not None]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def achat(self, query: str, search_settings: SearchSettings,
+                    pipeline_settings: PipelineSettings) -> ChatTransaction:
+        """
+        Async variant of `chat` that executes the pipeline stages as a dependency graph.
+
+        Stages that do not depend on each other run concurrently, i. e. if vector search uses the user query, its
+        embedding is computed while the knowledge base query for text search and the sub-questions are being
+        generated.
+        """
+
+        chat_transaction = ChatTransaction(query)
+
+        # trim chat history for next request (only if the window was reduced, see `chat`)
+        await self.__atrim_history(chat_transaction, pipeline_settings)
+
+        # rephrase query and generate knowledge base query with one request or rephrase query only (optional)
+        plans_query = self.__plans_query(search_settings, pipeline_settings)
+        rephrased_query = query
+        knowledge_base_query = None
+        if plans_query:
+            plan_transaction = await self.__aplan_query(
+                query, temperature=pipeline_settings.input_summarization_temperature)
+            chat_transaction.add_completion_transaction(plan_transaction)
+            rephrased_query, knowledge_base_query = self.__parse_query_plan(plan_transaction)
+        elif self.__rephrases(pipeline_settings):
+            rephrased_query_transaction = await self.__arephrase_user_intent(
+                query, temperature=pipeline_settings.input_summarization_temperature)
+            chat_transaction.add_completion_transaction(rephrased_query_transaction)
+            rephrased_query = rephrased_query_transaction.get_response()
+
+        # look up response cache (optional)
+        embedding = None
+        if self.__uses_response_cache(pipeline_settings):
+            embedding = await self.search.aembedding(rephrased_query)
+            if self.__lookup_response(chat_transaction, rephrased_query, embedding, search_settings,
+                                      pipeline_settings):
+                return await self.__afinish(chat_transaction, pipeline_settings)
+
+        # embed user query for vector search (runs concurrently to knowledge base query generation)
+        embedding_task = None
+        if self.__reuses_embedding(search_settings) and embedding is None:
+            embedding_task = asyncio.create_task(self.search.aembedding(rephrased_query))
+
+        # generate sub-questions for multi-query retrieval (optional, runs concurrently as well)
+        sub_questions_task = None
+        if self.__generates_sub_questions(pipeline_settings):
+            sub_questions_task = asyncio.create_task(self.__agenerate_sub_questions(
+                rephrased_query, pipeline_settings.num_sub_questions))
+
+        try:
+            # generate knowledge base query (optional)
+            if knowledge_base_query is None:
+                knowledge_base_query = rephrased_query
+            if search_settings.requires_kb_query() and not plans_query:
+                knowledge_base_query_transaction = await self.__agenerate_knowledge_base_query(
+                    rephrased_query, temperature=search_settings.temperature_kb_query)
+                chat_transaction.add_completion_transaction(knowledge_base_query_transaction)
+                knowledge_base_query = knowledge_base_query_transaction.get_response()
+
+            # perform search in knowledge base
+            search_embedding = embedding if self.__reuses_embedding(search_settings) else None
+            if embedding_task is not None:
+                search_embedding = await embedding_task
+            sub_questions = []
+            if sub_questions_task is not None:
+                sub_questions_transaction = await sub_questions_task
+                chat_transaction.add_completion_transaction(sub_questions_transaction)
+                sub_questions = self.__parse_sub_questions(sub_questions_transaction,
+                                                           pipeline_settings.num_sub_questions)
+        finally:
+            # if a stage failed (or the request was cancelled), the concurrent stages must not outlive the request
+            await self.__cancel_tasks(embedding_task, sub_questions_task)
+        if pipeline_settings.multi_query:
+            queries = self.__search_queries(query, rephrased_query, knowledge_base_query, sub_questions)
+            search_transactions = await self.search.asearch_many(queries, search_settings, embedding=search_embedding)
+            documents = self.__merge_results(chat_transaction, search_transactions, search_settings)
+        else:
+            search_transaction = await self.search.asearch(user_query=rephrased_query, kb_query=knowledge_base_query,
+                                                           search_settings=search_settings, embedding=search_embedding)
+            chat_transaction.add_search_transaction(search_transaction)
+            documents = search_transaction.documents
+
+        # generate response based on found documents
+        documents = self.__pack_context(chat_transaction, documents, pipeline_settings)
+        rag_transaction = await self.__arag(documents, query, pipeline_settings)
+        chat_transaction.add_completion_transaction(rag_transaction)
+        chat_transaction.set_response(rag_transaction.get_response())
+
+        if embedding is not None:
+            self.__cache_response(chat_transaction, embedding[0]["data"][0]["embedding"], documents, search_settings,
+                                  pipeline_settings)
+        return await self.__afinish(chat_transaction, pipeline_settings)
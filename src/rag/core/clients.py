@@ -0,0 +1,61 @@
+"""Clients module that provides pooled HTTP sessions shared by the clients of Azure Open AI and Azure Search."""
+
+from contextlib import asynccontextmanager, contextmanager
+from typing import TYPE_CHECKING, AsyncIterator, Iterator
+
+# the HTTP libraries are imported when the first session is created, not when the defaults are read at startup
+if TYPE_CHECKING:
+    import aiohttp
+    import requests
+
+DEFAULT_POOL_SIZE = 32
+DEFAULT_TIMEOUT = 60.0
+
+
+def create_http_session(pool_size: int = DEFAULT_POOL_SIZE) -> "requests.Session":
+    """
+    Creates a requests session keeping up to `pool_size` connections per host alive.
+
+    The session is thread-safe for sending requests, so one session can serve all sessions of the app.
+    Retries are left to the request scheduler.
+    """
+    import requests
+    from requests.adapters import HTTPAdapter
+
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def create_openai_session(pool_size: int = DEFAULT_POOL_SIZE) -> "aiohttp.ClientSession":
+    """Creates an aiohttp session for the async Open AI requests, to be created and closed in the running event loop."""
+    import aiohttp
+
+    return aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=pool_size))
+
+
+@contextmanager
+def use_openai_session(session: "aiohttp.ClientSession") -> Iterator["aiohttp.ClientSession"]:
+    """Sends the async Open AI requests of the current context (and the tasks it starts) with the given session."""
+    import openai
+
+    token = openai.aiosession.set(session)
+    try:
+        yield session
+    finally:
+        openai.aiosession.reset(token)
+
+
+@asynccontextmanager
+async def pooled_openai_session(pool_size: int = DEFAULT_POOL_SIZE) -> AsyncIterator["aiohttp.ClientSession"]:
+    """
+    Shares one aiohttp session between the async Open AI requests of the current context.
+
+    Without it, the openai library opens a new session (and connection) for every async request. The session is
+    bound to the running event loop, so it is scoped to the context instead of the process.
+    """
+    async with create_openai_session(pool_size) as session:
+        with use_openai_session(session):
+            yield session
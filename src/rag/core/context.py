@@ -0,0 +1,98 @@
+"""Context module that assembles the retrieved documents into the context of the response generation."""
+
+import json
+import zlib
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from .tokens import count_tokens
+
+SHINGLE_SIZE = 5
+NUM_PERMUTATIONS = 64
+DEFAULT_DEDUP_THRESHOLD = 0.8
+
+# parameters of the hash functions, fixed seed so that signatures are comparable across processes
+PERMUTATION_A, PERMUTATION_B = np.random.default_rng(42).integers(1, 2 ** 63, (2, NUM_PERMUTATIONS), dtype=np.uint64)
+
+
+def get_document_score(document: Dict[str, Any]) -> float:
+    """Returns the semantic reranker score if available, otherwise the search score."""
+    if document.get("@search.reranker_score") is not None:
+        return document["@search.reranker_score"]
+    return document.get("@search.score") or 0.0
+
+
+def to_context_entry(document: Dict[str, Any]) -> Dict[str, str]:
+    return {"source": document["path"], "text": document["content"]}
+
+
+def format_context(documents: List[Dict[str, Any]]) -> str:
+    return json.dumps([to_context_entry(document) for document in documents])
+
+
+def minhash_signature(text: str) -> np.ndarray:
+    """
+    Computes the MinHash signature of the word shingles of the text.
+
+    The fraction of equal values of two signatures estimates the Jaccard similarity of the shingle sets.
+    """
+    words = text.casefold().split()
+    shingles = {" ".join(words[i:i + SHINGLE_SIZE]) for i in range(max(1, len(words) - SHINGLE_SIZE + 1))}
+    hashes = np.fromiter((zlib.crc32(s.encode("utf-8")) for s in shingles), dtype=np.uint64, count=len(shingles))
+    # universal hashing modulo 2^64 (unsigned overflow wraps around)
+    return (np.outer(hashes, PERMUTATION_A) + PERMUTATION_B).min(axis=0)
+
+
+class PackedContext:
+    """Result of the context assembly: the documents that fit the budget and the tokens saved by the assembly."""
+
+    __slots__ = ("documents", "tokens", "retrieved_tokens", "duplicates", "over_budget")
+
+    def __init__(self, documents: List[Dict[str, Any]], tokens: int, retrieved_tokens: int, duplicates: int,
+                 over_budget: int) -> None:
+        self.documents = documents
+        self.tokens = tokens
+        self.retrieved_tokens = retrieved_tokens
+        self.duplicates = duplicates
+        self.over_budget = over_budget
+
+    def get_saved_tokens(self) -> int:
+        return self.retrieved_tokens - self.tokens
+
+
+def pack_context(documents: List[Dict[str, Any]], max_tokens: Optional[int] = None,
+                 dedup_threshold: Optional[float] = DEFAULT_DEDUP_THRESHOLD) -> PackedContext:
+    """
+    Selects the documents for the context of the response generation.
+
+    Documents are considered by decreasing score. A document is dropped if it is a near duplicate (estimated Jaccard
+    similarity of its shingles of at least `dedup_threshold`) of a selected document or if it does not fit into the
+    remaining token budget, in which case lower scored but shorter documents may still be selected. A budget or
+    threshold of None disables the respective step.
+    """
+    entry_tokens = [count_tokens(json.dumps(to_context_entry(document))) for document in documents]
+    order = sorted(range(len(documents)), key=lambda i: get_document_score(documents[i]), reverse=True)
+
+    selected: List[int] = []
+    signatures: List[np.ndarray] = []
+    tokens = 0
+    duplicates = 0
+    over_budget = 0
+    for i in order:
+        signature = None
+        if dedup_threshold is not None:
+            signature = minhash_signature(documents[i]["content"])
+            if any(np.mean(signature == other) >= dedup_threshold for other in signatures):
+                duplicates += 1
+                continue
+        if max_tokens is not None and tokens + entry_tokens[i] > max_tokens:
+            over_budget += 1
+            continue
+        if signature is not None:
+            signatures.append(signature)
+        selected.append(i)
+        tokens += entry_tokens[i]
+
+    return PackedContext(documents=[documents[i] for i in selected], tokens=tokens,
+                         retrieved_tokens=sum(entry_tokens), duplicates=duplicates, over_budget=over_budget)
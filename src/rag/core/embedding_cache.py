@@ -0,0 +1,130 @@
+"""Embedding cache module that provides a content-addressed cache for embedding vectors."""
+
+import hashlib
+import sqlite3
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from typing import Iterable, List, Optional, Tuple
+
+DEFAULT_MAX_ENTRIES = 1024
+DEFAULT_MAX_DISK_ENTRIES = 100000
+
+
+def normalize_text(text: str) -> str:
+    """Normalizes text so that near-identical inputs (case, surrounding and repeated whitespace) share a cache key."""
+    return " ".join(text.split()).casefold()
+
+
+def cache_key(deployment_name: str, text: str) -> str:
+    return hashlib.sha256(f"{deployment_name}\x00{normalize_text(text)}".encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    Two-tier cache for embedding vectors keyed by (deployment, normalized text).
+
+    The first tier is an in-memory LRU cache, the optional second tier is a SQLite database storing the vectors as
+    packed float32 arrays. Entries expire after the TTL (if set) in both tiers. The number of rows is tracked, so the
+    oldest rows are only deleted once there are more than `max_disk_entries`, and the entries of a batch are written
+    in one transaction (see `put_many`).
+    The cache is thread-safe so that it can be shared between sessions.
+    """
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES, ttl_seconds: Optional[float] = None,
+                 path: Optional[str] = None, max_disk_entries: int = DEFAULT_MAX_DISK_ENTRIES) -> None:
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.max_disk_entries = max_disk_entries
+        self.hits = 0
+        self.misses = 0
+        self.__memory: "OrderedDict[str, Tuple[float, List[float]]]" = OrderedDict()
+        self.__lock = threading.Lock()
+        self.__db = None
+        self.__disk_entries = 0
+        if path:
+            self.__db = sqlite3.connect(path, check_same_thread=False)
+            self.__db.execute("CREATE TABLE IF NOT EXISTS embeddings "
+                              "(key TEXT PRIMARY KEY, embedding BLOB NOT NULL, created REAL NOT NULL)")
+            self.__db.execute("CREATE INDEX IF NOT EXISTS embeddings_created ON embeddings (created)")
+            self.__db.commit()
+            self.__disk_entries = self.__db.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def __expired(self, created: float) -> bool:
+        return self.ttl_seconds is not None and time.time() - created > self.ttl_seconds
+
+    def __put_memory(self, key: str, created: float, embedding: List[float]) -> None:
+        self.__memory[key] = (created, embedding)
+        self.__memory.move_to_end(key)
+        while len(self.__memory) > self.max_entries:
+            self.__memory.popitem(last=False)
+
+    def __get_disk(self, key: str) -> Optional[Tuple[float, List[float]]]:
+        row = self.__db.execute("SELECT created, embedding FROM embeddings WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        created, blob = row
+        if self.__expired(created):
+            self.__disk_entries -= self.__db.execute("DELETE FROM embeddings WHERE key = ?", (key,)).rowcount
+            self.__db.commit()
+            return None
+        return created, array("f", blob).tolist()
+
+    def __put_disk(self, entries: List[Tuple[str, float, List[float]]]) -> None:
+        """Writes the entries in one transaction and deletes the oldest rows beyond `max_disk_entries`."""
+        disk_entries = self.__disk_entries
+        with self.__db:
+            for key, created, embedding in entries:
+                row = (array("f", embedding).tobytes(), created, key)
+                updated = self.__db.execute("UPDATE embeddings SET embedding = ?, created = ? WHERE key = ?", row)
+                if not updated.rowcount:
+                    self.__db.execute("INSERT INTO embeddings (embedding, created, key) VALUES (?, ?, ?)", row)
+                    disk_entries += 1
+            if disk_entries > self.max_disk_entries:
+                disk_entries -= self.__db.execute(
+                    "DELETE FROM embeddings WHERE key IN (SELECT key FROM embeddings ORDER BY created LIMIT ?)",
+                    (disk_entries - self.max_disk_entries,)).rowcount
+        self.__disk_entries = disk_entries  # only counted once the transaction is committed
+
+    def get(self, deployment_name: str, text: str) -> Optional[List[float]]:
+        """Returns the cached embedding or None if there is no valid entry. Updates the hit/miss counters."""
+        key = cache_key(deployment_name, text)
+        with self.__lock:
+            entry = self.__memory.get(key)
+            if entry is not None and self.__expired(entry[0]):
+                del self.__memory[key]
+                entry = None
+            if entry is not None:
+                self.__memory.move_to_end(key)
+            elif self.__db is not None:
+                entry = self.__get_disk(key)
+                if entry is not None:
+                    self.__put_memory(key, *entry)
+
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return entry[1]
+
+    def put(self, deployment_name: str, text: str, embedding: List[float]) -> None:
+        self.put_many(deployment_name, [text], [embedding])
+
+    def put_many(self, deployment_name: str, texts: Iterable[str], embeddings: Iterable[List[float]]) -> None:
+        """Caches the embeddings of several texts, the disk tier writes them in a single transaction."""
+        created = time.time()
+        entries = [(cache_key(deployment_name, text), created, embedding) for text, embedding in zip(texts, embeddings)]
+        with self.__lock:
+            for entry in entries:
+                self.__put_memory(*entry)
+            if self.__db is not None and entries:
+                self.__put_disk(entries)
+
+    def clear(self) -> None:
+        with self.__lock:
+            self.__memory.clear()
+            if self.__db is not None:
+                self.__db.execute("DELETE FROM embeddings")
+                self.__db.commit()
+                self.__disk_entries = 0
@@ -0,0 +1,42 @@
+"""Fusion module that provides rank fusion to merge several result lists client-side."""
+
+from typing import Any, Dict, Hashable, List, Tuple
+
+# constant of the reciprocal rank fusion, as used by Azure Cognitive Search
+RRF_K = 60
+
+
+def reciprocal_rank_fusion(rankings: List[List[Hashable]], k: int = RRF_K) -> List[Tuple[Hashable, float]]:
+    """
+    Merges rankings with reciprocal rank fusion.
+
+    Every item gets the score `sum(1 / (k + rank))` over the rankings that contain it (ranks start at 1).
+    Returns the items with their fused scores in descending order of score.
+    """
+    scores: Dict[Hashable, float] = {}
+    for ranking in rankings:
+        for rank, item in enumerate(ranking, start=1):
+            scores[item] = scores.get(item, 0.0) + 1 / (k + rank)
+    return sorted(scores.items(), key=lambda item: -item[1])
+
+
+def document_key(document: Dict[str, Any]) -> Tuple[str, str]:
+    """Identifies a document across result lists, a path can have several chunks so the content is part of the key."""
+    return document["path"], document["content"]
+
+
+def fuse_documents(result_lists: List[List[Dict[str, Any]]], k: int = RRF_K) -> List[Dict[str, Any]]:
+    """
+    Merges the documents of several searches with reciprocal rank fusion and removes duplicates.
+
+    Returns copies of the documents in descending order of the fused score, which replaces the search score. The
+    reranker score is reset, since the scores of different searches are not comparable.
+    """
+    documents: Dict[Tuple[str, str], Dict[str, Any]] = {}
+    rankings = []
+    for result_list in result_lists:
+        for document in result_list:
+            documents.setdefault(document_key(document), document)
+        rankings.append(list(dict.fromkeys(document_key(document) for document in result_list)))
+    return [dict(documents[key], **{"@search.score": score, "@search.reranker_score": None})
+            for key, score in reciprocal_rank_fusion(rankings, k)]
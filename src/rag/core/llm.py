@@ -1,22 +1,39 @@
 """LLM module that provides LLM class based on Azure Open AI."""
 
-from typing import Any, Dict, List, Tuple, Optional
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Awaitable, Callable, Dict, Generator, List, Tuple, Optional, Union
 
+import numpy as np
 import openai
+import requests
 
+from .embedding_cache import EmbeddingCache
 from .models.completion_transaction import CompletionTransaction
+from .models.span import Span
+from .routing import StageRoute
+from .scheduler import Priority, RequestScheduler, is_rate_limit_error
+from .tokens import count_message_tokens, count_tokens
 
 ASSISTANT = "assistant"
 SYSTEM = "system"
 USER = "user"
 
+DEFAULT_API_VERSION = "2023-03-15-preview"
+DEFAULT_EMBEDDING_CONCURRENCY = 4
+# limits of a single embedding request (Azure Open AI accepts at most 16 inputs per request)
+DEFAULT_EMBEDDING_BATCH_SIZE = 16
+DEFAULT_EMBEDDING_BATCH_TOKENS = 8191
 
-def configure_openapi(endpoint: str, key: str):
-    """Set the API configuration for OpenAI globally."""
+
+def configure_openapi(endpoint: str, key: str, session: Optional[requests.Session] = None,
+                      api_version: str = DEFAULT_API_VERSION):
+    """Set the API configuration for OpenAI globally, optionally with a pooled session used by all sync requests."""
     openai.api_type = "azure"
     openai.api_base = endpoint
-    openai.api_version = "2023-03-15-preview"
+    openai.api_version = api_version
     openai.api_key = key
+    if session is not None:
+        openai.requestssession = session
 
 
 class LLM:
@@ -24,22 +41,74 @@ class LLM:
     Client for Azure Open AI LLMs.
 
     Supports the Chat API and the Embedding API.
+    If a scheduler is given, all requests go through it with the priority of the client, which rate limits and
+    retries them. The token cost of a chat request is estimated from the messages and `max_tokens`.
+    The client holds no conversation state, so one instance can be shared by all sessions.
+    Chat requests can be routed to another deployment, `max_tokens` and timeout per pipeline stage (see `StageRoute`).
+    Throttled chat requests are sent to the fallback deployment if one is configured.
+    The messages of a chat request start with the system message followed by the history. Volatile content (e.g. the
+    retrieved documents) can be passed as context message after the history, so that the prefix of the messages stays
+    the same across requests and can be served from the prompt cache of the service.
     """
 
-    def __init__(self, chat_deployment_name: str, embedding_deployment_name: str):
+    def __init__(self, chat_deployment_name: str, embedding_deployment_name: str,
+                 embedding_cache: Optional[EmbeddingCache] = None,
+                 embedding_concurrency: int = DEFAULT_EMBEDDING_CONCURRENCY,
+                 scheduler: Optional[RequestScheduler] = None, priority: Priority = Priority.INTERACTIVE,
+                 request_timeout: Optional[float] = None, fallback_deployment_name: Optional[str] = None):
         self.chat_deployment_name = chat_deployment_name
+        self.fallback_deployment_name = fallback_deployment_name
         self.embedding_deployment_name = embedding_deployment_name
+        self.embedding_cache = embedding_cache
+        self.embedding_concurrency = embedding_concurrency
+        self.scheduler = scheduler
+        self.priority = priority
+        self.request_timeout = request_timeout
 
-    def chat(self, system_message: str, user_message: str, history: Optional[List[Tuple[str, str]]] = None,
-             temperature: float = 0.7, max_tokens: int = 1024, n: int = 1) -> CompletionTransaction:
-        """
-        Performs a chat request to the generative LLM.
+    def __request(self, request: Callable[[], Any], estimate_cost: Callable[[], int],
+                  span: Optional[Span] = None, fallback: Optional[Callable[[], Any]] = None) -> Any:
+        if self.scheduler is None:
+            try:
+                return request()
+            except Exception as e:
+                if fallback is None or not is_rate_limit_error(e):
+                    raise
+                return fallback()
+        return self.scheduler.run(request, estimate_cost(), self.priority, span, fallback)
 
-        The system message (system prompt) primes the model and the user message is the actual chat input for this
-        request.
-        If available, a chat history can be passed along to provide context to the model.
-        """
+    async def __arequest(self, request: Callable[[], Awaitable[Any]], estimate_cost: Callable[[], int],
+                         span: Optional[Span] = None, fallback: Optional[Callable[[], Awaitable[Any]]] = None) -> Any:
+        if self.scheduler is None:
+            try:
+                return await request()
+            except Exception as e:
+                if fallback is None or not is_rate_limit_error(e):
+                    raise
+                return await fallback()
+        return await self.scheduler.arun(request, estimate_cost(), self.priority, span, fallback)
+
+    def __route(self, route: Optional[StageRoute], max_tokens: int) -> StageRoute:
+        """Returns the route of a chat request with the defaults of the client and of the stage filled in."""
+        route = route or StageRoute()
+        return StageRoute(deployment_name=route.deployment_name or self.chat_deployment_name,
+                          max_tokens=route.max_tokens or max_tokens,
+                          request_timeout=route.request_timeout or self.request_timeout,
+                          fallback_deployment_name=route.fallback_deployment_name or self.fallback_deployment_name)
+
+    @staticmethod
+    def __fallback(create: Callable[[str], Any], route: StageRoute, span: Span) -> Optional[Callable[[], Any]]:
+        """Returns the request to the fallback deployment, which records its use in the span."""
+        if route.fallback_deployment_name in (None, route.deployment_name):
+            return None
+
+        def fallback() -> Any:
+            span.set_attribute("fallback_deployment", route.fallback_deployment_name)
+            return create(route.fallback_deployment_name)
+        return fallback
 
+    @staticmethod
+    def __build_messages(system_message: str, user_message: str, history: Optional[List[Tuple[str, str]]],
+                         context_message: Optional[str] = None) -> List[Dict[str, str]]:
         messages = [
             {
                 "role": SYSTEM,
@@ -50,18 +119,250 @@ class LLM:
             for u_m, a_m in history:
                 messages.append({"role": USER, "content": u_m})
                 messages.append({"role": ASSISTANT, "content": a_m})
+        if context_message is not None:
+            messages.append({"role": SYSTEM, "content": context_message})
         messages.append({"role": USER, "content": user_message})
+        return messages
+
+    def chat(self, system_message: str, user_message: str, history: Optional[List[Tuple[str, str]]] = None,
+             temperature: float = 0.7, max_tokens: int = 1024, n: int = 1,
+             route: Optional[StageRoute] = None, context_message: Optional[str] = None) -> CompletionTransaction:
+        """
+        Performs a chat request to the generative LLM.
+
+        The system message (system prompt) primes the model and the user message is the actual chat input for this
+        request.
+        If available, a chat history can be passed along to provide context to the model.
+        A route overrides the deployment, `max_tokens` and timeout of the request. A context message is placed between
+        the history and the user message.
+        """
+
+        messages = self.__build_messages(system_message, user_message, history, context_message)
+        route = self.__route(route, max_tokens)
+
+        def create(deployment_name: str) -> Any:
+            return openai.ChatCompletion.create(
+                deployment_id=deployment_name,
+                messages=messages,
+                temperature=temperature,
+                max_tokens=route.max_tokens,
+                n=n,
+                request_timeout=route.request_timeout,
+            )
+
+        with Span("Completion", {"deployment": route.deployment_name}) as span:
+            chat_intent_completion = self.__request(lambda: create(route.deployment_name),
+                                                    lambda: count_message_tokens(messages) + route.max_tokens * n,
+                                                    span, self.__fallback(create, route, span))
+        return CompletionTransaction(chat_intent_completion, messages, span)
+
+    def chat_stream(self, system_message: str, user_message: str, history: Optional[List[Tuple[str, str]]] = None,
+                    temperature: float = 0.7, max_tokens: int = 1024, route: Optional[StageRoute] = None,
+                    context_message: Optional[str] = None) -> Generator[str, None, CompletionTransaction]:
+        """
+        Streaming variant of `chat` that yields the content deltas of the response as they arrive.
+
+        The completion transaction is assembled from the deltas and returned once the stream is exhausted
+        (use `yield from`). The streaming API does not report usage, so token counts are computed locally. If the
+        generator is closed early, the span is ended and the response stream is closed.
+        """
+
+        messages = self.__build_messages(system_message, user_message, history, context_message)
+        route = self.__route(route, max_tokens)
 
-        chat_intent_completion = openai.ChatCompletion.create(
-            deployment_id=self.chat_deployment_name,
-            messages=messages,
-            temperature=temperature,
-            max_tokens=max_tokens,
-            n=n,
-        )
-        return CompletionTransaction(chat_intent_completion, messages)
+        def create(deployment_name: str) -> Any:
+            return openai.ChatCompletion.create(
+                deployment_id=deployment_name,
+                messages=messages,
+                temperature=temperature,
+                max_tokens=route.max_tokens,
+                stream=True,
+                request_timeout=route.request_timeout,
+            )
+
+        span = Span("Completion", {"deployment": route.deployment_name, "stream": True})
+        chunks = self.__request(lambda: create(route.deployment_name),
+                                lambda: count_message_tokens(messages) + route.max_tokens,
+                                span, self.__fallback(create, route, span))
+
+        content = []
+        finish_reason = None
+        usage = None
+        try:
+            for chunk in chunks:
+                if chunk.get("usage"):
+                    usage = chunk["usage"]
+                if not chunk["choices"]:
+                    continue
+                choice = chunk["choices"][0]
+                finish_reason = choice.get("finish_reason") or finish_reason
+                delta = choice["delta"].get("content")
+                if delta:
+                    if not content:
+                        span.set_attribute("time_to_first_token", span.get_duration())
+                    content.append(delta)
+                    yield delta
+        finally:
+            span.end()
+            if hasattr(chunks, "close"):  # releases the connection if the stream was not read to the end
+                chunks.close()
+
+        response = "".join(content)
+        if usage is None:
+            prompt_tokens = count_message_tokens(messages)
+            completion_tokens = count_tokens(response)
+            usage = {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            }
+        completion = {
+            "object": "chat.completion",
+            "model": span.attributes.get("fallback_deployment", route.deployment_name),
+            "choices": [{"index": 0, "message": {"role": ASSISTANT, "content": response},
+                         "finish_reason": finish_reason}],
+            "usage": usage,
+        }
+        return CompletionTransaction(completion, messages, span)
+
+    async def achat(self, system_message: str, user_message: str, history: Optional[List[Tuple[str, str]]] = None,
+                    temperature: float = 0.7, max_tokens: int = 1024, n: int = 1,
+                    route: Optional[StageRoute] = None, context_message: Optional[str] = None
+                    ) -> CompletionTransaction:
+        """Async variant of `chat`."""
+
+        messages = self.__build_messages(system_message, user_message, history, context_message)
+        route = self.__route(route, max_tokens)
+
+        def create(deployment_name: str) -> Awaitable[Any]:
+            return openai.ChatCompletion.acreate(
+                deployment_id=deployment_name,
+                messages=messages,
+                temperature=temperature,
+                max_tokens=route.max_tokens,
+                n=n,
+                request_timeout=route.request_timeout,
+            )
+
+        with Span("Completion", {"deployment": route.deployment_name}) as span:
+            chat_intent_completion = await self.__arequest(
+                lambda: create(route.deployment_name), lambda: count_message_tokens(messages) + route.max_tokens * n,
+                span, self.__fallback(create, route, span))
+        return CompletionTransaction(chat_intent_completion, messages, span)
+
+    def __get_cached_embedding(self, text: str) -> Optional[Dict[str, Any]]:
+        if self.embedding_cache is None:
+            return None
+        embedding = self.embedding_cache.get(self.embedding_deployment_name, text)
+        if embedding is None:
+            return None
+        return {
+            "data": [{"embedding": embedding, "index": 0}],
+            "usage": {"prompt_tokens": 0, "total_tokens": 0},
+            "cached": True,
+        }
+
+    def __cache_embedding(self, text: str, embedding_completion: Dict[str, Any]) -> None:
+        if self.embedding_cache is not None:
+            self.embedding_cache.put(self.embedding_deployment_name, text, embedding_completion["data"][0]["embedding"])
 
     def embedding(self, text: str) -> Dict[str, Any]:
-        """Performs an embedding request to the embedding model."""
-        embedding_completion = openai.Embedding.create(engine=self.embedding_deployment_name, input=text)
+        """
+        Performs an embedding request to the embedding model.
+
+        If an embedding cache is configured, cached vectors are returned without a request. In that case the response
+        reports zero token usage and is flagged with `cached`.
+        """
+        embedding_completion = self.__get_cached_embedding(text)
+        if embedding_completion is None:
+            embedding_completion = self.__request(
+                lambda: openai.Embedding.create(engine=self.embedding_deployment_name, input=text,
+                                                request_timeout=self.request_timeout),
+                lambda: count_tokens(text))
+            self.__cache_embedding(text, embedding_completion)
         return embedding_completion
+
+    async def aembedding(self, text: str) -> Dict[str, Any]:
+        """Async variant of `embedding`."""
+        embedding_completion = self.__get_cached_embedding(text)
+        if embedding_completion is None:
+            embedding_completion = await self.__arequest(
+                lambda: openai.Embedding.acreate(engine=self.embedding_deployment_name, input=text,
+                                                 request_timeout=self.request_timeout),
+                lambda: count_tokens(text))
+            self.__cache_embedding(text, embedding_completion)
+        return embedding_completion
+
+    def embedding_batch(self, texts: List[str]) -> Dict[str, Any]:
+        """
+        Performs a single embedding request for several texts.
+
+        The response contains the embeddings in the order of the texts. Texts found in the embedding cache are not
+        sent to the embedding model.
+        """
+        embeddings: List[Optional[List[float]]] = [None] * len(texts)
+        if self.embedding_cache is not None:
+            embeddings = [self.embedding_cache.get(self.embedding_deployment_name, text) for text in texts]
+        missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+
+        usage = {"prompt_tokens": 0, "total_tokens": 0}
+        if missing:
+            inputs = [texts[i] for i in missing]
+            embedding_completion = self.__request(
+                lambda: openai.Embedding.create(engine=self.embedding_deployment_name, input=inputs,
+                                                request_timeout=self.request_timeout),
+                lambda: sum(count_tokens(text) for text in inputs))
+            usage = embedding_completion["usage"]
+            for data in embedding_completion["data"]:
+                embeddings[missing[data["index"]]] = data["embedding"]
+            if self.embedding_cache is not None:
+                self.embedding_cache.put_many(self.embedding_deployment_name, inputs, [embeddings[i] for i in missing])
+
+        return {
+            "data": [{"embedding": embedding, "index": i} for i, embedding in enumerate(embeddings)],
+            "usage": usage,
+        }
+
+    @staticmethod
+    def __pack_batches(texts: List[str], max_batch_size: int, max_batch_tokens: int) -> List[List[int]]:
+        batches = []
+        batch: List[int] = []
+        batch_tokens = 0
+        for i, text in enumerate(texts):
+            tokens = count_tokens(text)
+            if batch and (len(batch) >= max_batch_size or batch_tokens + tokens > max_batch_tokens):
+                batches.append(batch)
+                batch, batch_tokens = [], 0
+            batch.append(i)
+            batch_tokens += tokens
+        if batch:
+            batches.append(batch)
+        return batches
+
+    def embed_many(self, texts: List[str], max_batch_size: int = DEFAULT_EMBEDDING_BATCH_SIZE,
+                   max_batch_tokens: int = DEFAULT_EMBEDDING_BATCH_TOKENS, max_concurrency: Optional[int] = None,
+                   return_tokens: bool = False) -> Union[np.ndarray, Tuple[np.ndarray, int]]:
+        """
+        Embeds many texts and returns the embeddings as float32 matrix with one row per text.
+
+        The texts are packed into batches bounded by the number of inputs and tokens, the batches are sent
+        concurrently (at most `max_concurrency` requests, by default the embedding concurrency of the LLM). Each
+        response is copied into the matrix as soon as it arrives, so the embeddings are never held as Python floats
+        all at once. With `return_tokens`, the number of tokens used is returned as well.
+        """
+        batches = self.__pack_batches(texts, max_batch_size, max_batch_tokens)
+        matrix = None
+        tokens = 0
+        with ThreadPoolExecutor(max_workers=max_concurrency or self.embedding_concurrency) as executor:
+            futures = {executor.submit(self.embedding_batch, [texts[i] for i in batch]): batch for batch in batches}
+            for future in as_completed(futures):
+                embedding_completion = future.result()
+                vectors = np.asarray([data["embedding"] for data in embedding_completion["data"]], dtype=np.float32)
+                if matrix is None:
+                    matrix = np.empty((len(texts), vectors.shape[1]), dtype=np.float32)
+                matrix[futures[future]] = vectors
+                tokens += embedding_completion["usage"]["total_tokens"]
+
+        if matrix is None:
+            matrix = np.empty((0, 0), dtype=np.float32)
+        return (matrix, tokens) if return_tokens else matrix
@@ -0,0 +1,72 @@
+"""Memory module that provides the conversation memory of a chatbot session."""
+
+from typing import Any, Dict, List, Tuple
+
+# constants used to stringify chat history
+ASSISTANT = "assistant"
+CHAT_GREETING = "How can I help you?"
+SUMMARY = "summary of the earlier conversation"
+USER = "user"
+
+
+def format_turns(turns: List[Tuple[str, str]]) -> str:
+    return "".join(f"{USER}: {user_message}\n{ASSISTANT}: {bot_message}\n" for user_message, bot_message in turns)
+
+
+class ConversationMemory:
+    """
+    Memory of a conversation: the recent turns verbatim and a running summary of the older turns.
+
+    The stringified history is cached and only rebuilt when the turns or the summary change, the formatted turns are
+    kept so that appending a turn only formats the new one.
+    """
+
+    def __init__(self) -> None:
+        self.turns: List[Tuple[str, str]] = []
+        self.summary = ""
+        self.__lines: List[str] = []
+        self.__history_str = None
+
+    def append(self, user_message: str, bot_message: str) -> None:
+        self.turns.append((user_message, bot_message))
+        self.__lines.append(format_turns([(user_message, bot_message)]))
+        self.__history_str = None
+
+    def trim(self, max_turns: int) -> List[Tuple[str, str]]:
+        """Keeps the last `max_turns` turns and returns the older ones that fell out of the window."""
+        evicted = len(self.turns) - max(0, max_turns)
+        if evicted <= 0:
+            return []
+        evicted_turns = self.turns[:evicted]
+        self.turns = self.turns[evicted:]
+        self.__lines = self.__lines[evicted:]
+        self.__history_str = None
+        return evicted_turns
+
+    def set_summary(self, summary: str) -> None:
+        self.summary = summary
+        self.__history_str = None
+
+    def clear(self) -> None:
+        self.turns = []
+        self.__lines = []
+        self.set_summary("")
+
+    def get_history_str(self) -> str:
+        if self.__history_str is None:
+            parts = [f"{ASSISTANT}: {CHAT_GREETING.strip()}\n"]
+            if self.summary:
+                parts.append(f"{SUMMARY}: {self.summary}\n")
+            self.__history_str = "".join(parts + self.__lines)
+        return self.__history_str
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"turns": [list(turn) for turn in self.turns], "summary": self.summary}
+
+    @classmethod
+    def from_dict(cls, memory_dict: Dict[str, Any]) -> "ConversationMemory":
+        memory = cls()
+        for user_message, bot_message in memory_dict.get("turns", []):
+            memory.append(user_message, bot_message)
+        memory.set_summary(memory_dict.get("summary", ""))
+        return memory
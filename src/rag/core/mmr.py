@@ -0,0 +1,54 @@
+"""MMR module that reranks retrieved documents by maximal marginal relevance to reduce redundancy in the context."""
+
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from .context import get_document_score
+from .vectors import normalize_rows
+
+
+def maximal_marginal_relevance(relevance: np.ndarray, similarities: np.ndarray, n: int,
+                               lambda_mult: float) -> List[int]:
+    """
+    Greedily selects `n` items by maximal marginal relevance and returns their indices in the order of selection.
+
+    In every step, the item with the highest `lambda_mult * relevance - (1 - lambda_mult) * redundancy` is selected,
+    where the redundancy of an item is its maximal similarity to the items selected so far. The redundancies of all
+    candidates are updated with one vectorized maximum per step, using the precomputed similarity matrix.
+    """
+    selected: List[int] = []
+    redundancy = np.zeros(len(relevance))
+    for step in range(min(n, len(relevance))):
+        scores = lambda_mult * relevance - (1 - lambda_mult) * redundancy
+        scores[selected] = -np.inf
+        i = int(np.argmax(scores))
+        redundancy = similarities[i] if step == 0 else np.maximum(redundancy, similarities[i])
+        selected.append(i)
+    return selected
+
+
+def mmr_rerank(documents: List[Dict[str, Any]], query_vector: Optional[List[float]], top: int, lambda_mult: float,
+               vector_field: str) -> List[Dict[str, Any]]:
+    """
+    Selects a diverse subset of `top` documents from the (over-fetched) search results.
+
+    The relevance of a document is the cosine similarity of its vector to the query vector, or its search score scaled
+    to [0, 1] if there is no query vector (text search). Documents without a vector are never considered redundant.
+    Returns the selected documents in the order of the search results.
+    """
+    if len(documents) <= top:
+        return documents
+    dimensions = next((len(document[vector_field]) for document in documents if document.get(vector_field)), None)
+    if dimensions is None:
+        return documents[:top]
+
+    vectors = normalize_rows(np.array([document.get(vector_field) or [0.0] * dimensions for document in documents],
+                                      dtype=np.float32))
+    if query_vector is not None:
+        relevance = vectors @ normalize_rows(np.asarray(query_vector, dtype=np.float32))
+    else:
+        scores = np.array([get_document_score(document) for document in documents])
+        relevance = scores / scores.max() if scores.max() > 0 else scores
+    selected = maximal_marginal_relevance(relevance, vectors @ vectors.T, top, lambda_mult)
+    return [documents[i] for i in sorted(selected)]
@@ -1,32 +1,89 @@
-from typing import Any, List
+from typing import Any, List, Optional
 
+from ..context import PackedContext
 from .completion_transaction import CompletionTransaction
-from .search_transaction import SearchTransaction
+from .search_transaction import SearchTransaction, strip_vectors
+from .span import Span
+
+CHAT_SPAN_NAME = "Chat"
 
 
 class ChatTransaction:
     """Class used to represent an entire interaction between the user and the assistant."""
 
+    __slots__ = ("query", "completion_transactions", "search_transactions", "response", "span", "cached",
+                 "cache_lookup", "context", "documents")
+
     def __init__(self, query: str) -> None:
         self.query = query
         self.completion_transactions: List[CompletionTransaction] = []
         self.search_transactions: List[SearchTransaction] = []
         self.response = None  # will be set in setter
+        self.span = Span(CHAT_SPAN_NAME)  # covers the entire interaction, ended by the chatbot
+        self.cached = False
+        self.cache_lookup: Optional[SearchTransaction] = None  # response cache lookup without hit
+        self.context: Optional[PackedContext] = None  # documents selected for the response generation
+        self.documents: Optional[List[Any]] = None  # merged documents of several searches (multi-query retrieval)
 
     def set_response(self, response: str) -> None:
         self.response = response
 
+    def set_cached(self, cached: bool) -> None:
+        self.cached = cached
+
+    def set_context(self, context: PackedContext) -> None:
+        self.context = context
+
+    def set_documents(self, documents: List[Any]) -> None:
+        self.documents = documents
+
+    def set_cache_lookup(self, cache_lookup: SearchTransaction) -> None:
+        self.cache_lookup = cache_lookup
+        self.span.add_child(cache_lookup.span)
+
     def add_completion_transaction(self, completion_transaction: CompletionTransaction) -> None:
         self.completion_transactions.append(completion_transaction)
+        self.span.add_child(completion_transaction.span)
 
     def add_search_transaction(self, search_transaction: SearchTransaction) -> None:
         self.search_transactions.append(search_transaction)
+        self.span.add_child(search_transaction.span)
 
     def get_completion_tokens(self) -> int:
         return sum([t.get_tokens() for t in self.completion_transactions])
 
+    def get_cached_tokens(self) -> int:
+        return sum([t.get_cached_tokens() for t in self.completion_transactions])
+
     def get_embedding_tokens(self) -> int:
-        return sum([t.get_tokens() for t in self.search_transactions])
+        tokens = sum([t.get_tokens() for t in self.search_transactions])
+        return tokens + self.cache_lookup.get_tokens() if self.cache_lookup else tokens
+
+    def get_saved_context_tokens(self) -> int:
+        return self.context.get_saved_tokens() if self.context else 0
+
+    def get_latency(self, name: Optional[str] = None) -> Optional[float]:
+        """Returns the duration of the first span with the given name (or of the entire interaction) in seconds."""
+        span = self.span.find(name) if name is not None else self.span
+        return span.get_duration() if span is not None else None
 
     def get_documents(self) -> List[Any]:
-        return self.search_transactions[0].documents
+        """Returns the merged documents of a multi-query retrieval, otherwise the documents of the search."""
+        return self.documents if self.documents is not None else self.search_transactions[0].documents
+
+    def compact(self) -> None:
+        """
+        Reduces the memory of a finished interaction: drops raw completions, embeddings and document vectors.
+
+        The documents are replaced by copies without vectors, which share the texts of the original documents.
+        """
+        for search_transaction in self.search_transactions:
+            search_transaction.compact()
+        if self.cache_lookup is not None:
+            self.cache_lookup.compact()
+        if self.documents is not None:
+            self.documents = [strip_vectors(document) for document in self.documents]
+        if self.context is not None:
+            self.context.documents = [strip_vectors(document) for document in self.context.documents]
+        for completion_transaction in self.completion_transactions:
+            completion_transaction.compact()
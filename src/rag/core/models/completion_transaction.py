@@ -1,21 +1,31 @@
 import json
-from typing import Any, List
+from typing import Any, List, Optional
+
+from .span import Span
+
+# replaces the formatted documents in the messages of a compacted transaction, the documents are kept with the search
+CONTEXT_REFERENCE = "[documents of the context]"
 
 
 class CompletionTransaction:
     """Represents transaction of a completion request to a generative LLM."""
 
-    def __init__(self, completion: Any, messages: List[Any]) -> None:
+    __slots__ = ("completion", "messages", "span", "json_key", "name", "context")
+
+    def __init__(self, completion: Any, messages: List[Any], span: Optional[Span] = None) -> None:
         self.completion = completion
         self.messages = messages
+        self.span = span if span is not None else Span("Completion")
         self.json_key = None
         self.name = None  # will be set later
+        self.context = None  # formatted documents sent in a message (response generation)
 
     def set_name(self, name: str) -> None:
         self.name = name
+        self.span.name = name
 
     def get_response(self) -> str:
-        response = self.completion.choices[0].message.content
+        response = self.completion['choices'][0]['message']['content']
         if self.json_key is None:
             return response
         return json.loads(response)[self.json_key]
@@ -23,5 +33,33 @@ class CompletionTransaction:
     def set_json_key(self, json_key: str) -> None:
         self.json_key = json_key
 
+    def set_context(self, context: str) -> None:
+        self.context = context
+
     def get_tokens(self) -> int:
         return self.completion['usage']['total_tokens']
+
+    def get_cached_tokens(self) -> int:
+        """Returns the prompt tokens served from the prompt cache of the service (0 if it does not report them)."""
+        details = self.completion['usage'].get('prompt_tokens_details') or {}
+        return details.get('cached_tokens') or 0
+
+    def compact(self) -> None:
+        """
+        Reduces the transaction to what is displayed and counted once the interaction is finished.
+
+        The raw completion object is replaced by its choices and usage. In the message that carries the context, the
+        formatted documents are replaced by a reference, since the documents are kept with the search. The other
+        messages are kept as they are, their prompts and history turns are the strings of the chatbot.
+        """
+        self.completion = {
+            "model": self.completion.get("model"),
+            "choices": [{"message": dict(choice["message"]), "finish_reason": choice.get("finish_reason")}
+                        for choice in self.completion["choices"]],
+            "usage": dict(self.completion["usage"]),
+        }
+        if self.context is not None:
+            self.messages = [{"role": message["role"],
+                              "content": message["content"].replace(self.context, CONTEXT_REFERENCE)}
+                             if self.context in message["content"] else message for message in self.messages]
+            self.context = None
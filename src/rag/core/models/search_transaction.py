@@ -1,5 +1,16 @@
 from typing import Optional, Dict, Any, List
 
+from .span import Span
+
+
+def is_vector(value: Any) -> bool:
+    return hasattr(value, "dtype") or (isinstance(value, list) and len(value) > 0 and isinstance(value[0], float))
+
+
+def strip_vectors(document: Dict[str, Any]) -> Dict[str, Any]:
+    """Returns a copy of the document without its vector fields."""
+    return {key: value for key, value in document.items() if not is_vector(value)}
+
 
 class SearchTransaction:
     """
@@ -8,12 +19,35 @@ class SearchTransaction:
     Class also includes information about the embedding request if available.
     """
 
+    __slots__ = ("documents", "embedding_completion", "text_query", "vector_query", "span", "cached",
+                 "embedding_cache_hits", "embedding_cache_misses")
+
     def __init__(self, documents: List[Any], embedding_completion: Optional[Dict[str, Any]], text_query: Optional[str],
-                 vector_query: Optional[str]) -> None:
+                 vector_query: Optional[str], span: Optional[Span] = None, cached: bool = False) -> None:
         self.documents = documents
         self.embedding_completion = embedding_completion
         self.text_query = text_query
         self.vector_query = vector_query
+        self.span = span if span is not None else Span("Search")
+        self.cached = cached  # documents from the retrieval cache (or a concurrent identical search)
+        self.embedding_cache_hits = 0
+        self.embedding_cache_misses = 0
+        if embedding_completion is not None:
+            if embedding_completion.get("cached"):
+                self.embedding_cache_hits += 1
+            else:
+                self.embedding_cache_misses += 1
 
     def get_tokens(self) -> int:
         return self.embedding_completion['usage']['total_tokens'] if self.embedding_completion else 0
+
+    def compact(self) -> None:
+        """
+        Drops the vectors of the documents and the embedding once the interaction is finished.
+
+        The documents are copied, since they may be shared with a backend or cache.
+        """
+        self.documents = [strip_vectors(document) for document in self.documents]
+        if self.embedding_completion is not None:
+            self.embedding_completion = {"usage": dict(self.embedding_completion["usage"]),
+                                         "cached": bool(self.embedding_completion.get("cached"))}
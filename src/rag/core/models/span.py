@@ -0,0 +1,56 @@
+import time
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+
+class Span:
+    """
+    Represents a timed operation, e.g. a pipeline stage or a request to a backend.
+
+    Spans form a tree via their children. Start and end are wall clock times in nanoseconds, the duration is measured
+    with the high-resolution performance counter. Can be used as context manager that ends the span on exit.
+    """
+
+    __slots__ = ("name", "attributes", "children", "start_time_ns", "end_time_ns", "__start_counter_ns")
+
+    def __init__(self, name: str, attributes: Optional[Dict[str, Any]] = None) -> None:
+        self.name = name
+        self.attributes = attributes if attributes is not None else {}
+        self.children: List["Span"] = []
+        self.start_time_ns = time.time_ns()
+        self.end_time_ns = None  # will be set when span ends
+        self.__start_counter_ns = time.perf_counter_ns()
+
+    def __enter__(self) -> "Span":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> bool:
+        if exc_value is not None:
+            self.set_attribute("error", repr(exc_value))
+        self.end()
+        return False
+
+    def end(self) -> None:
+        if self.end_time_ns is None:
+            self.end_time_ns = self.start_time_ns + time.perf_counter_ns() - self.__start_counter_ns
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def add_child(self, span: "Span") -> None:
+        self.children.append(span)
+
+    def get_duration(self) -> float:
+        """Returns the duration in seconds (up to now if the span has not ended yet)."""
+        end_time_ns = self.end_time_ns
+        if end_time_ns is None:
+            end_time_ns = self.start_time_ns + time.perf_counter_ns() - self.__start_counter_ns
+        return (end_time_ns - self.start_time_ns) / 1e9
+
+    def walk(self, depth: int = 0) -> Iterator[Tuple[int, "Span"]]:
+        """Iterates depth-first over the span and its descendants together with their depth."""
+        yield depth, self
+        for child in self.children:
+            yield from child.walk(depth + 1)
+
+    def find(self, name: str) -> Optional["Span"]:
+        return next((span for _, span in self.walk() if span.name == name), None)
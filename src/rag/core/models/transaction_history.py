@@ -0,0 +1,69 @@
+import pickle
+import tempfile
+from typing import IO, List, Optional, Tuple
+
+from .chat_transaction import ChatTransaction
+
+
+class TransactionHistory:
+    """
+    Chat transactions of a session together with running token totals.
+
+    Only the latest `max_in_memory` transactions are kept in memory, older ones are spilled to a temporary file and
+    loaded again when requested. Query and response of all transactions stay in memory for rendering the chat.
+    """
+
+    def __init__(self, max_in_memory: Optional[int] = None) -> None:
+        self.max_in_memory = max_in_memory
+        self.completion_tokens = 0
+        self.embedding_tokens = 0
+        self.__turns: List[Tuple[str, str]] = []
+        self.__transactions: List[Optional[ChatTransaction]] = []  # None if spilled
+        self.__offsets: List[Optional[int]] = []  # position in the spill file if spilled
+        self.__spill_file: Optional[IO[bytes]] = None  # created with the first spilled transaction
+        self.__in_memory = 0
+
+    def __len__(self) -> int:
+        return len(self.__transactions)
+
+    def append(self, chat_transaction: ChatTransaction) -> None:
+        self.__turns.append((chat_transaction.query, chat_transaction.response))
+        self.__transactions.append(chat_transaction)
+        self.__offsets.append(None)
+        self.completion_tokens += chat_transaction.get_completion_tokens()
+        self.embedding_tokens += chat_transaction.get_embedding_tokens()
+        self.__in_memory += 1
+        if self.max_in_memory is not None and self.__in_memory > self.max_in_memory:
+            self.__spill(len(self.__transactions) - self.__in_memory)
+
+    def __spill(self, index: int) -> None:
+        if self.__spill_file is None:
+            self.__spill_file = tempfile.TemporaryFile()
+        self.__spill_file.seek(0, 2)
+        self.__offsets[index] = self.__spill_file.tell()
+        pickle.dump(self.__transactions[index], self.__spill_file, protocol=pickle.HIGHEST_PROTOCOL)
+        self.__transactions[index] = None
+        self.__in_memory -= 1
+
+    def get(self, index: int) -> ChatTransaction:
+        """Returns the transaction, spilled transactions are loaded from disk (and not kept in memory)."""
+        chat_transaction = self.__transactions[index]
+        if chat_transaction is not None:
+            return chat_transaction
+        self.__spill_file.seek(self.__offsets[index])
+        return pickle.load(self.__spill_file)
+
+    def get_turns(self) -> List[Tuple[str, str]]:
+        """Returns query and response of all transactions."""
+        return self.__turns
+
+    def clear(self) -> None:
+        if self.__spill_file is not None:
+            self.__spill_file.close()
+            self.__spill_file = None
+        self.completion_tokens = 0
+        self.embedding_tokens = 0
+        self.__turns = []
+        self.__transactions = []
+        self.__offsets = []
+        self.__in_memory = 0
@@ -29,12 +29,51 @@ At the end of your response, provide the full document source where you found th
 Documents for context: {context}
 """
 
+# the prefix-stable layout moves the documents of the RAG system prompt into a message after the conversation
+RAG_CONTEXT_REFERENCE = "(provided at the end of the conversation)"
+RAG_CONTEXT_PROMPT = "Documents for context: {context}"
+
+PLAN_QUERY_SYSTEM_PROMPT = """Your task is to prepare a search in a knowledge base for the last user input of a conversation between the user and an AI assistant.
+First rephrase the user input: add context from the history if necessary and remove irrelevant information or smalltalk, so that the rephrased input contains all information required to answer the question without knowing the conversation history.
+Then create a search query string for keyword search from the rephrased input by removing irrelevant words.
+NEVER try to answer the question.
+Answer only with a json object with the rephrased user input (from the perspective of the user) under the key 'rephrased' and the search query string under the key 'search_expression'.
+Example: {"rephrased": "What is the capital of Canada?", "search_expression": "capital canada"}"""
+
+PLAN_QUERY_USER_PROMPT = """Chat history: ```{chat_history}```
+
+User query: ```{user_query}```"""
+
+SUMMARIZE_HISTORY_SYSTEM_PROMPT = """Your task is to maintain a short summary of a conversation between a user and an AI assistant.
+Update the current summary with the new turns of the conversation. Keep the topics, facts, names and open questions that are required to understand later user inputs and drop smalltalk.
+Answer only with the updated summary in at most five sentences."""
+
+SUMMARIZE_HISTORY_USER_PROMPT = """Current summary: ```{summary}```
+
+New turns: ```{turns}```"""
+
+SUB_QUESTIONS_SYSTEM_PROMPT = """Your task is to break down a user input into simpler sub-questions that will be used to search a knowledge base.
+Each sub-question covers one aspect of the user input and can be understood without the user input. If the user input is already simple, return fewer sub-questions or none.
+NEVER try to answer the question.
+Answer only with a json object with the list of sub-questions under the key 'questions'.
+Example: 'How do the capitals of Canada and Australia differ in size?' => {"questions": ["What is the size of Ottawa?", "What is the size of Canberra?"]}"""
+
+SUB_QUESTIONS_USER_PROMPT = """Maximum number of sub-questions: {num_questions}
+
+User input: ```{query}```"""
+
 REPHRASE_USER_QUERY_PROMPT_NAME = "Rephrase User Query"
 KNOWLEDGE_BASE_QUERY_PROMPT_NAME = "Knowledge Base Query"
 RAG_PROMPT_NAME = "RAG"
+PLAN_QUERY_PROMPT_NAME = "Plan Query"
+SUMMARIZE_HISTORY_PROMPT_NAME = "Summarize History"
+SUB_QUESTIONS_PROMPT_NAME = "Sub-Questions"
 
 DEFAULT_PROMPTS = {
     REPHRASE_USER_QUERY_PROMPT_NAME: PromptPair(REPHRASE_USER_QUERY_SYSTEM_PROMPT, REPHRASE_USER_QUERY_USER_PROMPT),
     KNOWLEDGE_BASE_QUERY_PROMPT_NAME: PromptPair(KNOWLEDGE_BASE_QUERY_SYSTEM_PROMPT, KNOWLEDGE_BASE_QUERY_USER_PROMPT),
-    RAG_PROMPT_NAME: PromptPair(RAG_SYSTEM_PROMPT)
+    RAG_PROMPT_NAME: PromptPair(RAG_SYSTEM_PROMPT),
+    PLAN_QUERY_PROMPT_NAME: PromptPair(PLAN_QUERY_SYSTEM_PROMPT, PLAN_QUERY_USER_PROMPT),
+    SUMMARIZE_HISTORY_PROMPT_NAME: PromptPair(SUMMARIZE_HISTORY_SYSTEM_PROMPT, SUMMARIZE_HISTORY_USER_PROMPT),
+    SUB_QUESTIONS_PROMPT_NAME: PromptPair(SUB_QUESTIONS_SYSTEM_PROMPT, SUB_QUESTIONS_USER_PROMPT),
 }
@@ -0,0 +1,95 @@
+"""Response cache module that provides a semantic cache of chatbot responses keyed on query embeddings."""
+
+import hashlib
+import json
+import threading
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from .vectors import normalize_rows
+from ..utils.pipeline_settings import PipelineSettings
+from ..utils.prompt_pair import PromptPair
+from ..utils.search_settings import SearchSettings
+
+DEFAULT_THRESHOLD = 0.95
+DEFAULT_MAX_ENTRIES = 1000
+
+
+def hash_state(state: Any) -> str:
+    return hashlib.sha256(json.dumps(state, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+def prompts_fingerprint(prompts: Dict[str, PromptPair]) -> str:
+    return hash_state({name: [pair.system_prompt, pair.user_prompt] for name, pair in prompts.items()})
+
+
+def fingerprint(prompts: Dict[str, PromptPair], search_settings: SearchSettings,
+                pipeline_settings: PipelineSettings) -> str:
+    """Returns a hash of the prompts, search settings and pipeline settings that determine the response to a query."""
+    return hash_state({"prompts": prompts_fingerprint(prompts), "search_settings": vars(search_settings),
+                       "pipeline_settings": vars(pipeline_settings)})
+
+
+class CachedResponse:
+    """Represents a cached response together with the documents it was generated from."""
+
+    def __init__(self, query: str, response: str, documents: List[Any], fingerprint: str) -> None:
+        self.query = query
+        self.response = response
+        self.documents = documents
+        self.fingerprint = fingerprint
+
+
+class SemanticResponseCache:
+    """
+    Cache of responses that is looked up by cosine similarity of query embeddings.
+
+    The normalized embeddings are kept in a preallocated float32 matrix that is used as ring buffer, so a lookup is a
+    single matrix-vector product. Entries only match lookups with the same fingerprint (prompts, search settings and
+    pipeline settings).
+    """
+
+    def __init__(self, threshold: float = DEFAULT_THRESHOLD, max_entries: int = DEFAULT_MAX_ENTRIES) -> None:
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.__vectors: Optional[np.ndarray] = None  # allocated with the first entry
+        self.__entries: List[Optional[CachedResponse]] = [None] * max_entries
+        self.__size = 0
+        self.__next = 0
+        self.__lock = threading.Lock()
+
+    def lookup(self, embedding: List[float], fingerprint: str) -> Optional[CachedResponse]:
+        """Returns the most similar cached response above the threshold or None."""
+        with self.__lock:
+            entry = None
+            if self.__size:
+                scores = self.__vectors[:self.__size] @ normalize_rows(np.asarray(embedding, dtype=np.float32))
+                candidates = np.flatnonzero(scores >= self.threshold)
+                for i in candidates[np.argsort(-scores[candidates])]:
+                    if self.__entries[i].fingerprint == fingerprint:
+                        entry = self.__entries[i]
+                        break
+            if entry is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return entry
+
+    def add(self, embedding: List[float], cached_response: CachedResponse) -> None:
+        vector = normalize_rows(np.asarray(embedding, dtype=np.float32))
+        with self.__lock:
+            if self.__vectors is None:
+                self.__vectors = np.zeros((self.max_entries, vector.shape[0]), dtype=np.float32)
+            self.__vectors[self.__next] = vector
+            self.__entries[self.__next] = cached_response
+            self.__next = (self.__next + 1) % self.max_entries
+            self.__size = min(self.__size + 1, self.max_entries)
+
+    def invalidate(self) -> None:
+        with self.__lock:
+            self.__entries = [None] * self.max_entries
+            self.__size = 0
+            self.__next = 0
@@ -0,0 +1,136 @@
+"""Retrieval cache module that caches search results by query and search settings and coalesces identical searches."""
+
+import asyncio
+import hashlib
+import json
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from ..utils.search_settings import SearchSettings
+
+DEFAULT_MAX_ENTRIES = 1000
+DEFAULT_TTL_SECONDS = 300.0
+
+# search settings that determine the documents returned by a search request
+REQUEST_SETTINGS = ["top", "k", "vector_fields", "scoring_profile_name", "semantic_search",
+                    "semantic_configuration_name", "select_fields"]
+
+
+def retrieval_key(backend_name: str, text_query: Optional[str], vector: Optional[List[float]],
+                  search_settings: SearchSettings) -> str:
+    """Returns a canonical hash of the inputs of a search request, the vector is hashed as float32 values."""
+    state = {
+        "backend": backend_name,
+        "text_query": text_query,
+        "vector": hashlib.sha256(array("f", vector).tobytes()).hexdigest() if vector is not None else None,
+        "settings": {name: getattr(search_settings, name) for name in REQUEST_SETTINGS},
+    }
+    return hashlib.sha256(json.dumps(state, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+class RetrievalCache:
+    """
+    LRU cache of search results with TTL expiry, shared by all sessions of the process.
+
+    Concurrent searches for the same key are coalesced: the first one is sent to the backend, the others wait for its
+    result. `invalidate` drops all entries (e.g. after the index has been updated), results of searches that were in
+    flight at that time are returned to their callers but not cached.
+    """
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES,
+                 ttl_seconds: Optional[float] = DEFAULT_TTL_SECONDS) -> None:
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.__entries: "OrderedDict[str, Tuple[float, List[Dict[str, Any]]]]" = OrderedDict()
+        self.__in_flight: Dict[str, Future] = {}
+        self.__generation = 0
+        self.__lock = threading.Lock()
+
+    def __get(self, key: str) -> Optional[List[Dict[str, Any]]]:
+        entry = self.__entries.get(key)
+        if entry is None:
+            return None
+        if self.ttl_seconds is not None and time.time() - entry[0] > self.ttl_seconds:
+            del self.__entries[key]
+            return None
+        self.__entries.move_to_end(key)
+        return entry[1]
+
+    def __begin(self, key: str) -> Tuple[Optional[List[Dict[str, Any]]], Optional[Future], bool, int]:
+        """Returns the cached documents if any, otherwise the future of the search and whether the caller runs it."""
+        with self.__lock:
+            documents = self.__get(key)
+            if documents is not None:
+                self.hits += 1
+                return documents, None, False, self.__generation
+            future = self.__in_flight.get(key)
+            if future is not None:
+                self.coalesced += 1
+                return None, future, False, self.__generation
+            self.misses += 1
+            future = Future()
+            self.__in_flight[key] = future
+            return None, future, True, self.__generation
+
+    def __complete(self, key: str, future: Future, generation: int, documents: Optional[List[Dict[str, Any]]],
+                   error: Optional[BaseException] = None) -> None:
+        with self.__lock:
+            self.__in_flight.pop(key, None)
+            if error is None and generation == self.__generation:
+                self.__entries[key] = (time.time(), documents)
+                self.__entries.move_to_end(key)
+                while len(self.__entries) > self.max_entries:
+                    self.__entries.popitem(last=False)
+        if error is None:
+            future.set_result(documents)
+        else:
+            future.set_exception(error)
+
+    def get_or_search(self, key: str,
+                      search: Callable[[], List[Dict[str, Any]]]) -> Tuple[List[Dict[str, Any]], bool]:
+        """Returns the documents for the key and whether they were not searched by this call (cached or coalesced)."""
+        documents, future, runs, generation = self.__begin(key)
+        if documents is not None:
+            return list(documents), True
+        if not runs:
+            return list(future.result()), True
+        try:
+            documents = search()
+        except BaseException as e:
+            self.__complete(key, future, generation, None, e)
+            raise
+        self.__complete(key, future, generation, documents)
+        return list(documents), False
+
+    async def aget_or_search(self, key: str, search: Callable[[], Awaitable[List[Dict[str, Any]]]]
+                             ) -> Tuple[List[Dict[str, Any]], bool]:
+        """Async variant of `get_or_search`, coalesces with sync and async searches of other threads and loops."""
+        documents, future, runs, generation = self.__begin(key)
+        if documents is not None:
+            return list(documents), True
+        if not runs:
+            return list(await asyncio.wrap_future(future)), True
+        try:
+            documents = await search()
+        except BaseException as e:
+            self.__complete(key, future, generation, None, e)
+            raise
+        self.__complete(key, future, generation, documents)
+        return list(documents), False
+
+    def invalidate(self) -> None:
+        with self.__lock:
+            self.__entries.clear()
+            self.__generation += 1
+
+    def get_metrics(self) -> Dict[str, int]:
+        with self.__lock:
+            return {"entries": len(self.__entries), "hits": self.hits, "misses": self.misses,
+                    "coalesced": self.coalesced}
@@ -0,0 +1,26 @@
+"""Routing module that maps the pipeline stages to the deployments of their chat requests."""
+
+import json
+from typing import Dict, Optional
+
+
+class StageRoute:
+    """
+    Deployment, `max_tokens` and request timeout of the chat requests of a pipeline stage.
+
+    Values of None fall back to the defaults of the LLM client (and to the `max_tokens` of the stage). Requests that are
+    throttled on the deployment are sent to the fallback deployment instead of being retried, if one is set.
+    """
+
+    def __init__(self, deployment_name: Optional[str] = None, max_tokens: Optional[int] = None,
+                 request_timeout: Optional[float] = None, fallback_deployment_name: Optional[str] = None) -> None:
+        self.deployment_name = deployment_name
+        self.max_tokens = max_tokens
+        self.request_timeout = request_timeout
+        self.fallback_deployment_name = fallback_deployment_name
+
+
+def load_routes(path: str) -> Dict[str, StageRoute]:
+    """Loads the routes from a json file that maps stage names to the constructor arguments of `StageRoute`."""
+    with open(path, encoding="utf-8") as file:
+        return {stage: StageRoute(**route) for stage, route in json.load(file).items()}
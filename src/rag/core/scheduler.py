@@ -0,0 +1,265 @@
+"""Scheduler module that provides rate limiting, prioritization and retries for requests to Azure Open AI."""
+
+import asyncio
+import heapq
+import itertools
+import random
+import threading
+import time
+from enum import IntEnum
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple, Type
+
+from .models.span import Span
+
+DEFAULT_MAX_RETRIES = 3
+DEFAULT_BACKOFF_BASE = 1.0
+DEFAULT_BACKOFF_MAX = 30.0
+
+# async waiters are not notified, they check again after at most this interval
+ASYNC_POLL_INTERVAL = 0.05
+
+# names of the openai errors that are always retried, resolved on the first error (see `get_retryable_errors`)
+RETRYABLE_ERRORS = ["RateLimitError", "ServiceUnavailableError", "Timeout", "APIConnectionError", "TryAgain"]
+
+
+class Priority(IntEnum):
+    """Priority of a request, lower values are scheduled first."""
+    INTERACTIVE = 0
+    BATCH = 1
+    BACKGROUND = 2
+
+
+class TokenBucket:
+    """
+    Token bucket refilled continuously at `rate_per_minute`, holding at most one minute of capacity.
+
+    Requests costing more than the capacity wait for a full bucket and drive the level negative.
+    """
+
+    def __init__(self, rate_per_minute: float) -> None:
+        self.capacity = rate_per_minute
+        self.rate = rate_per_minute / 60
+        self.level = rate_per_minute
+        self.__updated = time.monotonic()
+
+    def __refill(self) -> None:
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self.__updated) * self.rate)
+        self.__updated = now
+
+    def time_until(self, amount: float) -> float:
+        """Returns the seconds until the amount (at most the capacity) is available."""
+        self.__refill()
+        return max(0.0, (min(amount, self.capacity) - self.level) / self.rate)
+
+    def consume(self, amount: float) -> None:
+        self.__refill()
+        self.level -= amount
+
+
+def get_retry_after(error: Exception) -> Optional[float]:
+    """Returns the delay requested by the Retry-After headers of the error response, if any."""
+    headers = getattr(error, "headers", None) or {}
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        if headers.get("retry-after"):
+            return float(headers["retry-after"])
+    except ValueError:  # Retry-After may also be an HTTP date, fall back to the backoff then
+        pass
+    return None
+
+
+def get_retryable_errors() -> Tuple[Type[Exception], ...]:
+    # imported on the first error only, so that the scheduler does not load the openai library at startup
+    import openai
+    return tuple(getattr(openai.error, name) for name in RETRYABLE_ERRORS)
+
+
+def is_rate_limit_error(error: Exception) -> bool:
+    import openai
+    return isinstance(error, openai.error.RateLimitError)
+
+
+def is_retryable(error: Exception) -> bool:
+    import openai
+    if isinstance(error, get_retryable_errors()):
+        return True
+    return isinstance(error, openai.error.APIError) and (error.http_status or 0) >= 500
+
+
+class RequestScheduler:
+    """
+    Schedules the requests to Azure Open AI of all sessions of the process.
+
+    Requests wait until a requests-per-minute and a tokens-per-minute bucket allow them (a limit of None disables the
+    bucket). Waiting requests are served by priority, in order of arrival within a priority. Failed requests are
+    retried with exponential backoff and full jitter. A Retry-After from the service pauses all requests, since the
+    quota of the deployment is shared. A throttled request with a fallback (e.g. the same request to another
+    deployment) is not retried, the fallback is run instead.
+    """
+
+    def __init__(self, requests_per_minute: Optional[float] = None, tokens_per_minute: Optional[float] = None,
+                 max_retries: int = DEFAULT_MAX_RETRIES, backoff_base: float = DEFAULT_BACKOFF_BASE,
+                 backoff_max: float = DEFAULT_BACKOFF_MAX) -> None:
+        self.request_bucket = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.token_bucket = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.__condition = threading.Condition()
+        self.__queue: List[Tuple[int, int]] = []
+        self.__counter = itertools.count()
+        self.__paused_until = 0.0
+        self.__metrics = {"requests": 0, "retries": 0, "rate_limited": 0, "fallbacks": 0, "failures": 0,
+                          "wait_seconds": 0.0, "max_wait_seconds": 0.0}
+
+    def __try_acquire(self, ticket: Tuple[int, int], cost: float) -> Optional[float]:
+        """Returns None if the request may start, otherwise the seconds to wait. Must hold the condition."""
+        delay = self.__paused_until - time.monotonic()
+        if self.__queue[0] != ticket:
+            return max(delay, ASYNC_POLL_INTERVAL)
+        if self.request_bucket is not None:
+            delay = max(delay, self.request_bucket.time_until(1))
+        if self.token_bucket is not None:
+            delay = max(delay, self.token_bucket.time_until(cost))
+        if delay > 0:
+            return delay
+
+        heapq.heappop(self.__queue)
+        if self.request_bucket is not None:
+            self.request_bucket.consume(1)
+        if self.token_bucket is not None:
+            self.token_bucket.consume(cost)
+        self.__condition.notify_all()
+        return None
+
+    def __enqueue(self, priority: Priority) -> Tuple[int, int]:
+        ticket = (int(priority), next(self.__counter))
+        heapq.heappush(self.__queue, ticket)
+        return ticket
+
+    def __record_wait(self, wait_seconds: float) -> None:
+        self.__metrics["requests"] += 1
+        self.__metrics["wait_seconds"] += wait_seconds
+        self.__metrics["max_wait_seconds"] = max(self.__metrics["max_wait_seconds"], wait_seconds)
+
+    def acquire(self, cost: float, priority: Priority = Priority.INTERACTIVE) -> float:
+        """Blocks until a request with the estimated token cost may start and returns the time waited."""
+        start = time.monotonic()
+        with self.__condition:
+            ticket = self.__enqueue(priority)
+            while (delay := self.__try_acquire(ticket, cost)) is not None:
+                self.__condition.wait(delay)
+            wait_seconds = time.monotonic() - start
+            self.__record_wait(wait_seconds)
+        return wait_seconds
+
+    async def aacquire(self, cost: float, priority: Priority = Priority.INTERACTIVE) -> float:
+        """Async variant of `acquire`."""
+        start = time.monotonic()
+        with self.__condition:
+            ticket = self.__enqueue(priority)
+        try:
+            while True:
+                with self.__condition:
+                    delay = self.__try_acquire(ticket, cost)
+                if delay is None:
+                    break
+                await asyncio.sleep(min(delay, ASYNC_POLL_INTERVAL))
+        except asyncio.CancelledError:
+            with self.__condition:
+                if ticket in self.__queue:
+                    self.__queue.remove(ticket)
+                    heapq.heapify(self.__queue)
+                    self.__condition.notify_all()
+            raise
+        wait_seconds = time.monotonic() - start
+        with self.__condition:
+            self.__record_wait(wait_seconds)
+        return wait_seconds
+
+    def __backoff(self, attempt: int, error: Exception) -> float:
+        """Records the failure and returns the delay before the next attempt, or raises if it is not retried."""
+        with self.__condition:
+            if attempt >= self.max_retries or not is_retryable(error):
+                self.__metrics["failures"] += 1
+                raise error
+            self.__metrics["retries"] += 1
+            retry_after = get_retry_after(error)
+            if retry_after is not None:
+                self.__metrics["rate_limited"] += 1
+                delay = retry_after + random.uniform(0, self.backoff_base)
+                # the pause delays the next attempt as well as all other requests
+                self.__paused_until = max(self.__paused_until, time.monotonic() + delay)
+                return 0.0
+            if is_rate_limit_error(error):
+                self.__metrics["rate_limited"] += 1
+            return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def __record_fallback(self) -> None:
+        with self.__condition:
+            self.__metrics["rate_limited"] += 1
+            self.__metrics["fallbacks"] += 1
+
+    def run(self, request: Callable[[], Any], cost: float, priority: Priority = Priority.INTERACTIVE,
+            span: Optional[Span] = None, fallback: Optional[Callable[[], Any]] = None) -> Any:
+        """
+        Runs the request once the rate limits allow it and retries it on transient errors.
+
+        If the request is throttled and a fallback is given, the fallback is run (and retried) instead.
+        The time spent waiting and the number of retries are added as attributes to the span if given.
+        """
+        wait_seconds = 0.0
+        attempt = 0
+        while True:
+            wait_seconds += self.acquire(cost, priority)
+            try:
+                result = request()
+                break
+            except Exception as e:
+                if fallback is not None and is_rate_limit_error(e):
+                    self.__record_fallback()
+                    request, fallback, delay = fallback, None, 0.0
+                else:
+                    delay = self.__backoff(attempt, e)
+            attempt += 1
+            time.sleep(delay)
+            wait_seconds += delay
+        if span is not None:
+            span.set_attribute("scheduler_wait", wait_seconds)
+            span.set_attribute("retries", attempt)
+        return result
+
+    async def arun(self, request: Callable[[], Awaitable[Any]], cost: float,
+                   priority: Priority = Priority.INTERACTIVE, span: Optional[Span] = None,
+                   fallback: Optional[Callable[[], Awaitable[Any]]] = None) -> Any:
+        """Async variant of `run`, the request is a function returning a new awaitable for every attempt."""
+        wait_seconds = 0.0
+        attempt = 0
+        while True:
+            wait_seconds += await self.aacquire(cost, priority)
+            try:
+                result = await request()
+                break
+            except Exception as e:
+                if fallback is not None and is_rate_limit_error(e):
+                    self.__record_fallback()
+                    request, fallback, delay = fallback, None, 0.0
+                else:
+                    delay = self.__backoff(attempt, e)
+            attempt += 1
+            await asyncio.sleep(delay)
+            wait_seconds += delay
+        if span is not None:
+            span.set_attribute("scheduler_wait", wait_seconds)
+            span.set_attribute("retries", attempt)
+        return result
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Returns the current queue depth per priority and the counters since the start of the process."""
+        with self.__condition:
+            metrics = dict(self.__metrics)
+            metrics["queue_depth"] = {p.name.lower(): sum(1 for t in self.__queue if t[0] == p) for p in Priority}
+            metrics["mean_wait_seconds"] = metrics["wait_seconds"] / metrics["requests"] if metrics["requests"] else 0.0
+        return metrics
@@ -1,14 +1,25 @@
-"""Search module provides service to interact with Azure Cognitive Search."""
+"""Search module provides service to search the knowledge base."""
 
-from typing import Optional
-
-from azure.core.credentials import AzureKeyCredential
-from azure.search.documents import SearchClient
-from azure.search.documents.models import Vector
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
 
+from .backends.base import SearchBackend
 from .llm import LLM
 from .models.search_transaction import SearchTransaction
-from ..utils.search_settings import SearchSettings
+from .mmr import mmr_rerank
+from .models.span import Span
+from .retrieval_cache import RetrievalCache, retrieval_key
+from ..utils.search_settings import MMR_VECTOR_FIELD, SearchSettings
+
+EMBEDDING_SPAN_NAME = "Embedding"
+SEARCH_SPAN_NAME = "Search"
+SEARCH_REQUEST_SPAN_NAME = "Search Request"
+MMR_SPAN_NAME = "MMR Rerank"
+
+
+def get_vector(embedding_completion: Optional[Dict[str, Any]]) -> Optional[List[float]]:
+    return embedding_completion["data"][0]["embedding"] if embedding_completion is not None else None
 
 
 def choose_query_option(vector_search: str, user_query: str, kb_query: Optional[str]) -> str:
@@ -21,54 +32,157 @@ def choose_query_option(vector_search: str, user_query: str, kb_query: Optional[
 
 
 class SearchService:
-    """Client to interact with Azure Cognitive Search."""
-
-    def __init__(self, endpoint: str, search_key: str, index_name: str, llm: LLM) -> None:
-        self.search_client = SearchClient(
-            endpoint=endpoint,
-            index_name=index_name,
-            credential=AzureKeyCredential(search_key),
-        )
+    """
+    Service to search the knowledge base.
+
+    The search requests are performed by a retrieval backend, i. e. Azure Cognitive Search or a local index. With a
+    retrieval cache, identical search requests are answered from the cache or share one request to the backend.
+    Several searches can be performed concurrently with `search_many` and `asearch_many`.
+    If MMR is enabled in the search settings, the search results are over-fetched and reranked to a diverse subset.
+    """
+
+    def __init__(self, backend: SearchBackend, llm: LLM, retrieval_cache: Optional[RetrievalCache] = None) -> None:
+        self.backend = backend
         self.llm = llm
+        self.retrieval_cache = retrieval_cache
+
+    async def aclose(self) -> None:
+        await self.backend.aclose()
+
+    def invalidate_cache(self) -> None:
+        """Drops the cached search results, to be called when the index has been updated."""
+        if self.retrieval_cache is not None:
+            self.retrieval_cache.invalidate()
+
+    def __search_documents(self, text_query: Optional[str], vector: Optional[List[float]],
+                           search_settings: SearchSettings) -> Tuple[List[Dict[str, Any]], bool]:
+        if self.retrieval_cache is None:
+            return self.backend.search(text_query, vector, search_settings), False
+        key = retrieval_key(self.backend.name, text_query, vector, search_settings)
+        return self.retrieval_cache.get_or_search(key, lambda: self.backend.search(text_query, vector, search_settings))
+
+    async def __asearch_documents(self, text_query: Optional[str], vector: Optional[List[float]],
+                                  search_settings: SearchSettings) -> Tuple[List[Dict[str, Any]], bool]:
+        if self.retrieval_cache is None:
+            return await self.backend.asearch(text_query, vector, search_settings), False
+        key = retrieval_key(self.backend.name, text_query, vector, search_settings)
+        return await self.retrieval_cache.aget_or_search(
+            key, lambda: self.backend.asearch(text_query, vector, search_settings))
+
+    @staticmethod
+    def __rerank(documents: List[Dict[str, Any]], vector: Optional[List[float]], search_settings: SearchSettings,
+                 search_span: Span) -> List[Dict[str, Any]]:
+        """Reranks the over-fetched documents by MMR, the vectors fetched for it are dropped afterwards."""
+        with Span(MMR_SPAN_NAME, {"candidates": len(documents), "lambda": search_settings.mmr_lambda}) as span:
+            documents = mmr_rerank(documents, vector, search_settings.top, search_settings.mmr_lambda,
+                                   MMR_VECTOR_FIELD)
+        search_span.add_child(span)
+        if MMR_VECTOR_FIELD in search_settings.select_fields:
+            return documents
+        return [{key: value for key, value in document.items() if key != MMR_VECTOR_FIELD} for document in documents]
+
+    def embedding(self, vector_query: str) -> Tuple[Dict[str, Any], Span]:
+        """Vectorizes the query with the Open AI embedding service and returns the completion with its timing span."""
+        with Span(EMBEDDING_SPAN_NAME, {"deployment": self.llm.embedding_deployment_name}) as span:
+            embedding_completion = self.llm.embedding(vector_query)
+        span.set_attribute("cached", bool(embedding_completion.get("cached")))
+        return embedding_completion, span
+
+    async def aembedding(self, vector_query: str) -> Tuple[Dict[str, Any], Span]:
+        """Async variant of `embedding`."""
+        with Span(EMBEDDING_SPAN_NAME, {"deployment": self.llm.embedding_deployment_name}) as span:
+            embedding_completion = await self.llm.aembedding(vector_query)
+        span.set_attribute("cached", bool(embedding_completion.get("cached")))
+        return embedding_completion, span
 
     def search(self,
                user_query: Optional[str],
                kb_query: Optional[str],
-               search_settings: Optional[SearchSettings]) -> SearchTransaction:
+               search_settings: Optional[SearchSettings],
+               embedding: Optional[Tuple[Dict[str, Any], Span]] = None) -> SearchTransaction:
         """
-        Performs a search request to Azure Cognitive Search using the query strings and search settings provided.
+        Performs a search request to the backend using the query strings and search settings provided.
 
-        For vector search, it uses the Open AI embedding service to vectorize the query string first.
+        For vector search, it uses the Open AI embedding service to vectorize the query string first, unless an
+        embedding of the vector query computed with `embedding` is passed along.
         """
+        search_span = Span(SEARCH_SPAN_NAME, {"backend": self.backend.name})
         vector_query = choose_query_option(search_settings.vector_search, user_query, kb_query)
         text_query = choose_query_option(search_settings.text_search, user_query, kb_query)
 
-        vectors = []
+        if embedding is None and search_settings.vector_fields and vector_query is not None:
+            embedding = self.embedding(vector_query)
         embedding_completion = None
-        if search_settings.vector_fields and vector_query is not None:
-            embedding_completion = self.llm.embedding(vector_query)
-            vectors = [Vector(
-                value=embedding_completion["data"][0]["embedding"],
-                fields=",".join(search_settings.vector_fields),
-                k=search_settings.k,
-            )
-            ]
-
-        query_type = None
-        query_language = None
-        semantic_configuration_name = None
-        if search_settings.semantic_search and search_settings.semantic_configuration_name:
-            query_type = "semantic"
-            query_language = "en-US"
-            semantic_configuration_name = search_settings.semantic_configuration_name
-
-        scoring_profile = None
-        if search_settings.scoring_profile_name:
-            scoring_profile = search_settings.scoring_profile_name
-
-        documents = self.search_client.search(search_text=text_query, vectors=vectors, query_language=query_language,
-                                              semantic_configuration_name=semantic_configuration_name,
-                                              query_type=query_type, top=search_settings.top,
-                                              scoring_profile=scoring_profile)
-        return SearchTransaction(documents=list(documents), embedding_completion=embedding_completion,
-                                 text_query=text_query, vector_query=vector_query)
+        if embedding is not None:
+            embedding_completion, embedding_span = embedding
+            search_span.add_child(embedding_span)
+
+        fetch_settings = search_settings.fetch_settings()
+        with Span(SEARCH_REQUEST_SPAN_NAME, {"top": fetch_settings.top}) as request_span:
+            documents, cached = self.__search_documents(text_query, get_vector(embedding_completion), fetch_settings)
+        request_span.set_attribute("cached", cached)
+        search_span.add_child(request_span)
+        if search_settings.mmr_lambda is not None:
+            documents = self.__rerank(documents, get_vector(embedding_completion), search_settings, search_span)
+        search_span.end()
+        return SearchTransaction(documents=documents, embedding_completion=embedding_completion,
+                                 text_query=text_query, vector_query=vector_query, span=search_span, cached=cached)
+
+    async def asearch(self,
+                      user_query: Optional[str],
+                      kb_query: Optional[str],
+                      search_settings: Optional[SearchSettings],
+                      embedding: Optional[Tuple[Dict[str, Any], Span]] = None) -> SearchTransaction:
+        """
+        Async variant of `search`.
+
+        An embedding of the vector query that has been computed beforehand with `aembedding` (e.g. concurrently to
+        other requests) can be passed along, in which case no embedding request is made.
+        """
+        search_span = Span(SEARCH_SPAN_NAME, {"backend": self.backend.name})
+        vector_query = choose_query_option(search_settings.vector_search, user_query, kb_query)
+        text_query = choose_query_option(search_settings.text_search, user_query, kb_query)
+
+        if embedding is None and search_settings.vector_fields and vector_query is not None:
+            embedding = await self.aembedding(vector_query)
+        embedding_completion = None
+        if embedding is not None:
+            embedding_completion, embedding_span = embedding
+            search_span.add_child(embedding_span)
+
+        fetch_settings = search_settings.fetch_settings()
+        with Span(SEARCH_REQUEST_SPAN_NAME, {"top": fetch_settings.top}) as request_span:
+            documents, cached = await self.__asearch_documents(text_query, get_vector(embedding_completion),
+                                                               fetch_settings)
+        request_span.set_attribute("cached", cached)
+        search_span.add_child(request_span)
+        if search_settings.mmr_lambda is not None:
+            documents = self.__rerank(documents, get_vector(embedding_completion), search_settings, search_span)
+        search_span.end()
+        return SearchTransaction(documents=documents, embedding_completion=embedding_completion,
+                                 text_query=text_query, vector_query=vector_query, span=search_span, cached=cached)
+
+    def search_many(self,
+                    queries: List[Tuple[Optional[str], Optional[str]]],
+                    search_settings: Optional[SearchSettings],
+                    embedding: Optional[Tuple[Dict[str, Any], Span]] = None) -> List[SearchTransaction]:
+        """
+        Performs a search for each pair of user query and knowledge base query concurrently.
+
+        An embedding passed along belongs to the vector query of the first pair. Returns the search transactions in the
+        order of the queries.
+        """
+        with ThreadPoolExecutor(max_workers=len(queries)) as executor:
+            futures = [executor.submit(self.search, user_query, kb_query, search_settings,
+                                       embedding if i == 0 else None)
+                       for i, (user_query, kb_query) in enumerate(queries)]
+            return [future.result() for future in futures]
+
+    async def asearch_many(self,
+                           queries: List[Tuple[Optional[str], Optional[str]]],
+                           search_settings: Optional[SearchSettings],
+                           embedding: Optional[Tuple[Dict[str, Any], Span]] = None) -> List[SearchTransaction]:
+        """Async variant of `search_many`."""
+        return list(await asyncio.gather(*[self.asearch(user_query, kb_query, search_settings,
+                                                        embedding if i == 0 else None)
+                                           for i, (user_query, kb_query) in enumerate(queries)]))
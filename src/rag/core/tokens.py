@@ -0,0 +1,44 @@
+"""Tokens module that provides local token counting for texts and chat messages."""
+
+from functools import lru_cache
+from typing import Dict, List
+
+try:
+    import tiktoken
+except ImportError:  # optional dependency, fall back to an estimate
+    tiktoken = None
+
+ENCODING_NAME = "cl100k_base"
+
+# approximation used if tiktoken is not installed or its encoding cannot be loaded
+CHARACTERS_PER_TOKEN = 4
+
+# overhead of the chat format, see OpenAI cookbook "How to count tokens with tiktoken"
+TOKENS_PER_MESSAGE = 3
+TOKENS_PER_REPLY = 3
+
+
+@lru_cache(maxsize=1)
+def get_encoding():
+    if tiktoken is None:
+        return None
+    try:
+        return tiktoken.get_encoding(ENCODING_NAME)
+    except Exception:  # the encoding is downloaded on first use, which fails e.g. without network access
+        return None
+
+
+def count_tokens(text: str) -> int:
+    """Counts the tokens of the text with tiktoken if available and estimates them otherwise."""
+    if not text:
+        return 0
+    encoding = get_encoding()
+    if encoding is None:
+        return max(1, round(len(text) / CHARACTERS_PER_TOKEN))
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def count_message_tokens(messages: List[Dict[str, str]]) -> int:
+    """Counts the prompt tokens of a list of chat messages including the overhead of the chat format."""
+    return sum(TOKENS_PER_MESSAGE + count_tokens(m["content"]) + count_tokens(m["role"]) for m in messages) \
+        + TOKENS_PER_REPLY
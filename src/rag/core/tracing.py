@@ -0,0 +1,78 @@
+"""Tracing module that exports spans in the OpenTelemetry (OTLP/JSON) format."""
+
+import json
+import os
+import threading
+from typing import Any, Dict, List, Optional
+
+from .models.span import Span
+
+SERVICE_NAME = "rag"
+SPAN_KIND_INTERNAL = 1
+STATUS_CODE_OK = 1
+STATUS_CODE_ERROR = 2
+
+
+def to_otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def to_otlp_spans(root: Span) -> List[Dict[str, Any]]:
+    """Converts a span tree into a list of OTLP spans that share a new trace id."""
+    trace_id = os.urandom(16).hex()
+    otlp_spans = []
+
+    def convert(span: Span, parent_span_id: Optional[str]) -> None:
+        span_id = os.urandom(8).hex()
+        otlp_span = {
+            "traceId": trace_id,
+            "spanId": span_id,
+            "name": span.name,
+            "kind": SPAN_KIND_INTERNAL,
+            "startTimeUnixNano": str(span.start_time_ns),
+            "endTimeUnixNano": str(span.end_time_ns if span.end_time_ns is not None else span.start_time_ns),
+            "attributes": [{"key": key, "value": to_otlp_value(value)} for key, value in span.attributes.items()],
+            "status": {"code": STATUS_CODE_ERROR if "error" in span.attributes else STATUS_CODE_OK},
+        }
+        if parent_span_id is not None:
+            otlp_span["parentSpanId"] = parent_span_id
+        otlp_spans.append(otlp_span)
+        for child in span.children:
+            convert(child, span_id)
+
+    convert(root, None)
+    return otlp_spans
+
+
+def to_otlp_trace(root: Span) -> Dict[str, Any]:
+    return {
+        "resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": to_otlp_value(SERVICE_NAME)}]},
+            "scopeSpans": [{"scope": {"name": SERVICE_NAME}, "spans": to_otlp_spans(root)}],
+        }]
+    }
+
+
+class FileSpanExporter:
+    """
+    Appends traces to a file with one OTLP/JSON object per line.
+
+    This is the format of the OpenTelemetry Collector file exporter, so the file can be replayed into any OTLP
+    compatible backend.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.lock = threading.Lock()
+
+    def export(self, root: Span) -> None:
+        line = json.dumps(to_otlp_trace(root))
+        with self.lock:
+            with open(self.path, "a", encoding="utf-8") as file:
+                file.write(line + "\n")
@@ -0,0 +1,9 @@
+"""Vectors module that provides the vector operations shared by the search backends, reranking and caches."""
+
+import numpy as np
+
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    """Scales the rows (or the single vector) to unit length, so that dot products are cosine similarities."""
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    return matrix / np.where(norms > 0, norms, 1)
@@ -0,0 +1,177 @@
+"""Batch module that replays conversations through the chatbot to evaluate settings without the Streamlit app."""
+
+import asyncio
+import json
+import time
+from typing import Any, Dict, List, Optional
+
+from ..core.chatbot import Chatbot, GENERATE_RESPONSE_NAME, KNOWLEDGE_BASE_QUERY_NAME, REPHRASE_USER_INTENT_NAME
+from ..core.chatbot import GENERATE_SUB_QUESTIONS_NAME, PLAN_QUERY_NAME, SUMMARIZE_HISTORY_NAME
+from ..core.clients import pooled_openai_session
+from ..core.models.chat_transaction import ChatTransaction
+from ..core.search import EMBEDDING_SPAN_NAME, SEARCH_REQUEST_SPAN_NAME
+from ..utils.pipeline_settings import PipelineSettings
+from ..utils.prompt_pair import PromptPair
+from ..utils.search_settings import SearchSettings
+
+DEFAULT_MAX_CONCURRENCY = 8
+
+# result columns with the latency of the pipeline stages
+STAGE_LATENCY_COLUMNS = {
+    "latency_rephrase": REPHRASE_USER_INTENT_NAME,
+    "latency_kb_query": KNOWLEDGE_BASE_QUERY_NAME,
+    "latency_plan_query": PLAN_QUERY_NAME,
+    "latency_sub_questions": GENERATE_SUB_QUESTIONS_NAME,
+    "latency_embedding": EMBEDDING_SPAN_NAME,
+    "latency_search": SEARCH_REQUEST_SPAN_NAME,
+    "latency_rag": GENERATE_RESPONSE_NAME,
+    "latency_summarize_history": SUMMARIZE_HISTORY_NAME,
+}
+
+
+class Conversation:
+    """Class that represents a conversation to replay, i. e. a sequence of user queries."""
+
+    def __init__(self, conversation_id: str, turns: List[str]) -> None:
+        self.conversation_id = conversation_id
+        self.turns = turns
+
+
+def load_conversations(path: str) -> List[Conversation]:
+    """
+    Loads conversations from a JSONL file.
+
+    Each line is a json object with the list of user queries under the key `turns` and an optional `id`.
+    """
+    conversations = []
+    with open(path, encoding="utf-8") as file:
+        for line_number, line in enumerate(file):
+            if not line.strip():
+                continue
+            conversation = json.loads(line)
+            conversations.append(Conversation(str(conversation.get("id", line_number)), conversation["turns"]))
+    return conversations
+
+
+class RateLimiter:
+    """Async rate limiter that spaces out acquisitions evenly to a maximum rate per second."""
+
+    def __init__(self, max_per_second: float) -> None:
+        self.interval = 1.0 / max_per_second
+        self.next_time = 0.0
+        self.lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        async with self.lock:
+            now = time.monotonic()
+            wait = self.next_time - now
+            self.next_time = max(now, self.next_time) + self.interval
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+
+def transaction_to_row(conversation_id: str, turn: int, query: str, chat_transaction: Optional[ChatTransaction],
+                       latency: float, error: Optional[str] = None) -> Dict[str, Any]:
+    row = {
+        "conversation_id": conversation_id,
+        "turn": turn,
+        "query": query,
+        "response": None,
+        "text_query": None,
+        "vector_query": None,
+        "document_paths": [],
+        "document_scores": [],
+        "document_reranker_scores": [],
+        "completion_tokens": 0,
+        "cached_tokens": 0,
+        "embedding_tokens": 0,
+        "context_tokens": None,
+        "saved_context_tokens": 0,
+        "latency": latency,
+        "cached": False,
+        "error": error,
+    }
+    for column in STAGE_LATENCY_COLUMNS:
+        row[column] = None
+    if chat_transaction is not None:
+        documents = chat_transaction.get_documents()
+        row.update({
+            "response": chat_transaction.response,
+            "cached": chat_transaction.cached,
+            "text_query": chat_transaction.search_transactions[0].text_query,
+            "vector_query": chat_transaction.search_transactions[0].vector_query,
+            "document_paths": [doc["path"] for doc in documents],
+            "document_scores": [doc.get("@search.score") for doc in documents],
+            "document_reranker_scores": [doc.get("@search.reranker_score") for doc in documents],
+            "completion_tokens": chat_transaction.get_completion_tokens(),
+            "cached_tokens": chat_transaction.get_cached_tokens(),
+            "embedding_tokens": chat_transaction.get_embedding_tokens(),
+            "context_tokens": chat_transaction.context.tokens if chat_transaction.context else None,
+            "saved_context_tokens": chat_transaction.get_saved_context_tokens(),
+        })
+        for column, name in STAGE_LATENCY_COLUMNS.items():
+            row[column] = chat_transaction.get_latency(name)
+    return row
+
+
+class BatchRunner:
+    """
+    Replays conversations through the chatbot with bounded concurrency.
+
+    Conversations run concurrently (each with its own chat history), the turns of a conversation run in order.
+    All conversations share the LLM and search clients of the given chatbot as well as their connections.
+    """
+
+    def __init__(self, chatbot: Chatbot, search_settings: SearchSettings, pipeline_settings: PipelineSettings,
+                 prompts: Dict[str, PromptPair], max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+                 max_turns_per_second: Optional[float] = None) -> None:
+        self.chatbot = chatbot
+        self.search_settings = search_settings
+        self.pipeline_settings = pipeline_settings
+        self.prompts = prompts
+        self.max_concurrency = max_concurrency
+        self.max_turns_per_second = max_turns_per_second
+
+    async def __run_conversation(self, conversation: Conversation, semaphore: asyncio.Semaphore,
+                                 rate_limiter: Optional[RateLimiter]) -> List[Dict[str, Any]]:
+        chatbot = self.chatbot.copy()
+        chatbot.set_prompts(self.prompts)
+        rows = []
+        async with semaphore:
+            for turn, query in enumerate(conversation.turns):
+                if rate_limiter is not None:
+                    await rate_limiter.acquire()
+                start = time.perf_counter()
+                try:
+                    chat_transaction = await chatbot.achat(query, self.search_settings, self.pipeline_settings)
+                except Exception as e:  # record failure, the remaining turns would lack history
+                    rows.append(transaction_to_row(conversation.conversation_id, turn, query, None,
+                                                   time.perf_counter() - start, error=repr(e)))
+                    break
+                rows.append(transaction_to_row(conversation.conversation_id, turn, query, chat_transaction,
+                                               time.perf_counter() - start))
+        return rows
+
+    async def arun(self, conversations: List[Conversation]) -> List[Dict[str, Any]]:
+        """Runs all conversations and returns one result row per turn."""
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        rate_limiter = RateLimiter(self.max_turns_per_second) if self.max_turns_per_second else None
+        async with pooled_openai_session():
+            try:
+                results = await asyncio.gather(*[self.__run_conversation(conversation, semaphore, rate_limiter)
+                                                 for conversation in conversations])
+            finally:
+                await self.chatbot.search.aclose()
+        return [row for rows in results for row in rows]
+
+    def run(self, conversations: List[Conversation]) -> List[Dict[str, Any]]:
+        return asyncio.run(self.arun(conversations))
+
+
+def write_results(rows: List[Dict[str, Any]], path: str) -> None:
+    """Writes the result rows to a Parquet file."""
+    # imported here, so that pyarrow is only loaded when results are written
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    pq.write_table(pa.Table.from_pylist(rows), path)
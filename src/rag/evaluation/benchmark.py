@@ -0,0 +1,124 @@
+"""Benchmark module that measures latency and throughput of the pipeline at fixed concurrency levels."""
+
+import json
+import platform
+import subprocess
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from .batch import Conversation, STAGE_LATENCY_COLUMNS
+from ..core.chatbot import Chatbot
+from ..core.models.chat_transaction import ChatTransaction
+from ..core.search import EMBEDDING_SPAN_NAME, SEARCH_REQUEST_SPAN_NAME
+from ..utils.pipeline_settings import PipelineSettings
+from ..utils.prompt_pair import PromptPair
+from ..utils.search_settings import SearchSettings
+
+DEFAULT_CONCURRENCY_LEVELS = [1, 4, 16]
+PERCENTILES = [50, 95, 99]
+
+# latency of the entire turn and the part of it not spent in requests to the services
+TOTAL_LATENCY_COLUMN = "latency"
+OVERHEAD_LATENCY_COLUMN = "latency_overhead"
+
+
+def get_service_time(chat_transaction: ChatTransaction) -> float:
+    """Returns the time spent in requests to the services, i. e. completions, embeddings and search requests."""
+    service_time = sum(t.span.get_duration() for t in chat_transaction.completion_transactions)
+    for _, span in chat_transaction.span.walk():
+        if span.name in (EMBEDDING_SPAN_NAME, SEARCH_REQUEST_SPAN_NAME):
+            service_time += span.get_duration()
+    return service_time
+
+
+def summarize_latencies(latencies: List[float]) -> Dict[str, float]:
+    """Returns count, mean and percentiles of the latencies in seconds."""
+    summary = {"count": len(latencies), "mean": float(np.mean(latencies)) if latencies else None}
+    for percentile in PERCENTILES:
+        summary[f"p{percentile}"] = float(np.percentile(latencies, percentile)) if latencies else None
+    return summary
+
+
+def get_git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class BenchmarkRunner:
+    """
+    Drives `Chatbot.chat` with a fixed number of concurrent conversations per concurrency level.
+
+    Each conversation gets its own chatbot over the clients of the given chatbot, the turns of a conversation run
+    in order. For every level, throughput (turns per second) and latency percentiles per stage are reported.
+    """
+
+    def __init__(self, chatbot: Chatbot, search_settings: SearchSettings, pipeline_settings: PipelineSettings,
+                 prompts: Dict[str, PromptPair], concurrency_levels: Optional[List[int]] = None,
+                 repeat: int = 1) -> None:
+        self.chatbot = chatbot
+        self.search_settings = search_settings
+        self.pipeline_settings = pipeline_settings
+        self.prompts = prompts
+        self.concurrency_levels = concurrency_levels or DEFAULT_CONCURRENCY_LEVELS
+        self.repeat = repeat
+
+    def __run_conversation(self, conversation: Conversation) -> List[Optional[ChatTransaction]]:
+        chatbot = self.chatbot.copy()
+        chatbot.set_prompts(self.prompts)
+        transactions = []
+        for query in conversation.turns:
+            try:
+                transactions.append(chatbot.chat(query, self.search_settings, self.pipeline_settings))
+            except Exception:  # counted as error, the remaining turns would lack history
+                transactions.append(None)
+                break
+        return transactions
+
+    def run_level(self, conversations: List[Conversation], concurrency: int) -> Dict[str, Any]:
+        """Runs the conversations with the given concurrency and returns throughput and latency percentiles."""
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            results = list(executor.map(self.__run_conversation, conversations * self.repeat))
+        duration = time.perf_counter() - start
+
+        transactions = [t for transactions in results for t in transactions]
+        succeeded = [t for t in transactions if t is not None]
+        latencies = {TOTAL_LATENCY_COLUMN: [t.get_latency() for t in succeeded],
+                     OVERHEAD_LATENCY_COLUMN: [t.get_latency() - get_service_time(t) for t in succeeded]}
+        for column, name in STAGE_LATENCY_COLUMNS.items():
+            latencies[column] = [latency for latency in (t.get_latency(name) for t in succeeded) if latency is not None]
+
+        return {
+            "concurrency": concurrency,
+            "turns": len(transactions),
+            "errors": len(transactions) - len(succeeded),
+            "duration": duration,
+            "throughput": len(succeeded) / duration if duration > 0 else None,
+            "completion_tokens": sum(t.get_completion_tokens() for t in succeeded),
+            "embedding_tokens": sum(t.get_embedding_tokens() for t in succeeded),
+            "latency": {column: summarize_latencies(values) for column, values in latencies.items() if values},
+        }
+
+    def run(self, conversations: List[Conversation]) -> Dict[str, Any]:
+        """Runs all concurrency levels and returns the results together with metadata to compare runs."""
+        return {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "commit": get_git_commit(),
+            "python": platform.python_version(),
+            "backend": self.chatbot.search.backend.name,
+            "search_settings": vars(self.search_settings),
+            "pipeline_settings": vars(self.pipeline_settings),
+            "levels": [self.run_level(conversations, concurrency) for concurrency in self.concurrency_levels],
+        }
+
+
+def write_benchmark(results: Dict[str, Any], path: str) -> None:
+    with open(path, "w", encoding="utf-8") as file:
+        json.dump(results, file, indent=2)
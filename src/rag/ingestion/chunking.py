@@ -0,0 +1,95 @@
+"""Chunking module that splits source documents into sections and token-bounded chunks."""
+
+import hashlib
+import re
+from typing import Any, Dict, List, Tuple
+
+from .loaders import SourceDocument
+from ..core.tokens import count_tokens
+
+DEFAULT_MAX_TOKENS = 512
+DEFAULT_OVERLAP_TOKENS = 64
+
+HEADING_PATTERN = re.compile(r"^#{1,6}\s+(.*)$")
+PARAGRAPH_SEPARATOR = re.compile(r"\n\s*\n")
+
+
+class Chunk:
+    """Class that represents a chunk of a document, i. e. a document of the search index."""
+
+    def __init__(self, path: str, index: int, title: str, section: str, content: str) -> None:
+        self.id = hashlib.sha1(f"{path}#{index}".encode("utf-8")).hexdigest()
+        self.path = path
+        self.title = title
+        self.section = section
+        self.content = content
+        self.content_hash = hashlib.sha256(f"{title}\x00{section}\x00{content}".encode("utf-8")).hexdigest()
+
+    def to_document(self) -> Dict[str, Any]:
+        return {"id": self.id, "title": self.title, "section": self.section, "path": self.path,
+                "content": self.content}
+
+
+def split_sections(text: str, default_section: str) -> List[Tuple[str, str]]:
+    """Splits Markdown text at headings into (heading, body) pairs."""
+    sections = []
+    heading, lines = default_section, []
+    for line in text.splitlines():
+        match = HEADING_PATTERN.match(line.strip())
+        if match:
+            sections.append((heading, "\n".join(lines)))
+            heading, lines = match.group(1).strip(), []
+        else:
+            lines.append(line)
+    sections.append((heading, "\n".join(lines)))
+    return [(heading, body.strip()) for heading, body in sections if body.strip()]
+
+
+def split_long_paragraph(paragraph: str, max_tokens: int) -> List[str]:
+    words = paragraph.split()
+    # words per piece estimated from the token density of the paragraph
+    words_per_piece = max(1, int(len(words) * max_tokens / max(count_tokens(paragraph), 1)))
+    return [" ".join(words[i:i + words_per_piece]) for i in range(0, len(words), words_per_piece)]
+
+
+def split_text(text: str, max_tokens: int = DEFAULT_MAX_TOKENS,
+               overlap_tokens: int = DEFAULT_OVERLAP_TOKENS) -> List[str]:
+    """
+    Packs the paragraphs of the text greedily into chunks of at most `max_tokens` tokens.
+
+    Trailing paragraphs of a chunk with up to `overlap_tokens` tokens are repeated at the start of the next chunk.
+    """
+    paragraphs = []
+    for paragraph in PARAGRAPH_SEPARATOR.split(text):
+        paragraph = paragraph.strip()
+        if paragraph:
+            tokens = count_tokens(paragraph)
+            if tokens > max_tokens:
+                paragraphs.extend((piece, count_tokens(piece)) for piece in split_long_paragraph(paragraph, max_tokens))
+            else:
+                paragraphs.append((paragraph, tokens))
+
+    chunks = []
+    current: List[Tuple[str, int]] = []
+    for paragraph, tokens in paragraphs:
+        if current and sum(t for _, t in current) + tokens > max_tokens:
+            chunks.append("\n\n".join(p for p, _ in current))
+            overlap: List[Tuple[str, int]] = []
+            for previous in reversed(current):
+                if sum(t for _, t in overlap) + previous[1] > min(overlap_tokens, max_tokens - tokens):
+                    break
+                overlap.insert(0, previous)
+            current = overlap
+        current.append((paragraph, tokens))
+    if current:
+        chunks.append("\n\n".join(p for p, _ in current))
+    return chunks
+
+
+def chunk_document(document: SourceDocument, max_tokens: int = DEFAULT_MAX_TOKENS,
+                   overlap_tokens: int = DEFAULT_OVERLAP_TOKENS) -> List[Chunk]:
+    chunks = []
+    for section, body in split_sections(document.text, default_section=document.title):
+        for content in split_text(body, max_tokens, overlap_tokens):
+            chunks.append(Chunk(document.path, len(chunks), document.title, section, content))
+    return chunks
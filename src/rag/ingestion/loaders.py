@@ -0,0 +1,93 @@
+"""Loaders module that reads source documents (Markdown, text and HTML files) from a directory."""
+
+import os
+from html.parser import HTMLParser
+from typing import Iterator, List, Optional
+
+MARKDOWN_EXTENSIONS = {".md", ".markdown"}
+TEXT_EXTENSIONS = {".txt"}
+HTML_EXTENSIONS = {".html", ".htm"}
+SUPPORTED_EXTENSIONS = MARKDOWN_EXTENSIONS | TEXT_EXTENSIONS | HTML_EXTENSIONS
+
+HTML_HEADINGS = {"h1": 1, "h2": 2, "h3": 3, "h4": 4, "h5": 5, "h6": 6}
+HTML_BLOCKS = {"p", "div", "li", "tr", "br", "section", "article", "pre", "blockquote"}
+HTML_IGNORED = {"script", "style", "head", "nav", "footer"}
+
+
+class SourceDocument:
+    """Class that represents a source document with its path relative to the ingested directory."""
+
+    def __init__(self, path: str, title: str, text: str) -> None:
+        self.path = path
+        self.title = title
+        self.text = text
+
+
+class HTMLTextExtractor(HTMLParser):
+    """Extracts the text of an HTML page, headings are converted to Markdown headings to keep the sections."""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.parts: List[str] = []
+        self.title: Optional[str] = None
+        self.__ignored_depth = 0
+        self.__in_title = False
+
+    def handle_starttag(self, tag, attrs) -> None:
+        if tag in HTML_IGNORED:
+            self.__ignored_depth += 1
+        elif tag == "title":
+            self.__in_title = True
+        elif tag in HTML_HEADINGS:
+            self.parts.append("\n\n" + "#" * HTML_HEADINGS[tag] + " ")
+        elif tag in HTML_BLOCKS:
+            self.parts.append("\n\n")
+
+    def handle_endtag(self, tag) -> None:
+        if tag in HTML_IGNORED:
+            self.__ignored_depth = max(0, self.__ignored_depth - 1)
+        elif tag == "title":
+            self.__in_title = False
+        elif tag in HTML_HEADINGS:
+            self.parts.append("\n\n")
+
+    def handle_data(self, data) -> None:
+        if self.__in_title:
+            self.title = (self.title or "") + data.strip()
+        elif not self.__ignored_depth:
+            self.parts.append(" ".join(data.split()) if data.strip() else "")
+
+    def get_text(self) -> str:
+        return "".join(self.parts)
+
+
+def get_markdown_title(text: str) -> Optional[str]:
+    for line in text.splitlines():
+        if line.startswith("# "):
+            return line[2:].strip()
+    return None
+
+
+def load_document(path: str, root: str) -> SourceDocument:
+    with open(path, encoding="utf-8", errors="replace") as file:
+        text = file.read()
+    relative_path = os.path.relpath(path, root).replace(os.sep, "/")
+    default_title = os.path.splitext(os.path.basename(path))[0]
+
+    extension = os.path.splitext(path)[1].lower()
+    if extension in HTML_EXTENSIONS:
+        extractor = HTMLTextExtractor()
+        extractor.feed(text)
+        return SourceDocument(relative_path, extractor.title or default_title, extractor.get_text())
+    if extension in MARKDOWN_EXTENSIONS:
+        return SourceDocument(relative_path, get_markdown_title(text) or default_title, text)
+    return SourceDocument(relative_path, default_title, text)
+
+
+def iter_documents(directory: str) -> Iterator[SourceDocument]:
+    """Yields the supported documents in the directory (recursively) in a deterministic order."""
+    for root, directories, files in os.walk(directory):
+        directories.sort()
+        for file_name in sorted(files):
+            if os.path.splitext(file_name)[1].lower() in SUPPORTED_EXTENSIONS:
+                yield load_document(os.path.join(root, file_name), directory)
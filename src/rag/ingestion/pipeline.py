@@ -0,0 +1,166 @@
+"""Pipeline module that ingests a directory of documents into the search index."""
+
+import json
+import os
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Dict, List, Optional, Set
+
+from .chunking import Chunk, DEFAULT_MAX_TOKENS, DEFAULT_OVERLAP_TOKENS, chunk_document
+from .loaders import iter_documents
+from .writers import IndexWriter
+from ..core.llm import LLM
+
+DEFAULT_BATCH_SIZE = 16
+DEFAULT_MAX_CONCURRENCY = 4
+DEFAULT_CHECKPOINT_INTERVAL = 10
+
+# embedded fields of a chunk and the vector fields of the index
+VECTOR_FIELDS = {"title": "titleVector", "section": "sectionVector", "content": "contentVector"}
+
+
+class Checkpoint:
+    """
+    Ingestion state that maps every source path to the ids and content hashes of its indexed chunks.
+
+    The state is saved atomically to a json file, so an interrupted ingestion resumes with the chunks not yet indexed.
+    """
+
+    def __init__(self, path: Optional[str] = None) -> None:
+        self.path = path
+        self.sources: Dict[str, Dict[str, str]] = {}
+        if path and os.path.exists(path):
+            with open(path, encoding="utf-8") as file:
+                self.sources = json.load(file)
+
+    def save(self) -> None:
+        if not self.path:
+            return
+        temporary_path = self.path + ".tmp"
+        with open(temporary_path, "w", encoding="utf-8") as file:
+            json.dump(self.sources, file)
+        os.replace(temporary_path, self.path)
+
+
+class IngestionStats:
+    """Class that represents the statistics of an ingestion run."""
+
+    def __init__(self) -> None:
+        self.documents = 0
+        self.chunks = 0
+        self.embedded_chunks = 0
+        self.unchanged_chunks = 0
+        self.deleted_chunks = 0
+        self.embedding_tokens = 0
+
+
+class IngestionPipeline:
+    """
+    Pipeline that streams documents from a directory through chunking, embedding and upload.
+
+    Only chunks whose content hash differs from the checkpoint are embedded and uploaded, chunks of removed or
+    shortened documents are deleted from the index. The title, section and content of several chunks are embedded
+    with token-bounded batch requests, up to `max_concurrency` batches of chunks are embedded in parallel.
+    """
+
+    def __init__(self, llm: LLM, writer: IndexWriter, checkpoint: Checkpoint, batch_size: int = DEFAULT_BATCH_SIZE,
+                 max_concurrency: int = DEFAULT_MAX_CONCURRENCY, max_tokens: int = DEFAULT_MAX_TOKENS,
+                 overlap_tokens: int = DEFAULT_OVERLAP_TOKENS,
+                 checkpoint_interval: int = DEFAULT_CHECKPOINT_INTERVAL) -> None:
+        self.llm = llm
+        self.writer = writer
+        self.checkpoint = checkpoint
+        self.batch_size = batch_size
+        self.max_concurrency = max_concurrency
+        self.max_tokens = max_tokens
+        self.overlap_tokens = overlap_tokens
+        self.checkpoint_interval = checkpoint_interval
+
+    def __embed(self, chunks: List[Chunk]) -> Dict[str, Any]:
+        texts = list(dict.fromkeys(getattr(chunk, field) for chunk in chunks for field in VECTOR_FIELDS))
+        # batches run concurrently already, so the requests of a batch are sent sequentially
+        matrix, tokens = self.llm.embed_many(texts, max_concurrency=1, return_tokens=True)
+        rows = {text: i for i, text in enumerate(texts)}
+
+        documents = []
+        for chunk in chunks:
+            document = chunk.to_document()
+            for field, vector_field in VECTOR_FIELDS.items():
+                document[vector_field] = matrix[rows[getattr(chunk, field)]].tolist()
+            documents.append(document)
+        return {"documents": documents, "tokens": tokens}
+
+    def __complete(self, future: Future, chunks: List[Chunk], stats: IngestionStats) -> None:
+        result = future.result()
+        self.writer.upload(result["documents"])
+        for chunk in chunks:
+            self.checkpoint.sources.setdefault(chunk.path, {})[chunk.id] = chunk.content_hash
+        stats.embedded_chunks += len(chunks)
+        stats.embedding_tokens += result["tokens"]
+
+    def __save_checkpoint(self) -> None:
+        self.writer.flush()
+        self.checkpoint.save()
+
+    def __delete(self, path: str, chunk_ids: List[str], stats: IngestionStats) -> None:
+        if not chunk_ids:
+            return
+        self.writer.delete(chunk_ids)
+        for chunk_id in chunk_ids:
+            self.checkpoint.sources[path].pop(chunk_id, None)
+        stats.deleted_chunks += len(chunk_ids)
+
+    def run(self, directory: str) -> IngestionStats:
+        stats = IngestionStats()
+        seen_paths: Set[str] = set()
+        pending: List[Chunk] = []
+        in_flight: Dict[Future, List[Chunk]] = {}
+        completed_batches = 0
+
+        def complete(futures) -> None:
+            nonlocal completed_batches
+            for future in futures:
+                self.__complete(future, in_flight.pop(future), stats)
+                completed_batches += 1
+                if completed_batches % self.checkpoint_interval == 0:
+                    self.__save_checkpoint()
+
+        try:
+            with ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+                def submit(batch: List[Chunk]) -> None:
+                    if len(in_flight) >= self.max_concurrency:
+                        done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                        complete(done)
+                    in_flight[executor.submit(self.__embed, batch)] = batch
+
+                for document in iter_documents(directory):
+                    stats.documents += 1
+                    seen_paths.add(document.path)
+                    chunks = chunk_document(document, self.max_tokens, self.overlap_tokens)
+                    stats.chunks += len(chunks)
+
+                    indexed = self.checkpoint.sources.setdefault(document.path, {})
+                    chunk_ids = {chunk.id for chunk in chunks}
+                    self.__delete(document.path, [chunk_id for chunk_id in indexed if chunk_id not in chunk_ids], stats)
+                    for chunk in chunks:
+                        if indexed.get(chunk.id) == chunk.content_hash:
+                            stats.unchanged_chunks += 1
+                        else:
+                            pending.append(chunk)
+
+                    while len(pending) >= self.batch_size:
+                        submit(pending[:self.batch_size])
+                        pending = pending[self.batch_size:]
+
+                if pending:
+                    submit(pending)
+                complete(list(in_flight))
+        finally:
+            # keep the progress of completed batches if the ingestion fails
+            self.__save_checkpoint()
+
+        for path in [path for path in self.checkpoint.sources if path not in seen_paths]:
+            self.__delete(path, list(self.checkpoint.sources[path]), stats)
+            del self.checkpoint.sources[path]
+
+        self.__save_checkpoint()
+        return stats
@@ -0,0 +1,90 @@
+"""Writers module that provides bulk upload of chunks to the search index of the backends."""
+
+import json
+import os
+import shutil
+from typing import Any, Dict, List, Optional
+
+from azure.core.credentials import AzureKeyCredential
+from azure.search.documents import SearchClient
+
+KEY_FIELD = "id"
+AZURE_UPLOAD_BATCH_SIZE = 1000
+
+
+class IndexWriter:
+    """Interface of a writer that uploads documents to a search index and deletes them by key."""
+
+    def upload(self, documents: List[Dict[str, Any]]) -> None:
+        raise NotImplementedError
+
+    def delete(self, keys: List[str]) -> None:
+        raise NotImplementedError
+
+    def flush(self) -> None:
+        """Persists all changes so far. Called before the ingestion checkpoint is saved."""
+
+
+class AzureIndexWriter(IndexWriter):
+    """Writer for an Azure Cognitive Search index with the key field `id`."""
+
+    def __init__(self, endpoint: str, search_key: str, index_name: str) -> None:
+        self.search_client = SearchClient(
+            endpoint=endpoint,
+            index_name=index_name,
+            credential=AzureKeyCredential(search_key),
+        )
+
+    def upload(self, documents: List[Dict[str, Any]]) -> None:
+        for i in range(0, len(documents), AZURE_UPLOAD_BATCH_SIZE):
+            results = self.search_client.merge_or_upload_documents(documents[i:i + AZURE_UPLOAD_BATCH_SIZE])
+            failed = [result.key for result in results if not result.succeeded]
+            if failed:
+                raise RuntimeError(f"Upload of documents failed: {failed}")
+
+    def delete(self, keys: List[str]) -> None:
+        for i in range(0, len(keys), AZURE_UPLOAD_BATCH_SIZE):
+            self.search_client.delete_documents([{KEY_FIELD: key} for key in keys[i:i + AZURE_UPLOAD_BATCH_SIZE]])
+
+
+class JsonlIndexWriter(IndexWriter):
+    """
+    Writer for the JSONL document file of the local search backend.
+
+    The BM25 index saved in `text_index_path` (if given) is deleted when the file is rewritten, so that the backend
+    builds it again from the new documents.
+    """
+
+    def __init__(self, path: str, text_index_path: Optional[str] = None) -> None:
+        self.path = path
+        self.text_index_path = text_index_path
+        self.documents: Dict[str, Dict[str, Any]] = {}
+        self.changed = False
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as file:
+                for line in file:
+                    if line.strip():
+                        document = json.loads(line)
+                        self.documents[document[KEY_FIELD]] = document
+
+    def upload(self, documents: List[Dict[str, Any]]) -> None:
+        for document in documents:
+            self.documents[document[KEY_FIELD]] = document
+        self.changed = True
+
+    def delete(self, keys: List[str]) -> None:
+        for key in keys:
+            self.documents.pop(key, None)
+        self.changed = True
+
+    def flush(self) -> None:
+        if not self.changed:
+            return
+        temporary_path = self.path + ".tmp"
+        with open(temporary_path, "w", encoding="utf-8") as file:
+            for document in self.documents.values():
+                file.write(json.dumps(document) + "\n")
+        os.replace(temporary_path, self.path)
+        if self.text_index_path and os.path.isdir(self.text_index_path):
+            shutil.rmtree(self.text_index_path)
+        self.changed = False
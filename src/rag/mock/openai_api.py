@@ -0,0 +1,134 @@
+"""Open AI module that provides local stand-ins for the Chat and Embedding APIs of Azure Open AI."""
+
+import asyncio
+import hashlib
+import json
+import time
+from typing import Any, Dict, Iterator, List, Union
+
+import numpy as np
+import openai
+
+from .profile import MockProfile
+from ..core.tokens import count_message_tokens, count_tokens
+
+# json keys requested by the prompts of the pipeline stages
+JSON_KEYS = ["rephrased", "search_expression", "questions"]
+# json keys whose values are lists, the user input is their only item
+JSON_LIST_KEYS = ["questions"]
+MOCK_WORD = "lorem"
+
+
+def mock_response(messages: List[Dict[str, str]], completion_tokens: int) -> str:
+    """
+    Returns a response in the format requested by the system prompt.
+
+    If the system prompt asks for json keys of the pipeline stages, a json object with the user input as values (or as
+    the item of list values) is returned, otherwise a text of about `completion_tokens` tokens.
+    """
+    keys = [key for key in JSON_KEYS if f"'{key}'" in messages[0]["content"]]
+    if keys:
+        user_input = messages[-1]["content"]
+        return json.dumps({key: [user_input] if key in JSON_LIST_KEYS else user_input for key in keys})
+    return " ".join([MOCK_WORD] * max(1, completion_tokens - 1)) + " [mock]"
+
+
+def rate_limit_error(profile: MockProfile) -> openai.error.RateLimitError:
+    return openai.error.RateLimitError(message="Mock rate limit", http_status=429,
+                                       headers={"retry-after-ms": str(profile.retry_after_ms)})
+
+
+class MockChatCompletion:
+    """Stand-in for `openai.ChatCompletion`, supports `create` (also streaming) and `acreate`."""
+
+    def __init__(self, profile: MockProfile) -> None:
+        self.profile = profile
+
+    def __completion(self, deployment_id: str, messages: List[Dict[str, str]], n: int) -> Dict[str, Any]:
+        response = mock_response(messages, self.profile.completion_tokens)
+        prompt_tokens = count_message_tokens(messages)
+        completion_tokens = count_tokens(response) * n
+        return {
+            "object": "chat.completion",
+            "model": deployment_id,
+            "choices": [{"index": i, "message": {"role": "assistant", "content": response}, "finish_reason": "stop"}
+                        for i in range(n)],
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                      "total_tokens": prompt_tokens + completion_tokens},
+        }
+
+    def __latency(self, completion: Dict[str, Any]) -> float:
+        return self.profile.sample(self.profile.chat_latency) \
+            + completion["usage"]["completion_tokens"] * self.profile.token_latency_ms / 1000
+
+    def __stream(self, completion: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+        time.sleep(self.profile.sample(self.profile.chat_latency))
+        response = completion["choices"][0]["message"]["content"]
+        words = response.split(" ")
+        for i, word in enumerate(words):
+            time.sleep(self.profile.token_latency_ms / 1000)
+            delta = word if i == 0 else " " + word
+            yield {"choices": [{"index": 0, "delta": {"content": delta}, "finish_reason": None}]}
+        yield {"choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]}
+
+    def create(self, deployment_id: str, messages: List[Dict[str, str]], n: int = 1, stream: bool = False,
+               **kwargs: Any) -> Union[Dict[str, Any], Iterator[Dict[str, Any]]]:
+        if self.profile.fails():
+            raise rate_limit_error(self.profile)
+        completion = self.__completion(deployment_id, messages, n)
+        if stream:
+            return self.__stream(completion)
+        time.sleep(self.__latency(completion))
+        return completion
+
+    async def acreate(self, deployment_id: str, messages: List[Dict[str, str]], n: int = 1,
+                      **kwargs: Any) -> Dict[str, Any]:
+        if self.profile.fails():
+            raise rate_limit_error(self.profile)
+        completion = self.__completion(deployment_id, messages, n)
+        await asyncio.sleep(self.__latency(completion))
+        return completion
+
+
+class MockEmbedding:
+    """
+    Stand-in for `openai.Embedding`, supports `create` and `acreate`.
+
+    The embeddings are deterministic unit vectors derived from the hash of the text.
+    """
+
+    def __init__(self, profile: MockProfile) -> None:
+        self.profile = profile
+
+    def __embedding(self, text: str) -> List[float]:
+        seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+        vector = np.random.default_rng(seed).standard_normal(self.profile.embedding_dimensions, dtype=np.float32)
+        return (vector / np.linalg.norm(vector)).tolist()
+
+    def __response(self, input: Union[str, List[str]]) -> Dict[str, Any]:
+        texts = [input] if isinstance(input, str) else input
+        tokens = sum(count_tokens(text) for text in texts)
+        return {
+            "object": "list",
+            "data": [{"object": "embedding", "index": i, "embedding": self.__embedding(text)}
+                     for i, text in enumerate(texts)],
+            "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+        }
+
+    def create(self, input: Union[str, List[str]], **kwargs: Any) -> Dict[str, Any]:
+        if self.profile.fails():
+            raise rate_limit_error(self.profile)
+        time.sleep(self.profile.sample(self.profile.embedding_latency))
+        return self.__response(input)
+
+    async def acreate(self, input: Union[str, List[str]], **kwargs: Any) -> Dict[str, Any]:
+        if self.profile.fails():
+            raise rate_limit_error(self.profile)
+        await asyncio.sleep(self.profile.sample(self.profile.embedding_latency))
+        return self.__response(input)
+
+
+def install_mock_openai(profile: MockProfile) -> None:
+    """Replaces the Chat and Embedding APIs of the openai module (globally, like `configure_openapi`)."""
+    openai.ChatCompletion = MockChatCompletion(profile)
+    openai.Embedding = MockEmbedding(profile)
@@ -0,0 +1,70 @@
+"""Profile module that provides the configurable behavior (latency, usage, failures) of the mock services."""
+
+import json
+import random
+from typing import Any, Dict, Optional
+
+
+class LatencyDistribution:
+    """Log-normal latency distribution given by its median and the log-scale standard deviation `sigma`."""
+
+    def __init__(self, median_ms: float, sigma: float = 0.3) -> None:
+        self.median_ms = median_ms
+        self.sigma = sigma
+
+    def sample(self, rng: random.Random) -> float:
+        """Returns a latency in seconds."""
+        if self.median_ms <= 0:
+            return 0.0
+        return rng.lognormvariate(0.0, self.sigma) * self.median_ms / 1000
+
+
+class MockProfile:
+    """
+    Behavior of the mock Azure Open AI and Azure Cognitive Search services.
+
+    The chat latency consists of the time to first token and a latency per generated token. Requests fail with the
+    given rate (rate limit errors with a Retry-After for Open AI, service errors for search).
+    """
+
+    def __init__(self, chat_latency: LatencyDistribution, token_latency_ms: float,
+                 embedding_latency: LatencyDistribution, search_latency: LatencyDistribution,
+                 completion_tokens: int = 100, embedding_dimensions: int = 1536, failure_rate: float = 0.0,
+                 retry_after_ms: float = 500, seed: Optional[int] = None) -> None:
+        self.chat_latency = chat_latency
+        self.token_latency_ms = token_latency_ms
+        self.embedding_latency = embedding_latency
+        self.search_latency = search_latency
+        self.completion_tokens = completion_tokens
+        self.embedding_dimensions = embedding_dimensions
+        self.failure_rate = failure_rate
+        self.retry_after_ms = retry_after_ms
+        self.rng = random.Random(seed)
+
+    def sample(self, distribution: LatencyDistribution) -> float:
+        return distribution.sample(self.rng)
+
+    def fails(self) -> bool:
+        return self.failure_rate > 0 and self.rng.random() < self.failure_rate
+
+    @classmethod
+    def from_dict(cls, profile: Dict[str, Any]) -> "MockProfile":
+        profile = dict(profile)
+        for name in ["chat_latency", "embedding_latency", "search_latency"]:
+            if name in profile:
+                profile[name] = LatencyDistribution(**profile[name])
+        default = DEFAULT_PROFILE
+        return cls(**{"chat_latency": default.chat_latency, "token_latency_ms": default.token_latency_ms,
+                      "embedding_latency": default.embedding_latency, "search_latency": default.search_latency,
+                      **profile})
+
+    @classmethod
+    def from_json(cls, path: str) -> "MockProfile":
+        """Loads a profile from a json file with the constructor arguments, latencies as `median_ms` and `sigma`."""
+        with open(path, encoding="utf-8") as file:
+            return cls.from_dict(json.load(file))
+
+
+# rough latencies of the Azure services in the same region
+DEFAULT_PROFILE = MockProfile(chat_latency=LatencyDistribution(400), token_latency_ms=20,
+                              embedding_latency=LatencyDistribution(60), search_latency=LatencyDistribution(120))
@@ -0,0 +1,63 @@
+"""Search module that provides a local stand-in for Azure Cognitive Search."""
+
+import asyncio
+import hashlib
+import random
+import time
+from typing import Any, Dict, List, Optional
+
+from azure.core.exceptions import ServiceResponseError
+
+from .profile import MockProfile
+from ..core.backends.base import SearchBackend, project_document
+from ..utils.search_settings import SearchSettings
+
+DEFAULT_NUM_DOCUMENTS = 1000
+DEFAULT_DOCUMENT_WORDS = 150
+
+
+class MockSearchBackend(SearchBackend):
+    """
+    Retrieval backend returning synthetic documents with the latency and failure rate of the profile.
+
+    The documents returned for a query are deterministic, so runs with the same queries are comparable.
+    """
+
+    name = "mock"
+
+    def __init__(self, profile: MockProfile, num_documents: int = DEFAULT_NUM_DOCUMENTS,
+                 document_words: int = DEFAULT_DOCUMENT_WORDS) -> None:
+        self.profile = profile
+        self.documents = [{
+            "id": str(i),
+            "path": f"mock/document-{i}.md",
+            "title": f"Document {i}",
+            "section": f"Section {i % 10}",
+            "content": " ".join(f"word{(i * 7 + j) % 997}" for j in range(document_words)),
+        } for i in range(num_documents)]
+
+    def __documents(self, text_query: Optional[str], vector: Optional[List[float]],
+                    search_settings: SearchSettings) -> List[Dict[str, Any]]:
+        key = f"{text_query}\x00{vector[:8] if vector else None}".encode("utf-8")
+        rng = random.Random(hashlib.sha256(key).digest())
+        documents = []
+        for rank, i in enumerate(rng.sample(range(len(self.documents)), min(search_settings.top, len(self.documents)))):
+            document = project_document(self.documents[i], search_settings.select_fields)
+            document["@search.score"] = 1.0 / (1 + rank)
+            document["@search.reranker_score"] = None
+            documents.append(document)
+        return documents
+
+    def search(self, text_query: Optional[str], vector: Optional[List[float]],
+               search_settings: SearchSettings) -> List[Dict[str, Any]]:
+        if self.profile.fails():
+            raise ServiceResponseError("Mock search failure")
+        time.sleep(self.profile.sample(self.profile.search_latency))
+        return self.__documents(text_query, vector, search_settings)
+
+    async def asearch(self, text_query: Optional[str], vector: Optional[List[float]],
+                      search_settings: SearchSettings) -> List[Dict[str, Any]]:
+        if self.profile.fails():
+            raise ServiceResponseError("Mock search failure")
+        await asyncio.sleep(self.profile.sample(self.profile.search_latency))
+        return self.__documents(text_query, vector, search_settings)
@@ -1,19 +1,50 @@
 """Utility functions for the chat section of the Streamlit app UI"""
 
-from typing import Dict, List, Any
+from typing import Dict, Generator, Any
 
 import streamlit as st
 
 from ..core.models.chat_transaction import ChatTransaction
+from ..core.models.transaction_history import TransactionHistory
 
+DETAIL_VIEWS = ["Overview", "Documents", "Latency", "Completions"]
 
-def display_chat(transactions: List[ChatTransaction]) -> None:
-    for chat_transaction in transactions:
+
+def display_chat(history: TransactionHistory) -> None:
+    """
+    Renders the conversation.
+
+    The details of a transaction are only rendered (and spilled transactions only loaded) once a view is selected,
+    so that reruns do not render the details of the entire history.
+    """
+    for i, (query, response) in enumerate(history.get_turns()):
         with st.chat_message("user"):
-            st.write(chat_transaction.query)
+            st.write(query)
         with st.chat_message("assistant"):
-            st.write(chat_transaction.response)
-            display_transaction_details(chat_transaction)
+            st.write(response)
+            view = st.radio("Details", DETAIL_VIEWS, index=None, key=f"details_{i}", horizontal=True,
+                            label_visibility="collapsed")
+            if view is not None:
+                display_transaction_details(history.get(i), view)
+
+
+def display_chat_stream(query: str, stream: Generator[str, None, ChatTransaction]) -> ChatTransaction:
+    """Renders the response of a streaming chat request incrementally and returns the final chat transaction."""
+    with st.chat_message("user"):
+        st.write(query)
+    with st.chat_message("assistant"):
+        placeholder = st.empty()
+        response = ""
+        try:
+            with st.spinner("Processing..."):
+                response += next(stream)
+            while True:
+                placeholder.markdown(response + "▌")
+                response += next(stream)
+        except StopIteration as stop:
+            chat_transaction = stop.value
+        placeholder.markdown(response)
+    return chat_transaction
 
 
 def format_score(value: float) -> str:
@@ -26,15 +57,29 @@ def generate_doc_header(doc: Dict[str, Any]) -> str:
 
 
 def display_documents(chat_transaction: ChatTransaction) -> None:
-    search_transaction = chat_transaction.search_transactions[0]
-    st.markdown(f"Text Query: `{search_transaction.text_query}`")
-    st.markdown(f"Vector Query: `{search_transaction.vector_query}`")
+    for search_transaction in chat_transaction.search_transactions:
+        st.markdown(f"Text Query: `{search_transaction.text_query}`")
+        st.markdown(f"Vector Query: `{search_transaction.vector_query}`")
+        st.markdown(f"Embedding Cache: `{search_transaction.embedding_cache_hits}` hits, "
+                    f"`{search_transaction.embedding_cache_misses}` misses")
+        if search_transaction.cached:
+            st.markdown("Search Cache: `hit`")
+    if chat_transaction.documents is not None:
+        st.markdown(f"Multi-Query: `{len(chat_transaction.documents)}` documents merged from "
+                    f"`{len(chat_transaction.search_transactions)}` searches")
+    context = chat_transaction.context
+    if context is not None:
+        st.markdown(f"Context: `{len(context.documents)}` documents with `{context.tokens}` tokens, "
+                    f"`{context.get_saved_tokens()}` tokens saved (`{context.duplicates}` duplicates, "
+                    f"`{context.over_budget}` over budget)")
     for doc in chat_transaction.get_documents():
         with st.expander(generate_doc_header(doc)):
             st.write(doc["content"])
 
 
 def display_transaction_overview(chat_transaction: ChatTransaction) -> None:
+    if chat_transaction.cached:
+        st.info("Response served from the semantic response cache")
     display_token_count_summary(chat_transaction.get_completion_tokens(), chat_transaction.get_embedding_tokens())
 
 
@@ -51,23 +96,60 @@ def display_conversation_summary(transactions: int, completion_tokens: int, embe
     col_embedding.metric("Embedding Tokens", f"{embedding_tokens}")
 
 
-def display_token_count(usage_counts: Dict[str, int]) -> None:
-    col_total, col_prompt, col_completion = st.columns(3)
+def display_scheduler_metrics(metrics: Dict[str, Any]) -> None:
+    col_requests, col_retries, col_rate_limited = st.columns(3)
+    col_requests.metric("Requests", f"{metrics['requests']}")
+    col_retries.metric("Retries", f"{metrics['retries']}")
+    col_rate_limited.metric("Rate Limited", f"{metrics['rate_limited']}")
+    col_mean_wait, col_max_wait, col_fallbacks = st.columns(3)
+    col_mean_wait.metric("Mean Wait (s)", f"{metrics['mean_wait_seconds']:.2f}")
+    col_max_wait.metric("Max Wait (s)", f"{metrics['max_wait_seconds']:.2f}")
+    col_fallbacks.metric("Fallbacks", f"{metrics['fallbacks']}")
+    st.markdown("Queue Depth: " + ", ".join(f"{name} `{depth}`" for name, depth in metrics["queue_depth"].items()))
+
+
+def display_deployment(attributes: Dict[str, Any]) -> None:
+    if attributes.get("fallback_deployment"):
+        st.markdown(f"Deployment: `{attributes['fallback_deployment']}` "
+                    f"(fallback, `{attributes.get('deployment')}` throttled)")
+    else:
+        st.markdown(f"Deployment: `{attributes.get('deployment')}`")
+
+
+def display_token_count(usage_counts: Dict[str, int], cached_tokens: int = 0) -> None:
+    col_total, col_prompt, col_cached, col_completion = st.columns(4)
     col_total.metric("Total Tokens", f"{usage_counts['total_tokens']}")
     col_prompt.metric("Prompt Tokens", f"{usage_counts['prompt_tokens']}")
+    col_cached.metric("Cached Prompt Tokens", f"{cached_tokens}")
     col_completion.metric("Completion Tokens", f"{usage_counts['completion_tokens']}")
 
 
-def display_transaction_details(chat_transaction: ChatTransaction) -> None:
-    tabs = st.tabs(["Overview", "Documents"] + [t.name for t in chat_transaction.completion_transactions])
-    with tabs[0]:
-        display_transaction_overview(chat_transaction)
-    with tabs[1]:
-        display_documents(chat_transaction)
-    for i, tab in enumerate(tabs[2:]):
+def display_latency(chat_transaction: ChatTransaction) -> None:
+    root = chat_transaction.span
+    st.dataframe([{"Stage": "\u2003" * depth + span.name,
+                   "Start (ms)": round((span.start_time_ns - root.start_time_ns) / 1e6, 1),
+                   "Duration (ms)": round(span.get_duration() * 1e3, 1)}
+                  for depth, span in root.walk()], hide_index=True, use_container_width=True)
+
+
+def display_completions(chat_transaction: ChatTransaction) -> None:
+    tabs = st.tabs([t.name for t in chat_transaction.completion_transactions])
+    for completion_transaction, tab in zip(chat_transaction.completion_transactions, tabs):
         with tab:
-            display_token_count(chat_transaction.completion_transactions[i].completion["usage"])
+            display_deployment(completion_transaction.span.attributes)
+            display_token_count(completion_transaction.completion["usage"], completion_transaction.get_cached_tokens())
             with st.expander("Messages"):
-                st.write(chat_transaction.completion_transactions[i].messages)
+                st.write(completion_transaction.messages)
             with st.expander("Completion"):
-                st.write(chat_transaction.completion_transactions[i].completion)
+                st.write(completion_transaction.completion)
+
+
+def display_transaction_details(chat_transaction: ChatTransaction, view: str) -> None:
+    if view == "Overview":
+        display_transaction_overview(chat_transaction)
+    elif view == "Documents":
+        display_documents(chat_transaction)
+    elif view == "Latency":
+        display_latency(chat_transaction)
+    elif chat_transaction.completion_transactions:
+        display_completions(chat_transaction)
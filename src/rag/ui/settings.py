@@ -1,16 +1,22 @@
 """Utility functions for the settings section of the Streamlit app UI"""
 
-from typing import Dict
+from typing import Dict, Optional
 
 import streamlit as st
 
 from ..core.prompts import DEFAULT_PROMPTS
+from ..core.routing import StageRoute
 from ..utils.pipeline_settings import PipelineSettings
 from ..utils.prompt_pair import PromptPair
 from ..utils.search_settings import SearchSettings
 
+DEFAULT_CONTEXT_DEDUP_THRESHOLD = 0.8
+DEFAULT_CONTEXT_MAX_TOKENS = 3000
 DEFAULT_K = 4
+DEFAULT_MMR_FETCH_FACTOR = 3
+DEFAULT_MMR_LAMBDA = 0.5
 DEFAULT_NUM_HISTORY = 2
+DEFAULT_NUM_SUB_QUESTIONS = 2
 DEFAULT_SCORING_PROFILE_NAME = "test"
 DEFAULT_SEMANTIC_SEARCH_NAME = "test"
 DEFAULT_TEMPERATURE_INPUT_SUMMARIZATION = 0.7
@@ -22,16 +28,35 @@ DEFAULT_VECTOR_FIELDS = ["sectionVector", "titleVector", "contentVector"]
 
 def display_pipeline_settings() -> PipelineSettings:
     num_history = st.slider("History Length", 0, 10, DEFAULT_NUM_HISTORY)
+    history_summarization = st.toggle("History Summarization",
+                                      help="Summarize turns older than the history length instead of dropping them")
     rag_temperature = st.slider("RAG Temperature", 0.0, 2.0, DEFAULT_TEMPERATURE_RAG)
     input_summarization = st.toggle("Input Summarization")
     input_summarization_temperature = DEFAULT_TEMPERATURE_INPUT_SUMMARIZATION
     if input_summarization:
         input_summarization_temperature = st.slider("Input Summarization Temperature", 0.0, 2.0,
                                                     DEFAULT_TEMPERATURE_INPUT_SUMMARIZATION)
+    context_max_tokens = st.slider("Context Token Budget", 0, 16000, DEFAULT_CONTEXT_MAX_TOKENS, step=250,
+                                   help="0 means no limit")
+    context_dedup = st.toggle("Remove Duplicate Documents", value=True)
+    context_dedup_threshold = None
+    if context_dedup:
+        context_dedup_threshold = st.slider("Duplicate Similarity Threshold", 0.5, 1.0,
+                                            DEFAULT_CONTEXT_DEDUP_THRESHOLD)
+    prefix_stable_layout = st.toggle("Prefix-Stable Prompt Layout",
+                                     help="Send the documents after the history, so that the prompt prefix is cached")
+    multi_query = st.toggle("Multi-Query Retrieval",
+                            help="Search with several query variants concurrently and merge the results")
+    num_sub_questions = 0
+    if multi_query:
+        num_sub_questions = st.slider("Sub-Questions", 0, 5, DEFAULT_NUM_SUB_QUESTIONS)
 
     return PipelineSettings(num_history=num_history, input_summarization=input_summarization,
                             input_summarization_temperature=input_summarization_temperature,
-                            rag_temperature=rag_temperature)
+                            rag_temperature=rag_temperature, context_max_tokens=context_max_tokens or None,
+                            context_dedup_threshold=context_dedup_threshold,
+                            history_summarization=history_summarization, multi_query=multi_query,
+                            num_sub_questions=num_sub_questions, prefix_stable_layout=prefix_stable_layout)
 
 
 def display_search_settings() -> SearchSettings:
@@ -50,21 +75,42 @@ def display_search_settings() -> SearchSettings:
     vector_fields = st.multiselect("Vector Fields", DEFAULT_VECTOR_FIELDS, DEFAULT_VECTOR_FIELDS)
     k = st.slider("k", 1, 20, DEFAULT_K)
     scoring_profile_name = st.text_input("Scoring Profile Name", DEFAULT_SCORING_PROFILE_NAME)
+    mmr = st.toggle("Diversity Reranking (MMR)",
+                    help="Fetch more documents and select a diverse subset of Top documents")
+    mmr_lambda = None
+    mmr_fetch_factor = DEFAULT_MMR_FETCH_FACTOR
+    if mmr:
+        mmr_lambda = st.slider("MMR Lambda", 0.0, 1.0, DEFAULT_MMR_LAMBDA,
+                               help="1 ranks by relevance only, lower values favor diversity")
+        mmr_fetch_factor = st.slider("Over-Fetch Factor", 1, 10, DEFAULT_MMR_FETCH_FACTOR)
 
     return SearchSettings(vector_search=vector_search, text_search=text_search, semantic_search=semantic_search,
                           semantic_configuration_name=semantic_configuration_name, top=top, vector_fields=vector_fields,
-                          k=k, scoring_profile_name=scoring_profile_name, temperature_kb_query=temperature_kb_query)
+                          k=k, scoring_profile_name=scoring_profile_name, temperature_kb_query=temperature_kb_query,
+                          mmr_lambda=mmr_lambda, mmr_fetch_factor=mmr_fetch_factor)
 
 
 def display_prompt_settings() -> Dict[str, PromptPair]:
     modified_prompts = dict()
     for prompt_name, prompt_pair in DEFAULT_PROMPTS.items():
         with st.expander(prompt_name):
-            system_prompt = st.text_area("System Prompt", DEFAULT_PROMPTS[prompt_name].system_prompt, height=300)
+            system_prompt = st.text_area("System Prompt", prompt_pair.system_prompt, height=300,
+                                         key=f"{prompt_name}_system")
             user_prompt = None
-            if DEFAULT_PROMPTS[prompt_name].user_prompt:
-                user_prompt = st.text_area("User Prompt", DEFAULT_PROMPTS[prompt_name].user_prompt, height=300)
+            if prompt_pair.user_prompt:
+                user_prompt = st.text_area("User Prompt", prompt_pair.user_prompt, height=300,
+                                           key=f"{prompt_name}_user")
 
             modified_prompts[prompt_name] = PromptPair(system_prompt=system_prompt, user_prompt=user_prompt)
 
     return modified_prompts
+
+
+def display_model_routes(routes: Dict[str, StageRoute], chat_deployment_name: str,
+                         fallback_deployment_name: Optional[str]) -> None:
+    st.markdown(f"Chat Deployment: `{chat_deployment_name}`, Fallback: `{fallback_deployment_name}`")
+    if routes:
+        st.table([{"Stage": stage, "Deployment": route.deployment_name or chat_deployment_name,
+                   "Max Tokens": route.max_tokens, "Timeout (s)": route.request_timeout,
+                   "Fallback": route.fallback_deployment_name or fallback_deployment_name}
+                  for stage, route in routes.items()])
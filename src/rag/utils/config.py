@@ -1,13 +1,26 @@
 """Config module that provides helper functions to set up the app"""
 
 import os
-from typing import Dict
+from typing import TYPE_CHECKING, Dict, Optional
 
-from dotenv import load_dotenv
+from ..core.clients import DEFAULT_POOL_SIZE, DEFAULT_TIMEOUT
+from ..core.scheduler import Priority, RequestScheduler
 
-from ..core.chatbot import Chatbot
-from ..core.llm import LLM, configure_openapi
-from ..core.search import SearchService
+# the factories import the modules of the clients and backends they create, so that the SDKs (openai, azure) are
+# loaded on first use and not when the app starts
+if TYPE_CHECKING:
+    from ..api.sessions import SessionStore
+    from ..core.backends.base import SearchBackend
+    from ..core.chatbot import Chatbot
+    from ..core.embedding_cache import EmbeddingCache
+    from ..core.llm import LLM
+    from ..core.response_cache import SemanticResponseCache
+    from ..core.retrieval_cache import RetrievalCache
+    from ..core.routing import StageRoute
+    from ..core.search import SearchService
+    from ..ingestion.writers import IndexWriter
+    from ..core.models.transaction_history import TransactionHistory
+    from ..mock.profile import MockProfile
 
 AZURE_COGNITIVE_SEARCH_ENDPOINT = "AZURE_COGNITIVE_SEARCH_ENDPOINT"
 AZURE_COGNITIVE_SEARCH_INDEX_NAME = "AZURE_COGNITIVE_SEARCH_INDEX_NAME"
@@ -16,20 +29,98 @@ AZURE_OPEN_AI_ENDPOINT = "AZURE_OPEN_AI_ENDPOINT"
 AZURE_OPEN_AI_KEY = "AZURE_OPEN_AI_KEY"
 AZURE_OPEN_AI_EMBEDDING_DEPLOYMENT = "AZURE_OPEN_AI_EMBEDDING_DEPLOYMENT"
 AZURE_OPEN_AI_CHAT_DEPLOYMENT = "AZURE_OPEN_AI_CHAT_DEPLOYMENT"
+AZURE_OPEN_AI_FALLBACK_DEPLOYMENT = "AZURE_OPEN_AI_FALLBACK_DEPLOYMENT"
+AZURE_OPEN_AI_API_VERSION = "AZURE_OPEN_AI_API_VERSION"
+MODEL_ROUTES_PATH = "MODEL_ROUTES_PATH"
+EMBEDDING_CACHE_SIZE = "EMBEDDING_CACHE_SIZE"
+EMBEDDING_CACHE_TTL = "EMBEDDING_CACHE_TTL"
+EMBEDDING_CACHE_PATH = "EMBEDDING_CACHE_PATH"
+EMBEDDING_CONCURRENCY = "EMBEDDING_CONCURRENCY"
+RATE_LIMIT_REQUESTS_PER_MINUTE = "RATE_LIMIT_REQUESTS_PER_MINUTE"
+RATE_LIMIT_TOKENS_PER_MINUTE = "RATE_LIMIT_TOKENS_PER_MINUTE"
+MAX_RETRIES = "MAX_RETRIES"
+HTTP_POOL_SIZE = "HTTP_POOL_SIZE"
+REQUEST_TIMEOUT = "REQUEST_TIMEOUT"
+TRACE_EXPORT_PATH = "TRACE_EXPORT_PATH"
+RESPONSE_CACHE_THRESHOLD = "RESPONSE_CACHE_THRESHOLD"
+RESPONSE_CACHE_SIZE = "RESPONSE_CACHE_SIZE"
+RETRIEVAL_CACHE_SIZE = "RETRIEVAL_CACHE_SIZE"
+RETRIEVAL_CACHE_TTL = "RETRIEVAL_CACHE_TTL"
+SEARCH_BACKEND = "SEARCH_BACKEND"
+LOCAL_INDEX_PATH = "LOCAL_INDEX_PATH"
+LOCAL_INDEX_VECTOR_FIELDS = "LOCAL_INDEX_VECTOR_FIELDS"
+LOCAL_TEXT_INDEX_PATH = "LOCAL_TEXT_INDEX_PATH"
+OPEN_AI_BACKEND = "OPEN_AI_BACKEND"
+MOCK_PROFILE_PATH = "MOCK_PROFILE_PATH"
+SESSION_STORE = "SESSION_STORE"
+SESSION_STORE_PATH = "SESSION_STORE_PATH"
+SESSION_TTL = "SESSION_TTL"
+SERVER_SETTINGS_PATH = "SERVER_SETTINGS_PATH"
+TRANSACTIONS_IN_MEMORY = "TRANSACTIONS_IN_MEMORY"
 
-REQUIRED_ENV_VARIABLES = [AZURE_COGNITIVE_SEARCH_ENDPOINT,
-                          AZURE_COGNITIVE_SEARCH_INDEX_NAME,
-                          AZURE_COGNITIVE_SEARCH_KEY,
-                          AZURE_OPEN_AI_ENDPOINT,
-                          AZURE_OPEN_AI_KEY,
-                          AZURE_OPEN_AI_EMBEDDING_DEPLOYMENT,
-                          AZURE_OPEN_AI_CHAT_DEPLOYMENT]
+AZURE_SEARCH_BACKEND = "azure"
+LOCAL_SEARCH_BACKEND = "local"
+AZURE_OPEN_AI_BACKEND = "azure"
+MOCK_BACKEND = "mock"
+MEMORY_SESSION_STORE = "memory"
+SQLITE_SESSION_STORE = "sqlite"
+
+# variables required by the Open AI backends
+OPEN_AI_ENV_VARIABLES = {AZURE_OPEN_AI_BACKEND: [AZURE_OPEN_AI_ENDPOINT,
+                                                 AZURE_OPEN_AI_KEY,
+                                                 AZURE_OPEN_AI_EMBEDDING_DEPLOYMENT,
+                                                 AZURE_OPEN_AI_CHAT_DEPLOYMENT],
+                         MOCK_BACKEND: []}
+
+# variables required by the search backends
+BACKEND_ENV_VARIABLES = {AZURE_SEARCH_BACKEND: [AZURE_COGNITIVE_SEARCH_ENDPOINT,
+                                                AZURE_COGNITIVE_SEARCH_INDEX_NAME,
+                                                AZURE_COGNITIVE_SEARCH_KEY],
+                         LOCAL_SEARCH_BACKEND: [LOCAL_INDEX_PATH],
+                         MOCK_BACKEND: []}
+
+# optional variables and their defaults (empty string means disabled)
+OPTIONAL_ENV_VARIABLES = {EMBEDDING_CACHE_SIZE: "1024",
+                          EMBEDDING_CACHE_TTL: "",
+                          EMBEDDING_CACHE_PATH: "",
+                          EMBEDDING_CONCURRENCY: "4",
+                          RATE_LIMIT_REQUESTS_PER_MINUTE: "",
+                          RATE_LIMIT_TOKENS_PER_MINUTE: "",
+                          MAX_RETRIES: "3",
+                          HTTP_POOL_SIZE: str(DEFAULT_POOL_SIZE),
+                          REQUEST_TIMEOUT: str(DEFAULT_TIMEOUT),
+                          TRACE_EXPORT_PATH: "",
+                          RESPONSE_CACHE_THRESHOLD: "",
+                          RESPONSE_CACHE_SIZE: "1000",
+                          RETRIEVAL_CACHE_SIZE: "1000",
+                          RETRIEVAL_CACHE_TTL: "300",
+                          SEARCH_BACKEND: AZURE_SEARCH_BACKEND,
+                          LOCAL_INDEX_VECTOR_FIELDS: "sectionVector,titleVector,contentVector",
+                          LOCAL_TEXT_INDEX_PATH: "",
+                          OPEN_AI_BACKEND: AZURE_OPEN_AI_BACKEND,
+                          MOCK_PROFILE_PATH: "",
+                          SESSION_STORE: MEMORY_SESSION_STORE,
+                          SESSION_STORE_PATH: "sessions.db",
+                          SESSION_TTL: "86400",
+                          SERVER_SETTINGS_PATH: "",
+                          TRANSACTIONS_IN_MEMORY: "20",
+                          AZURE_OPEN_AI_FALLBACK_DEPLOYMENT: "",
+                          MODEL_ROUTES_PATH: "",
+                          AZURE_OPEN_AI_API_VERSION: ""}
 
 
 def load_config() -> Dict[str, str]:
+    from dotenv import load_dotenv
+
     load_dotenv()
     config = dict()
-    for var_name in REQUIRED_ENV_VARIABLES:
+    for var_name, default_value in OPTIONAL_ENV_VARIABLES.items():
+        config[var_name] = os.getenv(var_name, default_value)
+    if config[OPEN_AI_BACKEND] not in OPEN_AI_ENV_VARIABLES:
+        raise ValueError(f"Unknown Open AI backend: {config[OPEN_AI_BACKEND]}")
+    if config[SEARCH_BACKEND] not in BACKEND_ENV_VARIABLES:
+        raise ValueError(f"Unknown search backend: {config[SEARCH_BACKEND]}")
+    for var_name in OPEN_AI_ENV_VARIABLES[config[OPEN_AI_BACKEND]] + BACKEND_ENV_VARIABLES[config[SEARCH_BACKEND]]:
         var_value = os.getenv(var_name)
         if var_value is None:
             raise ValueError(f"Environment variable not defined: {var_name}")
@@ -37,15 +128,157 @@ def load_config() -> Dict[str, str]:
     return config
 
 
-def create_chatbot(config: Dict[str, str]) -> Chatbot:
-    configure_openapi(endpoint=config[AZURE_OPEN_AI_ENDPOINT], key=config[AZURE_OPEN_AI_KEY])
+def create_embedding_cache(config: Dict[str, str]) -> Optional["EmbeddingCache"]:
+    from ..core.embedding_cache import EmbeddingCache
+
+    max_entries = int(config.get(EMBEDDING_CACHE_SIZE) or 0)
+    if max_entries <= 0:
+        return None
+    ttl_seconds = float(config[EMBEDDING_CACHE_TTL]) if config.get(EMBEDDING_CACHE_TTL) else None
+    return EmbeddingCache(max_entries=max_entries, ttl_seconds=ttl_seconds,
+                          path=config.get(EMBEDDING_CACHE_PATH) or None)
+
+
+def create_response_cache(config: Dict[str, str]) -> Optional["SemanticResponseCache"]:
+    from ..core.response_cache import SemanticResponseCache
+
+    if not config.get(RESPONSE_CACHE_THRESHOLD):
+        return None
+    return SemanticResponseCache(threshold=float(config[RESPONSE_CACHE_THRESHOLD]),
+                                 max_entries=int(config[RESPONSE_CACHE_SIZE]))
+
+
+def create_retrieval_cache(config: Dict[str, str]) -> Optional["RetrievalCache"]:
+    from ..core.retrieval_cache import RetrievalCache
+
+    max_entries = int(config.get(RETRIEVAL_CACHE_SIZE) or 0)
+    if max_entries <= 0:
+        return None
+    ttl_seconds = float(config[RETRIEVAL_CACHE_TTL]) if config.get(RETRIEVAL_CACHE_TTL) else None
+    return RetrievalCache(max_entries=max_entries, ttl_seconds=ttl_seconds)
+
+
+def create_scheduler(config: Dict[str, str]) -> RequestScheduler:
+    rpm = config.get(RATE_LIMIT_REQUESTS_PER_MINUTE)
+    tpm = config.get(RATE_LIMIT_TOKENS_PER_MINUTE)
+    return RequestScheduler(requests_per_minute=float(rpm) if rpm else None,
+                            tokens_per_minute=float(tpm) if tpm else None,
+                            max_retries=int(config[MAX_RETRIES]))
+
+
+def create_mock_profile(config: Dict[str, str]) -> "MockProfile":
+    from ..mock.profile import DEFAULT_PROFILE, MockProfile
+
+    if config.get(MOCK_PROFILE_PATH):
+        return MockProfile.from_json(config[MOCK_PROFILE_PATH])
+    return DEFAULT_PROFILE
+
+
+def create_search_backend(config: Dict[str, str]) -> "SearchBackend":
+    if config[SEARCH_BACKEND] == MOCK_BACKEND:
+        from ..mock.search import MockSearchBackend
+        return MockSearchBackend(create_mock_profile(config))
+    if config[SEARCH_BACKEND] == LOCAL_SEARCH_BACKEND:
+        from ..core.backends.local import LocalSearchBackend
+        return LocalSearchBackend.from_jsonl(config[LOCAL_INDEX_PATH],
+                                             vector_fields=config[LOCAL_INDEX_VECTOR_FIELDS].split(","),
+                                             text_index_path=config.get(LOCAL_TEXT_INDEX_PATH) or None)
+    from ..core.backends.azure_search import AzureSearchBackend
+    from ..core.clients import create_http_session
+    return AzureSearchBackend(endpoint=config[AZURE_COGNITIVE_SEARCH_ENDPOINT],
+                              search_key=config[AZURE_COGNITIVE_SEARCH_KEY],
+                              index_name=config[AZURE_COGNITIVE_SEARCH_INDEX_NAME],
+                              session=create_http_session(int(config[HTTP_POOL_SIZE])),
+                              timeout=float(config[REQUEST_TIMEOUT]))
+
+
+def create_search_service(config: Dict[str, str], llm: "LLM") -> "SearchService":
+    from ..core.search import SearchService
+    return SearchService(backend=create_search_backend(config), llm=llm, retrieval_cache=create_retrieval_cache(config))
 
-    llm = LLM(chat_deployment_name=config[AZURE_OPEN_AI_CHAT_DEPLOYMENT],
-              embedding_deployment_name=config[AZURE_OPEN_AI_EMBEDDING_DEPLOYMENT])
-    search = SearchService(endpoint=config[AZURE_COGNITIVE_SEARCH_ENDPOINT],
-                           search_key=config[AZURE_COGNITIVE_SEARCH_KEY],
-                           index_name=config[AZURE_COGNITIVE_SEARCH_INDEX_NAME],
-                           llm=llm)
 
-    chatbot = Chatbot(llm=llm, search=search)
+def create_index_writer(config: Dict[str, str]) -> "IndexWriter":
+    if config[SEARCH_BACKEND] == MOCK_BACKEND:
+        raise ValueError("The mock search backend has no index to write to")
+    if config[SEARCH_BACKEND] == LOCAL_SEARCH_BACKEND:
+        from ..ingestion.writers import JsonlIndexWriter
+        return JsonlIndexWriter(config[LOCAL_INDEX_PATH], text_index_path=config.get(LOCAL_TEXT_INDEX_PATH) or None)
+    from ..ingestion.writers import AzureIndexWriter
+    return AzureIndexWriter(endpoint=config[AZURE_COGNITIVE_SEARCH_ENDPOINT],
+                            search_key=config[AZURE_COGNITIVE_SEARCH_KEY],
+                            index_name=config[AZURE_COGNITIVE_SEARCH_INDEX_NAME])
+
+
+def create_llm(config: Dict[str, str], scheduler: Optional[RequestScheduler] = None,
+               priority: Priority = Priority.INTERACTIVE) -> "LLM":
+    """Creates the LLM client, the scheduler should be shared by all clients of the process."""
+    from ..core.llm import DEFAULT_API_VERSION, LLM, configure_openapi
+
+    if config[OPEN_AI_BACKEND] == MOCK_BACKEND:
+        from ..mock.openai_api import install_mock_openai
+        install_mock_openai(create_mock_profile(config))
+    else:
+        from ..core.clients import create_http_session
+        configure_openapi(endpoint=config[AZURE_OPEN_AI_ENDPOINT], key=config[AZURE_OPEN_AI_KEY],
+                          session=create_http_session(int(config[HTTP_POOL_SIZE])),
+                          api_version=config.get(AZURE_OPEN_AI_API_VERSION) or DEFAULT_API_VERSION)
+
+    return LLM(chat_deployment_name=config.get(AZURE_OPEN_AI_CHAT_DEPLOYMENT, MOCK_BACKEND),
+               embedding_deployment_name=config.get(AZURE_OPEN_AI_EMBEDDING_DEPLOYMENT, MOCK_BACKEND),
+               embedding_cache=create_embedding_cache(config),
+               embedding_concurrency=int(config[EMBEDDING_CONCURRENCY]),
+               scheduler=scheduler or create_scheduler(config),
+               priority=priority,
+               request_timeout=float(config[REQUEST_TIMEOUT]),
+               fallback_deployment_name=config.get(AZURE_OPEN_AI_FALLBACK_DEPLOYMENT) or None)
+
+
+def create_model_routes(config: Dict[str, str]) -> Dict[str, "StageRoute"]:
+    """Creates the routes of the pipeline stages, stages without a route use the chat deployment."""
+    from ..core.routing import load_routes
+
+    if not config.get(MODEL_ROUTES_PATH):
+        return {}
+    return load_routes(config[MODEL_ROUTES_PATH])
+
+
+def create_chatbot(config: Dict[str, str], llm: Optional["LLM"] = None, search: Optional["SearchService"] = None,
+                   priority: Priority = Priority.INTERACTIVE,
+                   response_cache: Optional["SemanticResponseCache"] = None) -> "Chatbot":
+    """
+    Creates a chatbot, which holds the state of one conversation.
+
+    The clients and the response cache are created unless shared ones are passed along (see `app.py`). The response
+    cache only serves responses across conversations if all their chatbots share it.
+    """
+    from ..core.chatbot import Chatbot
+    from ..core.tracing import FileSpanExporter
+
+    llm = llm or create_llm(config, priority=priority)
+    search = search or create_search_service(config, llm)
+
+    span_exporter = FileSpanExporter(config[TRACE_EXPORT_PATH]) if config.get(TRACE_EXPORT_PATH) else None
+
+    chatbot = Chatbot(llm=llm, search=search, span_exporter=span_exporter,
+                      response_cache=response_cache if response_cache is not None else create_response_cache(config),
+                      routes=create_model_routes(config))
     return chatbot
+
+
+def create_session_store(config: Dict[str, str]) -> "SessionStore":
+    """Creates the session store of the API server, only the `sqlite` store can be shared by several workers."""
+    from ..api.sessions import InMemorySessionStore, SqliteSessionStore
+
+    ttl_seconds = float(config[SESSION_TTL]) if config.get(SESSION_TTL) else None
+    if config[SESSION_STORE] == SQLITE_SESSION_STORE:
+        return SqliteSessionStore(config[SESSION_STORE_PATH], ttl_seconds=ttl_seconds)
+    if config[SESSION_STORE] == MEMORY_SESSION_STORE:
+        return InMemorySessionStore()
+    raise ValueError(f"Unknown session store: {config[SESSION_STORE]}")
+
+
+def create_transaction_history(config: Dict[str, str]) -> "TransactionHistory":
+    from ..core.models.transaction_history import TransactionHistory
+
+    max_in_memory = int(config[TRANSACTIONS_IN_MEMORY]) if config.get(TRANSACTIONS_IN_MEMORY) else None
+    return TransactionHistory(max_in_memory=max_in_memory)
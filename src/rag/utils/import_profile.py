@@ -0,0 +1,48 @@
+"""Import profile module that measures the import time of modules, e.g. to keep the startup of the app fast."""
+
+import re
+import subprocess
+import sys
+from typing import List
+
+# line of the `-X importtime` report, e.g. "import time:       512 |       1024 |   rag.core.llm"
+IMPORT_TIME_PATTERN = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$")
+
+
+class ImportTime:
+    """Import time of a module in microseconds, `self_us` excludes the modules it imports itself."""
+
+    def __init__(self, module: str, self_us: int, cumulative_us: int, depth: int) -> None:
+        self.module = module
+        self.self_us = self_us
+        self.cumulative_us = cumulative_us
+        self.depth = depth
+
+    def get_package(self) -> str:
+        return self.module.split(".")[0]
+
+
+def run_importtime(code: str) -> List[ImportTime]:
+    """Runs the code in a fresh interpreter with `-X importtime` and returns the reported import times."""
+    process = subprocess.run([sys.executable, "-X", "importtime", "-c", code], capture_output=True, text=True)
+    if process.returncode != 0:
+        raise RuntimeError(f"Running {code!r} failed:\n{process.stderr}")
+
+    import_times = []
+    for line in process.stderr.splitlines():
+        match = IMPORT_TIME_PATTERN.match(line)
+        if match:
+            import_times.append(ImportTime(module=match.group(4), self_us=int(match.group(1)),
+                                           cumulative_us=int(match.group(2)),
+                                           depth=(len(match.group(3)) - 1) // 2))
+    return import_times
+
+
+def profile_imports(modules: List[str]) -> List[ImportTime]:
+    """Returns the import times of the modules and their dependencies, except those of the interpreter startup."""
+    startup_modules = {t.module for t in run_importtime("pass")}
+    return [t for t in run_importtime("import " + ", ".join(modules)) if t.module not in startup_modules]
+
+
+def get_total_us(import_times: List[ImportTime]) -> int:
+    return sum(t.cumulative_us for t in import_times if t.depth == 0)
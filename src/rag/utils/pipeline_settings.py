@@ -1,9 +1,49 @@
+from typing import Optional
+
+from .validation import check_setting
+
+
 class PipelineSettings:
-    """Class that represents settings for the RAG pipeline."""
+    """
+    Class that represents settings for the RAG pipeline.
+
+    The context of the response generation is limited to `context_max_tokens` (None means no limit), and near
+    duplicate documents with a similarity of at least `context_dedup_threshold` are dropped (None keeps them).
+    With `history_summarization`, turns older than the last `num_history` turns are compacted into a running summary
+    instead of being dropped.
+    With `multi_query`, the knowledge base is searched with several query variants concurrently (the search as
+    configured, the raw user input and up to `num_sub_questions` generated sub-questions) and the results are merged
+    with reciprocal rank fusion.
+    With `prefix_stable_layout`, the prompt of the response generation starts with the same system message for every
+    request and the retrieved documents are sent after the history, so that the service can cache the prompt prefix.
+    """
 
     def __init__(self, num_history: int, input_summarization: bool, input_summarization_temperature: float,
-                 rag_temperature: float) -> None:
+                 rag_temperature: float, context_max_tokens: Optional[int] = None,
+                 context_dedup_threshold: Optional[float] = None, history_summarization: bool = False,
+                 multi_query: bool = False, num_sub_questions: int = 0, prefix_stable_layout: bool = False) -> None:
         self.num_history = num_history
         self.input_summarization = input_summarization
         self.input_summarization_temperature = input_summarization_temperature
         self.rag_temperature = rag_temperature
+        self.context_max_tokens = context_max_tokens
+        self.context_dedup_threshold = context_dedup_threshold
+        self.history_summarization = history_summarization
+        self.multi_query = multi_query
+        self.num_sub_questions = num_sub_questions
+        self.prefix_stable_layout = prefix_stable_layout
+
+    def validate(self) -> None:
+        """Raises a ValueError if a setting has an invalid type or value, e.g. in a settings file or API request."""
+        check_setting("num_history", self.num_history, int, minimum=0)
+        check_setting("input_summarization", self.input_summarization, bool)
+        check_setting("input_summarization_temperature", self.input_summarization_temperature, (int, float),
+                      minimum=0.0, maximum=2.0)
+        check_setting("rag_temperature", self.rag_temperature, (int, float), minimum=0.0, maximum=2.0)
+        check_setting("context_max_tokens", self.context_max_tokens, int, optional=True, minimum=1)
+        check_setting("context_dedup_threshold", self.context_dedup_threshold, (int, float), optional=True,
+                      minimum=0.0, maximum=1.0)
+        check_setting("history_summarization", self.history_summarization, bool)
+        check_setting("multi_query", self.multi_query, bool)
+        check_setting("num_sub_questions", self.num_sub_questions, int, minimum=0)
+        check_setting("prefix_stable_layout", self.prefix_stable_layout, bool)
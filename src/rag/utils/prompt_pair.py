@@ -1,4 +1,8 @@
-from typing import Optional
+from string import Formatter
+from typing import Any, List, Optional, Tuple
+
+# conversions of format fields, e.g. {field!r}
+CONVERSIONS = {"r": repr, "s": str, "a": ascii}
 
 
 class PromptPair:
@@ -7,3 +11,36 @@ class PromptPair:
     def __init__(self, system_prompt: str, user_prompt: Optional[str] = None) -> None:
         self.system_prompt = system_prompt
         self.user_prompt = user_prompt
+
+
+class PromptTemplate:
+    """
+    Prompt template that is parsed once and rendered by joining its literal parts with the values of its fields.
+
+    Renders like `str.format` with keyword arguments, without parsing the template on every request. Only named fields
+    are supported: positional (`{}`, `{0}`), indexed (`{a[0]}`) and attribute (`{a.real}`) fields as well as fields
+    nested in a format spec raise a ValueError when the template is compiled, like unbalanced braces and unknown
+    conversions.
+    """
+
+    def __init__(self, template: str) -> None:
+        self.template = template
+        self.parts: List[Tuple[str, Optional[str], str, Optional[str]]] = list(Formatter().parse(template))
+        for _, field, spec, conversion in self.parts:
+            if field is not None and not field.isidentifier():
+                raise ValueError(f"Unsupported field {{{field}}} in prompt template, only named fields are supported")
+            if spec and "{" in spec:
+                raise ValueError(f"Unsupported nested field in the format spec of {{{field}}} in prompt template")
+            if conversion and conversion not in CONVERSIONS:
+                raise ValueError(f"Unknown conversion specifier {conversion} of {{{field}}} in prompt template")
+
+    def format(self, **kwargs: Any) -> str:
+        rendered = []
+        for literal, field, spec, conversion in self.parts:
+            rendered.append(literal)
+            if field is not None:
+                value = kwargs[field]
+                if conversion:
+                    value = CONVERSIONS[conversion](value)
+                rendered.append(format(value, spec))
+        return "".join(rendered)
@@ -1,8 +1,25 @@
+import copy
 from typing import Optional, List
 
+from .validation import check_choice, check_setting, check_str_list
+
+# document fields consumed by the pipeline (context of the response generation) and displayed by the clients
+DEFAULT_SELECT_FIELDS = ["path", "title", "section", "content"]
+DEFAULT_MMR_FETCH_FACTOR = 3
+# vector field used to compare the documents in MMR reranking
+MMR_VECTOR_FIELD = "contentVector"
+# queries the vector search and the text search can be run with
+QUERY_MODES = ("off", "user query", "kb query")
+
 
 class SearchSettings:
-    """Class that represents search settings for Azure Cognitive Search request."""
+    """
+    Class that represents search settings for Azure Cognitive Search request.
+
+    With an `mmr_lambda` (None disables it), `mmr_fetch_factor` times more documents are fetched and reranked by
+    maximal marginal relevance to a diverse subset of `top` documents. A lambda of 1 ranks by relevance only, lower
+    values favor diversity.
+    """
 
     def __init__(self,
                  vector_search: str,
@@ -13,7 +30,10 @@ class SearchSettings:
                  vector_fields: Optional[List[str]],
                  k: int,
                  scoring_profile_name: Optional[str],
-                 temperature_kb_query: float
+                 temperature_kb_query: float,
+                 select_fields: Optional[List[str]] = None,
+                 mmr_lambda: Optional[float] = None,
+                 mmr_fetch_factor: int = DEFAULT_MMR_FETCH_FACTOR
                  ) -> None:
         self.vector_search = vector_search
         self.text_search = text_search
@@ -24,9 +44,39 @@ class SearchSettings:
         self.k = k
         self.scoring_profile_name = scoring_profile_name
         self.temperature_kb_query = temperature_kb_query
+        # fields returned by the search, the vector fields are not needed after retrieval
+        self.select_fields = select_fields if select_fields is not None else list(DEFAULT_SELECT_FIELDS)
+        self.mmr_lambda = mmr_lambda
+        self.mmr_fetch_factor = mmr_fetch_factor
 
     def requires_kb_query(self) -> bool:
         return self.vector_search == "kb query" or self.text_search == "kb query"
 
+    def fetch_settings(self) -> "SearchSettings":
+        """Returns the settings of the search request, which over-fetches documents with their vectors for MMR."""
+        if self.mmr_lambda is None:
+            return self
+        settings = copy.copy(self)
+        settings.top = self.top * self.mmr_fetch_factor
+        settings.k = self.k * self.mmr_fetch_factor
+        if MMR_VECTOR_FIELD not in self.select_fields:
+            settings.select_fields = self.select_fields + [MMR_VECTOR_FIELD]
+        return settings
+
     def invalid(self) -> bool:
         return self.text_search == "off" and (self.vector_search == "off" or not self.vector_fields)
+
+    def validate(self) -> None:
+        """Raises a ValueError if a setting has an invalid type or value, e.g. in a settings file or API request."""
+        check_choice("vector_search", self.vector_search, QUERY_MODES)
+        check_choice("text_search", self.text_search, QUERY_MODES)
+        check_setting("semantic_search", self.semantic_search, bool)
+        check_setting("semantic_configuration_name", self.semantic_configuration_name, str, optional=True)
+        check_setting("top", self.top, int, minimum=1)
+        check_str_list("vector_fields", self.vector_fields, optional=True)
+        check_setting("k", self.k, int, minimum=1)
+        check_setting("scoring_profile_name", self.scoring_profile_name, str, optional=True)
+        check_setting("temperature_kb_query", self.temperature_kb_query, (int, float), minimum=0.0, maximum=2.0)
+        check_str_list("select_fields", self.select_fields)
+        check_setting("mmr_lambda", self.mmr_lambda, (int, float), optional=True, minimum=0.0, maximum=1.0)
+        check_setting("mmr_fetch_factor", self.mmr_fetch_factor, int, minimum=1)
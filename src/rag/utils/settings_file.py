@@ -0,0 +1,56 @@
+"""Settings file module that parses the search settings, pipeline settings and prompts of a run or session."""
+
+import json
+from typing import Any, Dict, Tuple
+
+from ..core.prompts import DEFAULT_PROMPTS
+from .pipeline_settings import PipelineSettings
+from .prompt_pair import PromptPair, PromptTemplate
+from .search_settings import SearchSettings
+from .validation import check_setting
+
+
+def load_settings(path: str) -> Tuple[SearchSettings, PipelineSettings, Dict[str, PromptPair]]:
+    """
+    Loads the settings of a run from a json file.
+
+    The file contains the keyword arguments of the search settings and pipeline settings under the keys `search` and
+    `pipeline`. Prompts can be overridden by name under the key `prompts`.
+    """
+    with open(path, encoding="utf-8") as file:
+        return parse_settings(json.load(file))
+
+
+def parse_prompt(prompt_name: str, prompt_pair: Dict[str, Any]) -> PromptPair:
+    """Creates a prompt pair overriding a default prompt, raises a ValueError if it is not a valid template."""
+    if prompt_name not in DEFAULT_PROMPTS:
+        raise ValueError(f"Unknown prompt: {prompt_name}")
+    prompt_pair = PromptPair(**prompt_pair)
+    check_setting(f"{prompt_name} system prompt", prompt_pair.system_prompt, str)
+    # the prompts with a user prompt are rendered with it, the others with the system prompt (which may contain
+    # literal braces otherwise, e.g. json examples)
+    renders_user_prompt = DEFAULT_PROMPTS[prompt_name].user_prompt is not None
+    check_setting(f"{prompt_name} user prompt", prompt_pair.user_prompt, str, optional=not renders_user_prompt)
+    templates = [prompt_pair.user_prompt] if renders_user_prompt else [prompt_pair.system_prompt,
+                                                                       prompt_pair.user_prompt]
+    for template in templates:
+        if template is not None:
+            PromptTemplate(template)  # raises a ValueError on unbalanced braces and unsupported fields
+    return prompt_pair
+
+
+def parse_settings(settings: Dict[str, Any]) -> Tuple[SearchSettings, PipelineSettings, Dict[str, PromptPair]]:
+    """
+    Creates the settings from a dict in the format of the settings file (see `load_settings`).
+
+    Raises a TypeError for unknown or missing arguments, a KeyError for missing sections and a ValueError for invalid
+    values.
+    """
+    prompts = dict(DEFAULT_PROMPTS)
+    for prompt_name, prompt_pair in settings.get("prompts", {}).items():
+        prompts[prompt_name] = parse_prompt(prompt_name, prompt_pair)
+    search_settings = SearchSettings(**settings["search"])
+    search_settings.validate()
+    pipeline_settings = PipelineSettings(**settings["pipeline"])
+    pipeline_settings.validate()
+    return search_settings, pipeline_settings, prompts
@@ -0,0 +1,29 @@
+"""Validation module that checks settings read from files or requests before they are used."""
+
+from numbers import Real
+from typing import Any, Optional, Tuple, Type, Union
+
+
+def check_setting(name: str, value: Any, types: Union[Type, Tuple[Type, ...]], optional: bool = False,
+                  minimum: Optional[float] = None, maximum: Optional[float] = None) -> None:
+    """Raises a ValueError if the value is not of the given types or, for numbers, not within the given bounds."""
+    if value is None and optional:
+        return
+    types = types if isinstance(types, tuple) else (types,)
+    # bool is a subclass of int, but True is not a valid number of documents
+    if not isinstance(value, types) or (isinstance(value, bool) and bool not in types):
+        raise ValueError(f"Invalid value of setting {name}: {value!r}")
+    if isinstance(value, Real) and ((minimum is not None and value < minimum)
+                                    or (maximum is not None and value > maximum)):
+        raise ValueError(f"Setting {name} must be between {minimum} and {maximum}: {value!r}")
+
+
+def check_choice(name: str, value: Any, choices: Tuple[Any, ...]) -> None:
+    if value not in choices:
+        raise ValueError(f"Setting {name} must be one of {list(choices)}: {value!r}")
+
+
+def check_str_list(name: str, value: Any, optional: bool = False) -> None:
+    check_setting(name, value, list, optional=optional)
+    for item in value or []:
+        check_setting(name, item, str)
@@ -0,0 +1,15 @@
+"""ASGI entry point serving the RAG setup over a REST API, e.g. `uvicorn server:app --workers 4`"""
+
+import json
+
+from rag.api.server import create_app
+from rag.utils.config import HTTP_POOL_SIZE, SERVER_SETTINGS_PATH, create_chatbot, create_session_store, load_config
+
+config = load_config()
+if not config[SERVER_SETTINGS_PATH]:
+    raise ValueError(f"Environment variable not defined: {SERVER_SETTINGS_PATH}")
+with open(config[SERVER_SETTINGS_PATH], encoding="utf-8") as file:
+    default_settings = json.load(file)
+
+app = create_app(create_chatbot(config), create_session_store(config), default_settings,
+                 pool_size=int(config[HTTP_POOL_SIZE]))
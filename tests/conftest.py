@@ -0,0 +1,43 @@
+import json
+import sys
+from pathlib import Path
+from typing import Any, Dict
+
+import pytest
+
+# the package is not installed, the tests import it from the source directory like the scripts do
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+# mock services without latency and failures, so that the tests run the whole pipeline quickly
+FAST_MOCK_PROFILE = {"chat_latency": {"median_ms": 0}, "token_latency_ms": 0, "embedding_latency": {"median_ms": 0},
+                     "search_latency": {"median_ms": 0}, "completion_tokens": 10, "seed": 0}
+
+SETTINGS = {
+    "search": {"vector_search": "user query", "text_search": "user query", "semantic_search": False,
+               "semantic_configuration_name": None, "top": 4, "vector_fields": ["contentVector"], "k": 4,
+               "scoring_profile_name": None, "temperature_kb_query": 0.0},
+    "pipeline": {"num_history": 2, "input_summarization": False, "input_summarization_temperature": 0.7,
+                 "rag_temperature": 0.7},
+}
+
+
+@pytest.fixture
+def mock_config(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Dict[str, str]:
+    """Config of the mock Open AI and search backends, the mock APIs installed into openai are removed afterwards."""
+    import openai
+    from rag.utils.config import load_config
+
+    profile_path = tmp_path / "profile.json"
+    profile_path.write_text(json.dumps(FAST_MOCK_PROFILE), encoding="utf-8")
+    monkeypatch.setenv("OPEN_AI_BACKEND", "mock")
+    monkeypatch.setenv("SEARCH_BACKEND", "mock")
+    monkeypatch.setenv("MOCK_PROFILE_PATH", str(profile_path))
+    monkeypatch.setattr(openai, "ChatCompletion", openai.ChatCompletion)
+    monkeypatch.setattr(openai, "Embedding", openai.Embedding)
+    return load_config()
+
+
+@pytest.fixture
+def settings() -> Dict[str, Any]:
+    """Settings in the format of the settings file, see `load_settings`."""
+    return json.loads(json.dumps(SETTINGS))
@@ -0,0 +1,68 @@
+from typing import Any, Dict, List
+
+import openai
+import pytest
+from fastapi.testclient import TestClient
+
+from rag.api.server import create_app
+from rag.api.sessions import InMemorySessionStore
+from rag.utils.config import create_chatbot
+
+
+@pytest.fixture
+def client(mock_config: Dict[str, str], settings: Dict[str, Any]) -> TestClient:
+    with TestClient(create_app(create_chatbot(mock_config), InMemorySessionStore(), settings)) as client:
+        yield client
+
+
+def test_chat_requests_share_pooled_openai_session(client: TestClient, monkeypatch: pytest.MonkeyPatch) -> None:
+    chat_completion = openai.ChatCompletion
+    sessions: List[Any] = []
+
+    async def acreate(*args: Any, **kwargs: Any) -> Any:
+        sessions.append(openai.aiosession.get())
+        return await type(chat_completion).acreate(chat_completion, *args, **kwargs)
+
+    monkeypatch.setattr(chat_completion, "acreate", acreate)
+    session_id = client.post("/sessions").json()["session_id"]
+    for query in ["What is RAG?", "And why?"]:
+        assert client.post(f"/sessions/{session_id}/chat", json={"query": query}).status_code == 200
+
+    assert sessions and sessions[0] is not None
+    assert all(session is sessions[0] for session in sessions)
+    assert sessions[0] is client.app.state.openai_session
+    assert openai.aiosession.get() is None
+
+
+@pytest.mark.parametrize("update", [
+    {"search": {"top": "4"}},
+    {"search": {"top": 0}},
+    {"search": {"vector_search": "always"}},
+    {"search": {"vector_fields": "contentVector"}},
+    {"search": {"unknown": 1}},
+    {"pipeline": {"num_history": True}},
+    {"pipeline": {"rag_temperature": 3.0}},
+    {"pipeline": {"context_dedup_threshold": "high"}},
+    {"prompts": {"Unknown Prompt": {"system_prompt": "Hello"}}},
+    {"prompts": {"RAG": {"system_prompt": "Documents: {context"}}},
+    {"prompts": {"Plan Query": {"system_prompt": "Plan the query."}}},
+])
+def test_invalid_settings_are_rejected(client: TestClient, settings: Dict[str, Any], update: Dict[str, Any]) -> None:
+    session_id = client.post("/sessions").json()["session_id"]
+
+    response = client.put(f"/sessions/{session_id}/settings", json=update)
+
+    assert response.status_code == 422
+    assert client.get(f"/sessions/{session_id}/settings").json() == settings
+    assert client.post(f"/sessions/{session_id}/chat", json={"query": "What is RAG?"}).status_code == 200
+
+
+def test_valid_settings_are_stored(client: TestClient) -> None:
+    session_id = client.post("/sessions").json()["session_id"]
+
+    response = client.put(f"/sessions/{session_id}/settings",
+                          json={"search": {"top": 2, "mmr_lambda": 1}, "pipeline": {"rag_temperature": 0}})
+
+    assert response.status_code == 200
+    assert response.json()["search"]["top"] == 2
+    assert client.post(f"/sessions/{session_id}/chat", json={"query": "What is RAG?"}).status_code == 200
@@ -0,0 +1,127 @@
+import asyncio
+import io
+import json
+from typing import Any, Dict, List
+
+import pytest
+import requests
+from requests.adapters import BaseAdapter, HTTPAdapter
+from urllib3 import HTTPResponse
+
+from rag.core.backends.azure_search import AzureSearchBackend
+from rag.utils.config import create_chatbot
+from rag.utils.search_settings import DEFAULT_SELECT_FIELDS, MMR_VECTOR_FIELD, SearchSettings
+from rag.utils.settings_file import parse_settings
+
+ENDPOINT = "https://example.search.windows.net"
+PAGE_SIZE = 2
+
+
+class PagedSearchAdapter(BaseAdapter):
+    """Answers the search requests with pages of `PAGE_SIZE` documents and records the request bodies."""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.bodies: List[Dict[str, Any]] = []
+
+    def send(self, request: requests.PreparedRequest, **kwargs: Any) -> requests.Response:
+        body = json.loads(request.body)
+        self.bodies.append(body)
+        skip = body.get("skip") or 0
+        page = {"value": [{"@search.score": 1.0 / (1 + i), "path": f"document-{i}", "content": f"text {i}"}
+                          for i in range(skip, skip + PAGE_SIZE)],
+                "@odata.nextLink": f"{ENDPOINT}/indexes('index')/docs/search.post.search?api-version=2023-07-01",
+                "@search.nextPageParameters": {**body, "skip": skip + PAGE_SIZE}}
+        raw = HTTPResponse(body=io.BytesIO(json.dumps(page).encode("utf-8")), status=200, preload_content=False,
+                           headers={"Content-Type": "application/json"})
+        return HTTPAdapter().build_response(request, raw)
+
+    def close(self) -> None:
+        pass
+
+
+@pytest.fixture
+def adapter() -> PagedSearchAdapter:
+    return PagedSearchAdapter()
+
+
+@pytest.fixture
+def backend(adapter: PagedSearchAdapter) -> AzureSearchBackend:
+    session = requests.Session()
+    session.mount("https://", adapter)
+    return AzureSearchBackend(endpoint=ENDPOINT, search_key="key", index_name="index", session=session)
+
+
+@pytest.mark.parametrize("top, requests_sent", [(1, 1), (2, 1), (3, 2), (5, 3)])
+def test_search_stops_reading_the_pager_at_top(backend: AzureSearchBackend, adapter: PagedSearchAdapter,
+                                               settings: Dict[str, Any], top: int, requests_sent: int) -> None:
+    search_settings = SearchSettings(**{**settings["search"], "top": top})
+
+    documents = backend.search("query", None, search_settings)
+
+    assert [d["path"] for d in documents] == [f"document-{i}" for i in range(top)]
+    assert len(adapter.bodies) == requests_sent
+
+
+def test_search_selects_the_fields_of_the_pipeline(backend: AzureSearchBackend, adapter: PagedSearchAdapter,
+                                                   settings: Dict[str, Any]) -> None:
+    backend.search("query", [0.1, 0.2], SearchSettings(**settings["search"]))
+    backend.search("query", None, SearchSettings(**settings["search"], select_fields=["path"]))
+
+    assert adapter.bodies[0]["select"] == ",".join(DEFAULT_SELECT_FIELDS)
+    assert adapter.bodies[0]["top"] == settings["search"]["top"]
+    assert adapter.bodies[0]["vectors"][0]["fields"] == "contentVector"
+    assert adapter.bodies[-1]["select"] == "path"
+
+
+def test_asearch_stops_reading_the_pager_at_top(backend: AzureSearchBackend, settings: Dict[str, Any],
+                                                monkeypatch: pytest.MonkeyPatch) -> None:
+    read: List[int] = []
+    requested: Dict[str, Any] = {}
+
+    class Pager:
+        def __aiter__(self) -> "Pager":
+            return self
+
+        async def __anext__(self) -> Dict[str, Any]:
+            read.append(len(read))
+            return {"path": f"document-{len(read) - 1}", "@search.score": 1.0}
+
+    class SearchClient:
+        async def search(self, **kwargs: Any) -> Pager:
+            requested.update(kwargs)
+            return Pager()
+
+    monkeypatch.setattr(AzureSearchBackend, "_AzureSearchBackend__get_async_client", lambda self: SearchClient())
+    search_settings = SearchSettings(**{**settings["search"], "top": 3})
+
+    documents = asyncio.run(backend.asearch("query", None, search_settings))
+
+    assert [d["path"] for d in documents] == ["document-0", "document-1", "document-2"]
+    assert len(read) == 3
+    assert requested["select"] == DEFAULT_SELECT_FIELDS and requested["top"] == 3
+
+
+def test_mmr_fetches_the_vectors_for_reranking_only(settings: Dict[str, Any]) -> None:
+    search_settings = SearchSettings(**settings["search"], mmr_lambda=0.5)
+
+    fetch_settings = search_settings.fetch_settings()
+
+    assert fetch_settings.select_fields == DEFAULT_SELECT_FIELDS + [MMR_VECTOR_FIELD]
+    assert fetch_settings.top == search_settings.top * search_settings.mmr_fetch_factor
+    assert search_settings.select_fields == DEFAULT_SELECT_FIELDS
+    assert SearchSettings(**settings["search"]).fetch_settings().select_fields == DEFAULT_SELECT_FIELDS
+
+
+def test_chat_documents_contain_only_the_selected_fields(mock_config: Dict[str, str],
+                                                         settings: Dict[str, Any]) -> None:
+    settings["search"]["select_fields"] = ["path", "content"]
+    search_settings, pipeline_settings, prompts = parse_settings(settings)
+    chatbot = create_chatbot(mock_config)
+    chatbot.set_prompts(prompts)
+
+    chat_transaction = chatbot.chat("What is RAG?", search_settings, pipeline_settings)
+
+    documents = chat_transaction.get_documents()
+    assert len(documents) == settings["search"]["top"]
+    assert all(set(d) == {"path", "content", "@search.score", "@search.reranker_score"} for d in documents)
@@ -0,0 +1,82 @@
+import asyncio
+from pathlib import Path
+from typing import Any, Dict
+
+import pyarrow.parquet as pq
+import pytest
+
+from rag.core.chatbot import Chatbot
+from rag.evaluation.batch import BatchRunner, Conversation, load_conversations, write_results
+from rag.utils.config import create_chatbot
+from rag.utils.settings_file import parse_settings
+
+CONVERSATIONS = [Conversation(str(i), [f"What is topic {i}?", "And why?"]) for i in range(4)]
+
+
+@pytest.fixture
+def runner(mock_config: Dict[str, str], settings: Dict[str, Any]) -> BatchRunner:
+    search_settings, pipeline_settings, prompts = parse_settings(settings)
+    return BatchRunner(create_chatbot(mock_config), search_settings, pipeline_settings, prompts, max_concurrency=2)
+
+
+def test_conversations_are_loaded_from_jsonl(tmp_path: Path) -> None:
+    path = tmp_path / "conversations.jsonl"
+    path.write_text('{"id": "a", "turns": ["What is RAG?", "And why?"]}\n\n{"turns": ["Hello"]}\n', encoding="utf-8")
+
+    conversations = load_conversations(str(path))
+
+    assert [c.conversation_id for c in conversations] == ["a", "2"]
+    assert [c.turns for c in conversations] == [["What is RAG?", "And why?"], ["Hello"]]
+
+
+def test_runner_replays_turns_in_order_with_bounded_concurrency(runner: BatchRunner,
+                                                                monkeypatch: pytest.MonkeyPatch) -> None:
+    achat = Chatbot.achat
+    running, histories = [0, 0], {}
+
+    async def counting_achat(chatbot: Chatbot, query: str, *args: Any) -> Any:
+        histories.setdefault(id(chatbot), []).append([turn[0] for turn in chatbot.memory.turns])
+        running[0] += 1
+        running[1] = max(running)
+        await asyncio.sleep(0.01)
+        try:
+            return await achat(chatbot, query, *args)
+        finally:
+            running[0] -= 1
+
+    monkeypatch.setattr(Chatbot, "achat", counting_achat)
+    rows = runner.run(CONVERSATIONS)
+
+    assert [(row["conversation_id"], row["turn"]) for row in rows] == [(c.conversation_id, turn)
+                                                                       for c in CONVERSATIONS for turn in range(2)]
+    assert all(row["response"] and row["document_paths"] and row["error"] is None for row in rows)
+    assert running[1] == 2
+    # every conversation has its own history
+    assert sorted(histories.values()) == sorted([[], [c.turns[0]]] for c in CONVERSATIONS)
+
+
+def test_failed_turn_ends_only_its_conversation(runner: BatchRunner, monkeypatch: pytest.MonkeyPatch) -> None:
+    achat = Chatbot.achat
+
+    async def failing_achat(chatbot: Chatbot, query: str, *args: Any) -> Any:
+        if query == CONVERSATIONS[1].turns[0]:
+            raise RuntimeError("service unavailable")
+        return await achat(chatbot, query, *args)
+
+    monkeypatch.setattr(Chatbot, "achat", failing_achat)
+    rows = runner.run(CONVERSATIONS)
+
+    failed = [row for row in rows if row["conversation_id"] == "1"]
+    assert len(failed) == 1 and "service unavailable" in failed[0]["error"] and failed[0]["response"] is None
+    assert len(rows) == 2 * len(CONVERSATIONS) - 1
+
+
+def test_results_are_written_to_parquet(runner: BatchRunner, tmp_path: Path) -> None:
+    rows = runner.run(CONVERSATIONS[:1])
+    path = tmp_path / "results.parquet"
+
+    write_results(rows, str(path))
+
+    table = pq.read_table(str(path))
+    assert table.num_rows == 2
+    assert table.column("response").to_pylist() == [row["response"] for row in rows]
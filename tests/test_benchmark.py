@@ -0,0 +1,147 @@
+import json
+from pathlib import Path
+from typing import Any, Dict
+
+import openai
+import pytest
+from azure.core.exceptions import ServiceResponseError
+
+from rag.core.chatbot import GENERATE_RESPONSE_NAME
+from rag.evaluation.batch import Conversation
+from rag.evaluation.benchmark import (OVERHEAD_LATENCY_COLUMN, TOTAL_LATENCY_COLUMN, BenchmarkRunner,
+                                      get_service_time, summarize_latencies, write_benchmark)
+from rag.mock.openai_api import MockChatCompletion, MockEmbedding
+from rag.mock.profile import MockProfile
+from rag.mock.search import MockSearchBackend
+from rag.utils.config import MAX_RETRIES, MOCK_PROFILE_PATH, create_chatbot
+from rag.utils.search_settings import SearchSettings
+from rag.utils.settings_file import parse_settings
+
+CONVERSATIONS = [Conversation(str(i), ["What is RAG?", "How are the documents retrieved?"]) for i in range(4)]
+MESSAGES = [{"role": "system", "content": "You are a helpful assistant."}, {"role": "user", "content": "Hi"}]
+
+
+def write_profile(config: Dict[str, str], **profile: Any) -> None:
+    """Replaces the mock profile of the config, read by the factories when the chatbot is created."""
+    Path(config[MOCK_PROFILE_PATH]).write_text(json.dumps(profile), encoding="utf-8")
+
+
+def test_profile_from_dict_fills_in_the_defaults() -> None:
+    profile = MockProfile.from_dict({"chat_latency": {"median_ms": 50, "sigma": 0}, "completion_tokens": 7})
+
+    assert profile.sample(profile.chat_latency) == pytest.approx(0.05)
+    assert profile.sample(profile.embedding_latency) > 0
+    assert profile.completion_tokens == 7 and profile.retry_after_ms == 500
+    assert not any(profile.fails() for _ in range(100))
+
+
+def test_profile_failures_are_reproducible_with_a_seed() -> None:
+    failures = [[profile.fails() for _ in range(50)]
+                for profile in [MockProfile.from_dict({"failure_rate": 0.3, "seed": 1}) for _ in range(2)]]
+
+    assert failures[0] == failures[1]
+    assert 0 < sum(failures[0]) < 50
+
+
+def test_failing_mock_services_raise_the_errors_of_the_real_services(settings: Dict[str, Any]) -> None:
+    profile = MockProfile.from_dict({"failure_rate": 1.0, "retry_after_ms": 250})
+
+    with pytest.raises(openai.error.RateLimitError) as error:
+        MockChatCompletion(profile).create("chat", MESSAGES)
+    assert error.value.headers["retry-after-ms"] == "250"
+    with pytest.raises(openai.error.RateLimitError):
+        MockEmbedding(profile).create(input="text")
+    with pytest.raises(ServiceResponseError):
+        MockSearchBackend(profile).search("query", None, SearchSettings(**settings["search"]))
+
+
+def test_mock_chat_streams_the_response() -> None:
+    chat_completion = MockChatCompletion(MockProfile.from_dict({"chat_latency": {"median_ms": 0}, "token_latency_ms": 0,
+                                                                "completion_tokens": 20}))
+
+    completion = chat_completion.create("chat", MESSAGES)
+    deltas = [chunk["choices"][0]["delta"].get("content", "") for chunk in chat_completion.create("chat", MESSAGES,
+                                                                                                  stream=True)]
+
+    assert completion["model"] == "chat"
+    assert completion["usage"]["total_tokens"] == \
+        completion["usage"]["prompt_tokens"] + completion["usage"]["completion_tokens"]
+    assert "".join(deltas) == completion["choices"][0]["message"]["content"]
+
+
+def test_mock_search_is_deterministic(settings: Dict[str, Any]) -> None:
+    backend = MockSearchBackend(MockProfile.from_dict({"search_latency": {"median_ms": 0}}), num_documents=50)
+    search_settings = SearchSettings(**{**settings["search"], "top": 5, "select_fields": ["path", "content"]})
+
+    documents = backend.search("query", None, search_settings)
+
+    assert documents == backend.search("query", None, search_settings)
+    assert documents != backend.search("other query", None, search_settings)
+    assert [d["@search.score"] for d in documents] == sorted([d["@search.score"] for d in documents], reverse=True)
+    assert len(documents) == 5
+    assert all(set(d) == {"path", "content", "@search.score", "@search.reranker_score"} for d in documents)
+
+
+def test_summarize_latencies() -> None:
+    summary = summarize_latencies([float(i) for i in range(1, 101)])
+
+    assert summary["count"] == 100 and summary["mean"] == pytest.approx(50.5)
+    assert summary["p50"] == pytest.approx(50.5) and summary["p99"] == pytest.approx(99.01)
+    assert summarize_latencies([]) == {"count": 0, "mean": None, "p50": None, "p95": None, "p99": None}
+
+
+def test_benchmark_reports_each_concurrency_level(mock_config: Dict[str, str], settings: Dict[str, Any],
+                                                  tmp_path: Path) -> None:
+    write_profile(mock_config, chat_latency={"median_ms": 20, "sigma": 0}, token_latency_ms=0,
+                  embedding_latency={"median_ms": 0}, search_latency={"median_ms": 5, "sigma": 0},
+                  completion_tokens=10, seed=0)
+    search_settings, pipeline_settings, prompts = parse_settings(settings)
+    runner = BenchmarkRunner(create_chatbot(mock_config), search_settings, pipeline_settings, prompts,
+                             concurrency_levels=[1, 4])
+
+    results = runner.run(CONVERSATIONS)
+
+    assert results["backend"] == "mock"
+    assert results["pipeline_settings"]["num_history"] == settings["pipeline"]["num_history"]
+    assert [level["concurrency"] for level in results["levels"]] == [1, 4]
+    for level in results["levels"]:
+        assert level["turns"] == 4 * 2 and level["errors"] == 0
+        assert level["completion_tokens"] > 0 and level["throughput"] > 0
+        latency = level["latency"]
+        # the response generation takes at least the chat latency of the profile
+        assert latency["latency_rag"]["p50"] >= 0.02
+        assert latency[TOTAL_LATENCY_COLUMN]["count"] == 8
+        assert latency[TOTAL_LATENCY_COLUMN]["p50"] >= latency["latency_rag"]["p50"] + latency["latency_search"]["p50"]
+        assert latency[OVERHEAD_LATENCY_COLUMN]["p50"] < latency[TOTAL_LATENCY_COLUMN]["p50"]
+    # the conversations run concurrently on the higher level
+    assert results["levels"][1]["duration"] < results["levels"][0]["duration"]
+
+    path = tmp_path / "benchmark.json"
+    write_benchmark(results, str(path))
+    assert json.loads(path.read_text(encoding="utf-8")) == json.loads(json.dumps(results))
+
+
+def test_benchmark_counts_failed_conversations_as_errors(mock_config: Dict[str, str],
+                                                         settings: Dict[str, Any]) -> None:
+    write_profile(mock_config, chat_latency={"median_ms": 0}, embedding_latency={"median_ms": 0},
+                  search_latency={"median_ms": 0}, failure_rate=1.0)
+    mock_config[MAX_RETRIES] = "0"
+    search_settings, pipeline_settings, prompts = parse_settings(settings)
+    runner = BenchmarkRunner(create_chatbot(mock_config), search_settings, pipeline_settings, prompts)
+
+    level = runner.run_level(CONVERSATIONS, concurrency=2)
+
+    # the first turn fails and the remaining turns of the conversation are skipped
+    assert level["turns"] == level["errors"] == len(CONVERSATIONS)
+    assert level["latency"] == {}
+
+
+def test_service_time_excludes_the_pipeline_overhead(mock_config: Dict[str, str], settings: Dict[str, Any]) -> None:
+    search_settings, pipeline_settings, prompts = parse_settings(settings)
+    chatbot = create_chatbot(mock_config)
+    chatbot.set_prompts(prompts)
+
+    chat_transaction = chatbot.chat("What is RAG?", search_settings, pipeline_settings)
+
+    assert chat_transaction.get_latency(GENERATE_RESPONSE_NAME) <= get_service_time(chat_transaction) \
+        <= chat_transaction.get_latency()
@@ -0,0 +1,78 @@
+from pathlib import Path
+from typing import List
+
+import numpy as np
+import pytest
+
+from rag.core.backends.bm25 import BM25Index, corpus_hash, tokenize
+from rag.core.backends.local import LocalSearchBackend
+from rag.core.fusion import RRF_K, reciprocal_rank_fusion
+from rag.utils.search_settings import SearchSettings
+
+TEXTS = ["Ottawa is the capital of Canada",
+         "Canberra is the capital of Australia, Canberra was planned as capital",
+         "Sydney is the largest city of Australia",
+         "The capital of New Zealand is Wellington, a city in the south of the north island of New Zealand"]
+
+
+def reference_scores(texts: List[str], query: str, k1: float = 1.2, b: float = 0.75) -> np.ndarray:
+    documents = [tokenize(text) for text in texts]
+    average_length = np.mean([len(document) for document in documents])
+    scores = np.zeros(len(texts))
+    for term in set(tokenize(query)):
+        frequency = sum(term in document for document in documents)
+        idf = np.log(1 + (len(texts) - frequency + 0.5) / (frequency + 0.5))
+        for i, document in enumerate(documents):
+            tf = document.count(term)
+            scores[i] += idf * tf * (k1 + 1) / (tf + k1 * (1 - b + b * len(document) / average_length))
+    return scores
+
+
+@pytest.mark.parametrize("query", ["capital of Australia", "city", "New Zealand capital", "Canberra"])
+def test_ranking_matches_okapi_bm25(query: str) -> None:
+    ids, scores = BM25Index.build(TEXTS).search(query, 10)
+
+    expected = reference_scores(TEXTS, query)
+    assert ids.tolist() == [i for i in np.argsort(-expected, kind="stable") if expected[i] > 0]
+    np.testing.assert_allclose(scores, expected[ids], rtol=1e-5)
+
+
+def test_search_returns_the_top_k_and_nothing_without_matches() -> None:
+    index = BM25Index.build(TEXTS)
+
+    assert index.search("capital", 2)[0].tolist() == index.search("capital", 10)[0][:2].tolist()
+    assert len(index.search("Tokyo", 10)[0]) == 0
+
+
+def test_saved_index_is_loaded_memory_mapped(tmp_path: Path) -> None:
+    index = BM25Index.build(TEXTS)
+    index.save(str(tmp_path), corpus_hash=corpus_hash(TEXTS))
+
+    loaded = BM25Index.load(str(tmp_path))
+
+    assert all(isinstance(getattr(loaded, name), np.memmap) for name in ["offsets", "doc_ids", "term_frequencies"])
+    assert BM25Index.load_metadata(str(tmp_path)) == {"num_docs": len(TEXTS), "corpus_hash": corpus_hash(TEXTS)}
+    for query in ["capital of Australia", "New Zealand city"]:
+        for expected, actual in zip(index.search(query, 3), loaded.search(query, 3)):
+            np.testing.assert_array_equal(actual, expected)
+
+
+def test_incomplete_index_has_no_metadata(tmp_path: Path) -> None:
+    assert BM25Index.load_metadata(str(tmp_path)) is None
+
+
+def test_hybrid_search_fuses_text_and_vector_ranks() -> None:
+    documents = [{"path": f"doc-{i}.md", "title": "", "section": "", "content": text, "contentVector": vector}
+                 for i, (text, vector) in enumerate(zip(TEXTS, [[1.0, 0.0], [0.6, 0.8], [0.0, 1.0], [0.8, 0.6]]))]
+    backend = LocalSearchBackend(documents, ["contentVector"])
+    settings = SearchSettings(vector_search="user query", text_search="user query", semantic_search=False,
+                              semantic_configuration_name=None, top=4, vector_fields=["contentVector"], k=4,
+                              scoring_profile_name=None, temperature_kb_query=0.0)
+
+    results = backend.search("Australia", [0.0, 1.0], settings)
+
+    text_ranking = backend.text_index.search("Australia", 50)[0].tolist()
+    vector_ranking = [i for i, _ in backend.vector_search([0.0, 1.0], ["contentVector"], 4)]
+    expected = reciprocal_rank_fusion([text_ranking, vector_ranking])
+    assert [document["path"] for document in results] == [f"doc-{i}.md" for i, _ in expected]
+    assert results[0]["@search.score"] == pytest.approx(2 / (RRF_K + 1))
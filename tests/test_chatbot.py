@@ -0,0 +1,82 @@
+import asyncio
+from typing import Any, Dict, List, Tuple
+
+import openai
+import pytest
+
+from rag.utils.config import create_chatbot
+from rag.utils.settings_file import parse_settings
+
+QUERY = "What is RAG?"
+
+
+def test_achat_runs_the_same_stages_as_chat(mock_config: Dict[str, str], settings: Dict[str, Any]) -> None:
+    settings["search"]["text_search"] = "kb query"
+    search_settings, pipeline_settings, prompts = parse_settings(settings)
+    sync_chatbot, async_chatbot = create_chatbot(mock_config), create_chatbot(mock_config)
+    for chatbot in [sync_chatbot, async_chatbot]:
+        chatbot.set_prompts(prompts)
+
+    expected = sync_chatbot.chat(QUERY, search_settings, pipeline_settings)
+    chat_transaction = asyncio.run(async_chatbot.achat(QUERY, search_settings, pipeline_settings))
+
+    assert chat_transaction.response == expected.response
+    assert [t.name for t in chat_transaction.completion_transactions] == \
+        [t.name for t in expected.completion_transactions]
+    assert [d["path"] for d in chat_transaction.get_documents()] == [d["path"] for d in expected.get_documents()]
+    assert async_chatbot.memory.turns == [(QUERY, expected.response)]
+
+
+def test_achat_embeds_the_query_while_generating_the_kb_query(mock_config: Dict[str, str], settings: Dict[str, Any],
+                                                              monkeypatch: pytest.MonkeyPatch) -> None:
+    settings["search"]["text_search"] = "kb query"
+    search_settings, pipeline_settings, prompts = parse_settings(settings)
+    chatbot = create_chatbot(mock_config)
+    chatbot.set_prompts(prompts)
+    chat_completion, aembedding = openai.ChatCompletion, chatbot.search.aembedding
+    started: Dict[str, asyncio.Event] = {}
+
+    # each stage only finishes once the other one has started, which times out if they run one after the other
+    async def acreate(*args: Any, **kwargs: Any) -> Any:
+        started["kb_query"].set()
+        await asyncio.wait_for(started["embedding"].wait(), 1)
+        return await type(chat_completion).acreate(chat_completion, *args, **kwargs)
+
+    async def concurrent_aembedding(query: str) -> Tuple[Dict[str, Any], Any]:
+        started["embedding"].set()
+        await asyncio.wait_for(started["kb_query"].wait(), 1)
+        return await aembedding(query)
+
+    monkeypatch.setattr(chat_completion, "acreate", acreate)
+    monkeypatch.setattr(chatbot.search, "aembedding", concurrent_aembedding)
+
+    async def run() -> Any:
+        started.update(kb_query=asyncio.Event(), embedding=asyncio.Event())
+        return await chatbot.achat(QUERY, search_settings, pipeline_settings)
+
+    assert asyncio.run(run()).response
+
+
+def test_failed_stage_cancels_concurrent_stages(mock_config: Dict[str, str], settings: Dict[str, Any],
+                                                monkeypatch: pytest.MonkeyPatch) -> None:
+    settings["search"]["text_search"] = "kb query"
+    settings["pipeline"].update(multi_query=True, num_sub_questions=2)
+    search_settings, pipeline_settings, prompts = parse_settings(settings)
+    chatbot = create_chatbot(mock_config)
+    chatbot.set_prompts(prompts)
+
+    async def aembedding(*args: Any, **kwargs: Any) -> Any:
+        await asyncio.Event().wait()
+
+    async def acreate(*args: Any, **kwargs: Any) -> Any:
+        raise ValueError("invalid request")
+
+    monkeypatch.setattr(chatbot.search, "aembedding", aembedding)
+    monkeypatch.setattr(openai.ChatCompletion, "acreate", acreate)
+
+    async def run() -> List[asyncio.Task]:
+        with pytest.raises(ValueError):
+            await chatbot.achat(QUERY, search_settings, pipeline_settings)
+        return [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+
+    assert asyncio.run(run()) == []
@@ -0,0 +1,91 @@
+import asyncio
+import io
+from typing import Any, Dict, List, Optional
+
+import openai
+import pytest
+import requests
+from requests.adapters import BaseAdapter, HTTPAdapter
+from urllib3 import HTTPResponse
+
+from rag.core.backends.azure_search import AzureSearchBackend
+from rag.core.clients import create_http_session, pooled_openai_session
+from rag.evaluation.batch import BatchRunner, Conversation
+from rag.utils.config import create_chatbot
+from rag.utils.search_settings import SearchSettings
+from rag.utils.settings_file import parse_settings
+
+
+class RecordingAdapter(BaseAdapter):
+    """Answers every request with an empty search result and records the URLs."""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.urls: List[str] = []
+
+    def send(self, request: requests.PreparedRequest, **kwargs: Any) -> requests.Response:
+        self.urls.append(request.url)
+        headers = {"Content-Type": "application/json"}
+        raw = HTTPResponse(body=io.BytesIO(b'{"value": []}'), headers=headers, status=200, preload_content=False)
+        return HTTPAdapter().build_response(request, raw)
+
+    def close(self) -> None:
+        pass
+
+
+def test_http_session_pools_connections() -> None:
+    session = create_http_session(pool_size=8)
+
+    adapter = session.get_adapter("https://example.openai.azure.com")
+    assert adapter is session.get_adapter("http://localhost")
+    assert adapter._pool_maxsize == 8
+    # the scheduler retries the requests, not the connection pool
+    assert adapter.max_retries.total == 0
+
+
+def test_azure_search_sends_requests_with_the_shared_session(settings: Dict[str, Any]) -> None:
+    session = create_http_session()
+    adapter = RecordingAdapter()
+    session.mount("https://", adapter)
+    backends = [AzureSearchBackend(endpoint="https://example.search.windows.net", search_key="key",
+                                   index_name=f"index-{i}", session=session) for i in range(2)]
+    search_settings = SearchSettings(**settings["search"])
+
+    for backend in backends:
+        assert backend.search("query", None, search_settings) == []
+
+    assert [url.split("/")[3] for url in adapter.urls] == ["indexes('index-0')", "indexes('index-1')"]
+
+
+def test_pooled_openai_session_is_used_by_the_tasks_of_the_context() -> None:
+    async def run() -> List[Optional[Any]]:
+        async def get_session() -> Optional[Any]:
+            return openai.aiosession.get()
+
+        async with pooled_openai_session(pool_size=2) as session:
+            sessions = await asyncio.gather(get_session(), asyncio.create_task(get_session()))
+            assert all(s is session for s in sessions)
+            assert session.connector.limit == 2
+        assert session.closed
+        return [openai.aiosession.get()]
+
+    assert asyncio.run(run()) == [None]
+
+
+def test_batch_runner_shares_one_openai_session(mock_config: Dict[str, str], settings: Dict[str, Any],
+                                                monkeypatch: pytest.MonkeyPatch) -> None:
+    search_settings, pipeline_settings, prompts = parse_settings(settings)
+    chatbot = create_chatbot(mock_config)
+    chat_completion = openai.ChatCompletion
+    sessions = []
+
+    async def acreate(*args: Any, **kwargs: Any) -> Any:
+        sessions.append(openai.aiosession.get())
+        return await type(chat_completion).acreate(chat_completion, *args, **kwargs)
+
+    monkeypatch.setattr(chat_completion, "acreate", acreate)
+    conversations = [Conversation(str(i), ["What is RAG?", "And why?"]) for i in range(3)]
+    BatchRunner(chatbot, search_settings, pipeline_settings, prompts, max_concurrency=3).run(conversations)
+
+    assert len(sessions) >= len(conversations) * 2
+    assert sessions[0] is not None and all(session is sessions[0] for session in sessions)
@@ -0,0 +1,102 @@
+import json
+from typing import Any, Dict, List
+
+import numpy as np
+import openai
+import pytest
+
+from rag.core.context import format_context, minhash_signature, pack_context
+from rag.core.tokens import count_tokens
+from rag.utils.config import create_chatbot
+from rag.utils.settings_file import parse_settings
+
+TEXT = " ".join(f"word{i}" for i in range(200))
+
+
+def document(path: str, content: str, score: float, reranker_score: Any = None) -> Dict[str, Any]:
+    return {"path": path, "content": content, "@search.score": score, "@search.reranker_score": reranker_score}
+
+
+def context_tokens(documents: List[Dict[str, Any]]) -> int:
+    return sum(count_tokens(json.dumps({"source": d["path"], "text": d["content"]})) for d in documents)
+
+
+def test_minhash_signature_estimates_the_jaccard_similarity() -> None:
+    other_text = " ".join(f"other{i}" for i in range(200))
+
+    assert np.mean(minhash_signature(TEXT) == minhash_signature(TEXT.upper())) == 1.0
+    assert np.mean(minhash_signature(TEXT) == minhash_signature(TEXT + " word200")) > 0.9
+    assert np.mean(minhash_signature(TEXT) == minhash_signature(other_text)) < 0.1
+
+
+def test_drops_near_duplicates_of_higher_scored_documents() -> None:
+    documents = [document("copy", TEXT + " appendix", 0.5), document("original", TEXT, 0.9),
+                 document("other", "a different document about something else entirely", 0.1)]
+
+    context = pack_context(documents, dedup_threshold=0.8)
+
+    assert [d["path"] for d in context.documents] == ["original", "other"]
+    assert context.duplicates == 1 and context.over_budget == 0
+    assert [d["path"] for d in pack_context(documents, dedup_threshold=None).documents] == \
+        ["original", "copy", "other"]
+
+
+@pytest.mark.parametrize("max_tokens", [50, 120, 400, 1000])
+def test_stays_within_the_token_budget(max_tokens: int) -> None:
+    documents = [document(f"document-{i}", " ".join(f"w{i}x{j}" for j in range(10 * (5 - i))), 1.0 / (1 + i))
+                 for i in range(5)]
+
+    context = pack_context(documents, max_tokens=max_tokens, dedup_threshold=None)
+
+    assert context.tokens == context_tokens(context.documents) <= max_tokens
+    assert context.retrieved_tokens == context_tokens(documents)
+    assert context.get_saved_tokens() == context.retrieved_tokens - context.tokens
+    assert len(context.documents) + context.over_budget == len(documents)
+    # a document is only skipped if it does not fit into the remaining budget
+    for skipped in [d for d in documents if d not in context.documents]:
+        assert context.tokens + context_tokens([skipped]) > max_tokens
+
+
+def test_skips_long_documents_for_shorter_lower_scored_ones() -> None:
+    documents = [document("short", "short text", 0.9), document("long", TEXT, 0.8),
+                 document("short-2", "another short text", 0.1)]
+
+    context = pack_context(documents, max_tokens=context_tokens([documents[0], documents[2]]) + 5)
+
+    assert [d["path"] for d in context.documents] == ["short", "short-2"]
+    assert context.over_budget == 1
+
+
+def test_orders_by_reranker_score_if_available() -> None:
+    documents = [document("a", "first text", 0.9, reranker_score=1.0),
+                 document("b", "second text", 0.1, reranker_score=3.0)]
+
+    context = pack_context(documents, max_tokens=context_tokens(documents[1:]))
+
+    assert [d["path"] for d in context.documents] == ["b"]
+
+
+def test_response_generation_uses_the_packed_context(mock_config: Dict[str, str], settings: Dict[str, Any],
+                                                     monkeypatch: pytest.MonkeyPatch) -> None:
+    max_tokens = 600
+    settings["search"]["top"] = 8
+    settings["pipeline"]["context_max_tokens"] = max_tokens
+    search_settings, pipeline_settings, prompts = parse_settings(settings)
+    chatbot = create_chatbot(mock_config)
+    chatbot.set_prompts(prompts)
+    chat_completion = openai.ChatCompletion
+    requests: List[List[Dict[str, str]]] = []
+
+    def create(*args: Any, messages: List[Dict[str, str]], **kwargs: Any) -> Any:
+        requests.append([dict(message) for message in messages])
+        return type(chat_completion).create(chat_completion, *args, messages=messages, **kwargs)
+
+    monkeypatch.setattr(chat_completion, "create", create)
+    chat_transaction = chatbot.chat("What is RAG?", search_settings, pipeline_settings)
+
+    context = chat_transaction.context
+    assert context.tokens <= max_tokens and context.over_budget > 0
+    assert len(context.documents) + context.over_budget == len(chat_transaction.get_documents())
+    assert chat_transaction.get_saved_context_tokens() == context.get_saved_tokens() > 0
+    rag_prompt = " ".join(message["content"] for message in requests[-1])
+    assert format_context(context.documents) in rag_prompt
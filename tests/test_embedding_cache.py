@@ -0,0 +1,46 @@
+import sqlite3
+from pathlib import Path
+
+from rag.core.embedding_cache import EmbeddingCache
+
+DEPLOYMENT = "embedding"
+
+
+def disk_rows(path: Path) -> int:
+    with sqlite3.connect(path) as db:
+        return db.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+
+def test_put_many_writes_all_entries_to_disk(tmp_path: Path) -> None:
+    path = tmp_path / "embeddings.db"
+    cache = EmbeddingCache(max_entries=1, path=str(path))
+    texts = [f"text {i}" for i in range(10)]
+
+    cache.put_many(DEPLOYMENT, texts, [[float(i), 1.0] for i in range(10)])
+
+    assert disk_rows(path) == 10
+    reopened = EmbeddingCache(path=str(path))
+    assert [reopened.get(DEPLOYMENT, text) for text in texts] == [[float(i), 1.0] for i in range(10)]
+
+
+def test_disk_tier_keeps_the_newest_entries(tmp_path: Path) -> None:
+    path = tmp_path / "embeddings.db"
+    cache = EmbeddingCache(max_entries=1, path=str(path), max_disk_entries=5)
+
+    for i in range(8):
+        cache.put(DEPLOYMENT, f"text {i}", [float(i)])
+    cache.put(DEPLOYMENT, "text 7", [7.0])  # replacing an entry does not add a row
+    cache.put_many(DEPLOYMENT, ["text 8", "text 9"], [[8.0], [9.0]])
+
+    assert disk_rows(path) == 5
+    reopened = EmbeddingCache(path=str(path), max_disk_entries=5)
+    assert [reopened.get(DEPLOYMENT, f"text {i}") is not None for i in range(10)] == [False] * 5 + [True] * 5
+
+
+def test_row_count_is_restored_when_reopened(tmp_path: Path) -> None:
+    path = tmp_path / "embeddings.db"
+    EmbeddingCache(path=str(path)).put_many(DEPLOYMENT, [f"text {i}" for i in range(4)], [[1.0]] * 4)
+
+    EmbeddingCache(path=str(path), max_disk_entries=4).put(DEPLOYMENT, "new text", [1.0])
+
+    assert disk_rows(path) == 4
@@ -0,0 +1,94 @@
+import threading
+from typing import Any, Dict, List
+
+import numpy as np
+import pytest
+
+from rag.core.embedding_cache import EmbeddingCache
+from rag.core.llm import LLM
+from rag.core.tokens import count_tokens
+from rag.utils.config import create_llm
+
+TEXTS = [f"document number {i}" for i in range(10)]
+
+
+def record_batches(llm: LLM, monkeypatch: pytest.MonkeyPatch) -> List[List[str]]:
+    batches: List[List[str]] = []
+    lock = threading.Lock()
+    embedding_batch = llm.embedding_batch
+
+    def recording_batch(texts: List[str]) -> Dict[str, Any]:
+        with lock:
+            batches.append(texts)
+        return embedding_batch(texts)
+
+    monkeypatch.setattr(llm, "embedding_batch", recording_batch)
+    return batches
+
+
+def test_embed_many_returns_the_embeddings_in_input_order(mock_config: Dict[str, str],
+                                                          monkeypatch: pytest.MonkeyPatch) -> None:
+    llm = create_llm(mock_config)
+    batches = record_batches(llm, monkeypatch)
+
+    matrix = llm.embed_many(TEXTS, max_batch_size=3, max_concurrency=4)
+
+    assert matrix.dtype == np.float32
+    assert matrix.shape == (len(TEXTS), len(llm.embedding(TEXTS[0])["data"][0]["embedding"]))
+    for text, row in zip(TEXTS, matrix):
+        np.testing.assert_allclose(row, llm.embedding(text)["data"][0]["embedding"], rtol=1e-6)
+    assert sorted(len(batch) for batch in batches) == [1, 3, 3, 3]
+    assert sorted(text for batch in batches for text in batch) == sorted(TEXTS)
+
+
+def test_embed_many_bounds_the_batch_tokens(mock_config: Dict[str, str], monkeypatch: pytest.MonkeyPatch) -> None:
+    llm = create_llm(mock_config)
+    batches = record_batches(llm, monkeypatch)
+    long_text = "word " * 100
+
+    llm.embed_many([long_text, long_text, "short"], max_batch_size=16, max_batch_tokens=150)
+
+    assert sorted(len(batch) for batch in batches) == [1, 2]
+    # a text exceeding the limit on its own is still sent, in a batch by itself
+    llm.embed_many([long_text], max_batch_tokens=10)
+    assert batches[-1] == [long_text]
+
+
+def test_embed_many_returns_the_tokens(mock_config: Dict[str, str]) -> None:
+    llm = create_llm(mock_config)
+
+    matrix, tokens = llm.embed_many(TEXTS, max_batch_size=4, return_tokens=True)
+
+    assert matrix.shape[0] == len(TEXTS)
+    assert tokens == sum(count_tokens(text) for text in TEXTS)
+
+
+def test_embed_many_without_texts(mock_config: Dict[str, str]) -> None:
+    llm = create_llm(mock_config)
+
+    assert llm.embed_many([]).shape == (0, 0)
+    matrix, tokens = llm.embed_many([], return_tokens=True)
+    assert matrix.shape == (0, 0) and tokens == 0
+
+
+def test_embedding_batch_only_sends_uncached_texts(mock_config: Dict[str, str],
+                                                   monkeypatch: pytest.MonkeyPatch) -> None:
+    import openai
+
+    llm = create_llm(mock_config)
+    llm.embedding_cache = EmbeddingCache()
+    expected = llm.embedding_batch(TEXTS[:2])
+    inputs: List[List[str]] = []
+    create = openai.Embedding.create
+
+    def recording_create(input: List[str], **kwargs: Any) -> Dict[str, Any]:
+        inputs.append(input)
+        return create(input=input, **kwargs)
+
+    monkeypatch.setattr(openai.Embedding, "create", recording_create)
+    embedding_completion = llm.embedding_batch([TEXTS[1], TEXTS[2], TEXTS[0]])
+
+    assert inputs == [[TEXTS[2]]]
+    assert [data["index"] for data in embedding_completion["data"]] == [0, 1, 2]
+    assert embedding_completion["data"][0]["embedding"] == expected["data"][1]["embedding"]
+    assert embedding_completion["data"][2]["embedding"] == expected["data"][0]["embedding"]
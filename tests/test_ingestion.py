@@ -0,0 +1,89 @@
+import json
+from pathlib import Path
+from typing import Any, Dict, List
+
+import pytest
+
+from rag.core.backends.local import LocalSearchBackend
+from rag.core.llm import LLM
+from rag.ingestion.pipeline import Checkpoint, IngestionPipeline, IngestionStats, VECTOR_FIELDS as INDEX_VECTOR_FIELDS
+from rag.ingestion.writers import JsonlIndexWriter
+from rag.utils.config import create_llm
+
+from test_local_backend import VECTOR_FIELDS, make_documents, write_jsonl
+
+SOURCES = {"canada.md": "# Canada\n\nOttawa is the capital of Canada.",
+           "australia.md": "# Australia\n\nCanberra is the capital of Australia.",
+           "new-zealand.md": "# New Zealand\n\nWellington is the capital of New Zealand."}
+
+
+def test_jsonl_writer_deletes_the_text_index(tmp_path: Path) -> None:
+    documents_path, index_path = tmp_path / "documents.jsonl", tmp_path / "bm25"
+    write_jsonl(documents_path, make_documents(["ottawa"]))
+    LocalSearchBackend.from_jsonl(str(documents_path), VECTOR_FIELDS, text_index_path=str(index_path))
+
+    writer = JsonlIndexWriter(str(documents_path), text_index_path=str(index_path))
+    writer.upload(make_documents(["ottawa", "canberra"]))
+    writer.flush()
+
+    assert not index_path.exists()
+
+
+def write_sources(directory: Path, contents: Dict[str, str]) -> None:
+    directory.mkdir(exist_ok=True)
+    for name, content in contents.items():
+        (directory / name).write_text(content, encoding="utf-8")
+
+
+def read_index(path: Path) -> List[Dict[str, Any]]:
+    return [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+
+
+def ingest(llm: LLM, tmp_path: Path) -> IngestionStats:
+    pipeline = IngestionPipeline(llm, JsonlIndexWriter(str(tmp_path / "documents.jsonl")),
+                                 Checkpoint(str(tmp_path / "checkpoint.json")), batch_size=1, max_concurrency=1,
+                                 checkpoint_interval=1)
+    return pipeline.run(str(tmp_path / "sources"))
+
+
+def test_interrupted_ingestion_resumes_from_the_checkpoint(mock_config: Dict[str, str], tmp_path: Path,
+                                                           monkeypatch: pytest.MonkeyPatch) -> None:
+    write_sources(tmp_path / "sources", SOURCES)
+    llm = create_llm(mock_config)
+    embed_many = llm.embed_many
+    calls = []
+
+    def failing_embed_many(*args: Any, **kwargs: Any) -> Any:
+        calls.append(args)
+        if len(calls) == 3:
+            raise RuntimeError("service unavailable")
+        return embed_many(*args, **kwargs)
+
+    monkeypatch.setattr(llm, "embed_many", failing_embed_many)
+    with pytest.raises(RuntimeError):
+        ingest(llm, tmp_path)
+    assert len(read_index(tmp_path / "documents.jsonl")) == 2
+
+    monkeypatch.setattr(llm, "embed_many", embed_many)
+    stats = ingest(llm, tmp_path)
+
+    assert (stats.documents, stats.unchanged_chunks, stats.embedded_chunks) == (3, 2, 1)
+    documents = read_index(tmp_path / "documents.jsonl")
+    assert sorted(document["path"] for document in documents) == sorted(SOURCES)
+    assert all(document[field] for document in documents for field in INDEX_VECTOR_FIELDS.values())
+
+
+def test_changed_and_removed_sources_are_updated(mock_config: Dict[str, str], tmp_path: Path) -> None:
+    write_sources(tmp_path / "sources", SOURCES)
+    llm = create_llm(mock_config)
+    ingest(llm, tmp_path)
+
+    write_sources(tmp_path / "sources", {"canada.md": "# Canada\n\nOttawa is the capital of Canada since 1857."})
+    (tmp_path / "sources" / "new-zealand.md").unlink()
+    stats = ingest(llm, tmp_path)
+
+    assert (stats.unchanged_chunks, stats.embedded_chunks, stats.deleted_chunks) == (1, 1, 1)
+    documents = {document["path"]: document for document in read_index(tmp_path / "documents.jsonl")}
+    assert sorted(documents) == ["australia.md", "canada.md"]
+    assert "since 1857" in documents["canada.md"]["content"]
+    assert set(json.loads((tmp_path / "checkpoint.json").read_text(encoding="utf-8"))) == set(documents)
@@ -0,0 +1,144 @@
+import json
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pytest
+
+from rag.core.backends.local import FlatIndex, IVFIndex, LocalSearchBackend
+from rag.utils.search_settings import SearchSettings
+
+VECTOR_FIELDS = ["contentVector"]
+
+
+def make_documents(contents: List[str]) -> List[Dict[str, Any]]:
+    return [{"id": str(i), "path": f"doc-{i}.md", "title": f"Title {i}", "section": "", "content": content,
+             "contentVector": [1.0, float(i)]} for i, content in enumerate(contents)]
+
+
+def write_jsonl(path: Path, documents: List[Dict[str, Any]]) -> None:
+    path.write_text("".join(json.dumps(document) + "\n" for document in documents), encoding="utf-8")
+
+
+def text_search_settings(top: int = 5) -> SearchSettings:
+    return SearchSettings(vector_search="off", text_search="user query", semantic_search=False,
+                          semantic_configuration_name=None, top=top, vector_fields=None, k=top,
+                          scoring_profile_name=None, temperature_kb_query=0.0)
+
+
+def vector_search_settings(top: int = 5, select_fields: Optional[List[str]] = None) -> SearchSettings:
+    return SearchSettings(vector_search="user query", text_search="off", semantic_search=False,
+                          semantic_configuration_name=None, top=top, vector_fields=VECTOR_FIELDS, k=top,
+                          scoring_profile_name=None, temperature_kb_query=0.0, select_fields=select_fields)
+
+
+def random_vectors(n: int, dimensions: int = 16, seed: int = 0) -> np.ndarray:
+    return np.random.default_rng(seed).standard_normal((n, dimensions)).astype(np.float32)
+
+
+def exact_neighbours(vectors: np.ndarray, query: np.ndarray, k: int) -> List[int]:
+    similarities = vectors @ query / (np.linalg.norm(vectors, axis=1) * np.linalg.norm(query))
+    return np.argsort(-similarities)[:k].tolist()
+
+
+def search_paths(backend: LocalSearchBackend, query: str) -> List[str]:
+    return [document["path"] for document in backend.search(query, None, text_search_settings())]
+
+
+def test_saved_text_index_is_rebuilt_for_a_smaller_corpus(tmp_path: Path) -> None:
+    documents_path, index_path = tmp_path / "documents.jsonl", tmp_path / "bm25"
+    write_jsonl(documents_path, make_documents([f"word{i} capital" for i in range(5)]))
+    LocalSearchBackend.from_jsonl(str(documents_path), VECTOR_FIELDS, text_index_path=str(index_path))
+
+    write_jsonl(documents_path, make_documents(["word0 capital", "word1 city"]))
+    backend = LocalSearchBackend.from_jsonl(str(documents_path), VECTOR_FIELDS, text_index_path=str(index_path))
+
+    assert search_paths(backend, "word4 capital") == ["doc-0.md"]
+
+
+def test_saved_text_index_is_rebuilt_for_changed_documents(tmp_path: Path) -> None:
+    documents_path, index_path = tmp_path / "documents.jsonl", tmp_path / "bm25"
+    write_jsonl(documents_path, make_documents(["ottawa", "canberra"]))
+    LocalSearchBackend.from_jsonl(str(documents_path), VECTOR_FIELDS, text_index_path=str(index_path))
+
+    write_jsonl(documents_path, make_documents(["canberra", "ottawa", "wellington"]))
+    backend = LocalSearchBackend.from_jsonl(str(documents_path), VECTOR_FIELDS, text_index_path=str(index_path))
+
+    assert search_paths(backend, "ottawa") == ["doc-1.md"]
+    assert search_paths(backend, "wellington") == ["doc-2.md"]
+
+
+def test_unchanged_text_index_is_loaded(tmp_path: Path) -> None:
+    documents_path, index_path = tmp_path / "documents.jsonl", tmp_path / "bm25"
+    write_jsonl(documents_path, make_documents(["ottawa", "canberra"]))
+    LocalSearchBackend.from_jsonl(str(documents_path), VECTOR_FIELDS, text_index_path=str(index_path))
+    modified = (index_path / "doc_ids.npy").stat().st_mtime_ns
+
+    backend = LocalSearchBackend.from_jsonl(str(documents_path), VECTOR_FIELDS, text_index_path=str(index_path))
+
+    assert (index_path / "doc_ids.npy").stat().st_mtime_ns == modified
+    assert search_paths(backend, "canberra") == ["doc-1.md"]
+
+
+def test_missing_vector_field_is_named() -> None:
+    with pytest.raises(ValueError, match="titleVector"):
+        LocalSearchBackend(make_documents(["ottawa", "canberra"]), ["contentVector", "titleVector"])
+
+
+def test_vectors_of_different_dimensions_are_rejected() -> None:
+    documents = make_documents(["ottawa", "canberra"])
+    documents[1]["contentVector"] = [1.0, 0.0, 0.0]
+
+    with pytest.raises(ValueError, match="contentVector"):
+        LocalSearchBackend(documents, VECTOR_FIELDS)
+
+
+def test_flat_index_returns_exact_neighbours_with_cosine_similarities() -> None:
+    vectors, query = random_vectors(200), random_vectors(1, seed=1)[0]
+    unit_query = query / np.linalg.norm(query)
+
+    ids, similarities = FlatIndex(vectors).search(unit_query, 10)
+
+    assert ids.tolist() == exact_neighbours(vectors, query, 10)
+    np.testing.assert_allclose(similarities, vectors[ids] @ unit_query / np.linalg.norm(vectors[ids], axis=1),
+                               rtol=1e-5)
+
+
+def test_ivf_index_probing_all_lists_is_exact() -> None:
+    vectors, query = random_vectors(500), random_vectors(1, seed=1)[0]
+    index = IVFIndex(vectors, n_lists=8, n_probe=8)
+
+    ids, _ = index.search(query / np.linalg.norm(query), 10)
+
+    assert ids.tolist() == exact_neighbours(vectors, query, 10)
+    np.testing.assert_allclose(index.get_vector(int(ids[0])), vectors[ids[0]] / np.linalg.norm(vectors[ids[0]]),
+                               rtol=1e-5)
+
+
+def test_large_corpora_use_the_approximate_index() -> None:
+    documents = make_documents([f"document {i}" for i in range(20)])
+
+    assert isinstance(LocalSearchBackend(documents, VECTOR_FIELDS).indexes["contentVector"], FlatIndex)
+    assert isinstance(LocalSearchBackend(documents, VECTOR_FIELDS, ivf_threshold=10).indexes["contentVector"],
+                      IVFIndex)
+
+
+def test_vector_search_scores_like_azure_and_returns_selected_fields() -> None:
+    backend = LocalSearchBackend(make_documents(["ottawa", "canberra", "wellington"]), VECTOR_FIELDS)
+
+    documents = backend.search(None, [1.0, 2.0], vector_search_settings())
+    assert [document["path"] for document in documents] == ["doc-2.md", "doc-1.md", "doc-0.md"]
+    assert documents[0]["@search.score"] == pytest.approx(1.0)
+    assert documents[2]["@search.score"] == pytest.approx(1 / (2 - 1 / np.sqrt(5)))
+    assert "contentVector" not in documents[0]
+
+    [document] = backend.search(None, [1.0, 2.0], vector_search_settings(1, ["path", "contentVector"]))
+    assert set(document) == {"path", "contentVector", "@search.score", "@search.reranker_score"}
+    np.testing.assert_allclose(document["contentVector"], np.array([1.0, 2.0]) / np.sqrt(5), rtol=1e-6)
+
+
+def test_unknown_vector_field_is_rejected() -> None:
+    backend = LocalSearchBackend(make_documents(["ottawa"]), VECTOR_FIELDS)
+
+    with pytest.raises(ValueError, match="titleVector"):
+        backend.vector_search([1.0, 0.0], ["titleVector"], 1)
@@ -0,0 +1,128 @@
+import asyncio
+from typing import Any, Dict, List
+
+import pytest
+from fastapi.testclient import TestClient
+
+import rag.mock.openai_api
+from rag.api.server import create_app
+from rag.api.sessions import InMemorySessionStore
+from rag.core.chatbot import Chatbot, GENERATE_RESPONSE_NAME, SUMMARIZE_HISTORY_NAME
+from rag.core.memory import ConversationMemory
+from rag.core.models.chat_transaction import ChatTransaction
+from rag.core.prompts import SUMMARIZE_HISTORY_SYSTEM_PROMPT
+from rag.utils.config import create_chatbot
+from rag.utils.settings_file import parse_settings
+
+QUERIES = ["What is RAG?", "How are the documents retrieved?", "How is it evaluated?"]
+
+
+@pytest.fixture
+def echo_summaries(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Lets the mock answer summarization requests with the current summary and the new turns."""
+    mock_response = rag.mock.openai_api.mock_response
+
+    def echo_response(messages: List[Dict[str, str]], completion_tokens: int) -> str:
+        if messages[0]["content"] == SUMMARIZE_HISTORY_SYSTEM_PROMPT:
+            return messages[-1]["content"]
+        return mock_response(messages, completion_tokens)
+
+    monkeypatch.setattr(rag.mock.openai_api, "mock_response", echo_response)
+
+
+def run_chat(chatbot: Chatbot, mode: str, query: str, *settings: Any) -> ChatTransaction:
+    if mode == "achat":
+        return asyncio.run(chatbot.achat(query, *settings))
+    if mode == "stream":
+        stream = chatbot.chat_stream(query, *settings)
+        while True:
+            try:
+                next(stream)
+            except StopIteration as stop:
+                return stop.value
+    return chatbot.chat(query, *settings)
+
+
+@pytest.mark.parametrize("mode", ["chat", "achat", "stream"])
+def test_evicted_turns_are_summarized_after_the_response(mock_config: Dict[str, str], settings: Dict[str, Any],
+                                                         echo_summaries: None, mode: str) -> None:
+    settings["pipeline"].update(num_history=1, history_summarization=True)
+    search_settings, pipeline_settings, prompts = parse_settings(settings)
+    chatbot = create_chatbot(mock_config)
+    chatbot.set_prompts(prompts)
+
+    chat_transactions = [run_chat(chatbot, mode, query, search_settings, pipeline_settings) for query in QUERIES]
+
+    assert SUMMARIZE_HISTORY_NAME not in [t.name for t in chat_transactions[0].completion_transactions]
+    for chat_transaction in chat_transactions[1:]:
+        names = [completion_transaction.name for completion_transaction in chat_transaction.completion_transactions]
+        assert names[-2:] == [GENERATE_RESPONSE_NAME, SUMMARIZE_HISTORY_NAME]
+    assert chatbot.memory.turns == [(QUERIES[-1], chat_transactions[-1].response)]
+    for query, chat_transaction in zip(QUERIES[:-1], chat_transactions):
+        assert f"user: {query}\nassistant: {chat_transaction.response}" in chatbot.memory.summary
+
+
+def test_memory_round_trip() -> None:
+    memory = ConversationMemory()
+    for query in QUERIES:
+        memory.append(query, f"Answer to {query}")
+
+    assert memory.trim(1) == [(query, f"Answer to {query}") for query in QUERIES[:-1]]
+    memory.set_summary("The user asked about RAG.")
+
+    restored = ConversationMemory.from_dict(memory.to_dict())
+    assert restored.turns == memory.turns == [(QUERIES[-1], f"Answer to {QUERIES[-1]}")]
+    assert restored.summary == memory.summary
+    assert restored.get_history_str() == memory.get_history_str()
+    assert QUERIES[0] not in restored.get_history_str()
+    assert "The user asked about RAG." in restored.get_history_str()
+
+
+def test_trim_keeps_the_last_turns() -> None:
+    memory = ConversationMemory()
+    for query in QUERIES:
+        memory.append(query, "answer")
+
+    assert memory.trim(len(QUERIES)) == []
+    history_str = memory.get_history_str()
+    assert [query for query, _ in memory.trim(2)] == QUERIES[:1]
+    assert memory.get_history_str() != history_str and QUERIES[0] not in memory.get_history_str()
+    assert [query for query, _ in memory.trim(0)] == QUERIES[1:]
+    assert memory.turns == []
+
+    memory.append("new", "turn")
+    memory.set_summary("summary")
+    memory.clear()
+    assert memory.to_dict() == {"turns": [], "summary": ""}
+    assert memory.get_history_str() == ConversationMemory().get_history_str()
+
+
+def test_evicted_turns_are_dropped_without_summarization(mock_config: Dict[str, str],
+                                                         settings: Dict[str, Any]) -> None:
+    settings["pipeline"]["num_history"] = 1
+    search_settings, pipeline_settings, prompts = parse_settings(settings)
+    chatbot = create_chatbot(mock_config)
+    chatbot.set_prompts(prompts)
+
+    chat_transactions = [chatbot.chat(query, search_settings, pipeline_settings) for query in QUERIES]
+
+    for chat_transaction in chat_transactions:
+        assert SUMMARIZE_HISTORY_NAME not in [t.name for t in chat_transaction.completion_transactions]
+    assert chatbot.memory.turns == [(QUERIES[-1], chat_transactions[-1].response)]
+    assert chatbot.memory.summary == ""
+
+
+def test_api_sessions_keep_the_summary_between_requests(mock_config: Dict[str, str], settings: Dict[str, Any],
+                                                        echo_summaries: None) -> None:
+    settings["pipeline"].update(num_history=1, history_summarization=True)
+    session_store = InMemorySessionStore()
+
+    with TestClient(create_app(create_chatbot(mock_config), session_store, settings)) as client:
+        session_id = client.post("/sessions").json()["session_id"]
+        responses = [client.post(f"/sessions/{session_id}/chat", json={"query": query}).json()["response"]
+                     for query in QUERIES]
+
+    memory = ConversationMemory.from_dict(session_store.get(session_id)["memory"])
+    assert memory.turns == [(QUERIES[-1], responses[-1])]
+    for query, response in zip(QUERIES[:-1], responses):
+        assert f"user: {query}\nassistant: {response}" in memory.summary
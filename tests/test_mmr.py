@@ -0,0 +1,130 @@
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pytest
+
+from rag.core.backends.local import LocalSearchBackend
+from rag.core.mmr import maximal_marginal_relevance, mmr_rerank
+from rag.core.search import MMR_SPAN_NAME, SearchService
+from rag.utils.config import create_llm
+from rag.utils.search_settings import MMR_VECTOR_FIELD, SearchSettings
+
+DIMENSIONS = 16
+
+
+def reference_mmr(relevance: np.ndarray, similarities: np.ndarray, n: int, lambda_mult: float) -> List[int]:
+    """MMR as defined by Carbonell and Goldstein, recomputing the redundancy of every candidate in every step."""
+    selected: List[int] = []
+    while len(selected) < min(n, len(relevance)):
+        candidates = [i for i in range(len(relevance)) if i not in selected]
+        redundancies = [max((similarities[i][j] for j in selected), default=0.0) for i in candidates]
+        scores = [lambda_mult * relevance[i] - (1 - lambda_mult) * redundancy
+                  for i, redundancy in zip(candidates, redundancies)]
+        selected.append(candidates[int(np.argmax(scores))])
+    return selected
+
+
+def clustered_documents(query: np.ndarray) -> List[Dict[str, Any]]:
+    """
+    Three near duplicates of the query followed by three less relevant documents in different directions.
+
+    The search scores decrease in the order of the documents.
+    """
+    query = query / np.linalg.norm(query)
+    # orthonormal directions that are orthogonal to the query as well
+    q, _ = np.linalg.qr(np.column_stack([query, np.random.default_rng(1).standard_normal((len(query), 4))]))
+    directions = q[:, 1:].T
+    vectors = [query + 0.01 * i * directions[0] for i in range(3)]
+    vectors += [0.7 * query + directions[i] for i in range(1, 4)]
+    return [{"path": f"document-{i}.md", "content": f"document {i}", "@search.score": 1.0 - i / 10,
+             MMR_VECTOR_FIELD: vector.tolist()} for i, vector in enumerate(vectors)]
+
+
+def paths(documents: List[Dict[str, Any]]) -> List[str]:
+    return [document["path"].split(".")[0] for document in documents]
+
+
+@pytest.mark.parametrize("lambda_mult", [0.0, 0.3, 0.5, 0.7, 1.0])
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_selection_order_matches_the_reference(lambda_mult: float, seed: int) -> None:
+    rng = np.random.default_rng(seed)
+    vectors = rng.standard_normal((20, DIMENSIONS))
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    relevance = vectors @ (rng.standard_normal(DIMENSIONS) / np.sqrt(DIMENSIONS))
+    similarities = vectors @ vectors.T
+
+    assert maximal_marginal_relevance(relevance, similarities, 8, lambda_mult) == \
+        reference_mmr(relevance, similarities, 8, lambda_mult)
+
+
+def test_selection_order_trades_relevance_for_diversity() -> None:
+    relevance = np.array([1.0, 0.95, 0.6])
+    similarities = np.array([[1.0, 0.99, 0.1], [0.99, 1.0, 0.1], [0.1, 0.1, 1.0]])
+
+    assert maximal_marginal_relevance(relevance, similarities, 3, lambda_mult=1.0) == [0, 1, 2]
+    assert maximal_marginal_relevance(relevance, similarities, 3, lambda_mult=0.5) == [0, 2, 1]
+    assert maximal_marginal_relevance(relevance, similarities, 5, lambda_mult=0.5) == [0, 2, 1]
+
+
+def test_mmr_rerank_drops_near_duplicates() -> None:
+    query = np.random.default_rng(0).standard_normal(DIMENSIONS)
+    documents = clustered_documents(query)
+
+    reranked = mmr_rerank(documents, query.tolist(), top=3, lambda_mult=0.3, vector_field=MMR_VECTOR_FIELD)
+
+    # only one of the near duplicates, returned in the order of the search results
+    assert paths(reranked)[0] == "document-0" and paths(reranked)[1:] in [["document-3", "document-4"],
+                                                                          ["document-3", "document-5"],
+                                                                          ["document-4", "document-5"]]
+    assert paths(mmr_rerank(documents, query.tolist(), 3, 1.0, MMR_VECTOR_FIELD)) == \
+        ["document-0", "document-1", "document-2"]
+
+
+def test_mmr_rerank_without_query_vector_uses_the_search_scores() -> None:
+    documents = clustered_documents(np.random.default_rng(0).standard_normal(DIMENSIONS))
+
+    reranked = mmr_rerank(documents, None, top=3, lambda_mult=0.3, vector_field=MMR_VECTOR_FIELD)
+
+    # the less relevant documents are equally redundant, the higher scored ones are selected
+    assert paths(reranked) == ["document-0", "document-3", "document-4"]
+
+
+def test_mmr_rerank_without_vectors() -> None:
+    documents = [{"path": f"document-{i}.md", "@search.score": 1.0} for i in range(5)]
+
+    assert mmr_rerank(documents, [1.0, 0.0], 3, 0.5, MMR_VECTOR_FIELD) == documents[:3]
+    assert mmr_rerank(documents[:2], [1.0, 0.0], 3, 0.5, MMR_VECTOR_FIELD) == documents[:2]
+
+
+def test_documents_without_vector_are_not_redundant() -> None:
+    documents = [{"path": "document-0.md", MMR_VECTOR_FIELD: [1.0, 0.0]},
+                 {"path": "document-1.md", MMR_VECTOR_FIELD: [1.0, 0.0]},
+                 {"path": "document-2.md", MMR_VECTOR_FIELD: None},
+                 {"path": "document-3.md", MMR_VECTOR_FIELD: [0.0, 1.0]}]
+
+    reranked = mmr_rerank(documents, [1.0, 0.0], top=3, lambda_mult=0.4, vector_field=MMR_VECTOR_FIELD)
+
+    assert paths(reranked) == ["document-0", "document-2", "document-3"]
+
+
+def search_settings(top: int, mmr_lambda: Optional[float]) -> SearchSettings:
+    return SearchSettings(vector_search="user query", text_search="off", semantic_search=False,
+                          semantic_configuration_name=None, top=top, vector_fields=[MMR_VECTOR_FIELD], k=top,
+                          scoring_profile_name=None, temperature_kb_query=0.0, mmr_lambda=mmr_lambda)
+
+
+def test_search_service_reranks_the_over_fetched_results(mock_config: Dict[str, str]) -> None:
+    llm = create_llm(mock_config)
+    # documents around the embedding of the query by the mock service
+    documents = clustered_documents(np.asarray(llm.embedding("query")["data"][0]["embedding"]))
+    search = SearchService(LocalSearchBackend(documents, vector_fields=[MMR_VECTOR_FIELD]), llm)
+
+    plain = search.search("query", None, search_settings(top=3, mmr_lambda=None))
+    reranked = search.search("query", None, search_settings(top=3, mmr_lambda=0.3))
+
+    assert paths(plain.documents) == ["document-0", "document-1", "document-2"]
+    assert len(reranked.documents) == 3
+    assert len({"document-0", "document-1", "document-2"} & set(paths(reranked.documents))) == 1
+    # the vectors were fetched for the reranking only
+    assert all(MMR_VECTOR_FIELD not in document for document in reranked.documents)
+    assert reranked.span.find(MMR_SPAN_NAME).attributes["candidates"] == len(documents)
@@ -0,0 +1,76 @@
+import asyncio
+from typing import Any, Dict
+
+import pytest
+from fastapi.testclient import TestClient
+
+import rag.mock.openai_api
+from rag.api.server import create_app
+from rag.api.sessions import InMemorySessionStore
+from rag.core.chatbot import GENERATE_SUB_QUESTIONS_NAME
+from rag.core.models.chat_transaction import ChatTransaction
+from rag.utils.config import create_chatbot
+from rag.utils.settings_file import parse_settings
+
+QUERY = "How do the capitals of Canada and Australia differ in size?"
+
+
+@pytest.fixture
+def multi_query_settings(settings: Dict[str, Any]) -> Dict[str, Any]:
+    settings["pipeline"].update(multi_query=True, num_sub_questions=2)
+    return settings
+
+
+def assert_multi_query(chat_transaction: ChatTransaction) -> None:
+    assert GENERATE_SUB_QUESTIONS_NAME in [c.name for c in chat_transaction.completion_transactions]
+    assert len(chat_transaction.search_transactions) > 1
+    assert chat_transaction.get_documents()
+    assert chat_transaction.response
+
+
+def run_stream(stream: Any) -> ChatTransaction:
+    while True:
+        try:
+            next(stream)
+        except StopIteration as stop:
+            return stop.value
+
+
+def test_multi_query_chat(mock_config: Dict[str, str], multi_query_settings: Dict[str, Any]) -> None:
+    search_settings, pipeline_settings, prompts = parse_settings(multi_query_settings)
+    chatbot = create_chatbot(mock_config)
+    chatbot.set_prompts(prompts)
+
+    assert_multi_query(chatbot.chat(QUERY, search_settings, pipeline_settings))
+    assert_multi_query(asyncio.run(chatbot.achat(QUERY, search_settings, pipeline_settings)))
+    assert_multi_query(run_stream(chatbot.chat_stream(QUERY, search_settings, pipeline_settings)))
+
+
+def test_multi_query_api(mock_config: Dict[str, str], multi_query_settings: Dict[str, Any]) -> None:
+    app = create_app(create_chatbot(mock_config), InMemorySessionStore(), multi_query_settings)
+    with TestClient(app) as client:
+        session_id = client.post("/sessions").json()["session_id"]
+
+        response = client.post(f"/sessions/{session_id}/chat", json={"query": QUERY})
+        assert response.status_code == 200
+        assert response.json()["latency"][GENERATE_SUB_QUESTIONS_NAME] is not None
+
+        response = client.post(f"/sessions/{session_id}/chat/stream", json={"query": QUERY})
+        assert response.status_code == 200
+        assert "event: done" in response.text
+        assert "event: error" not in response.text
+
+
+def test_malformed_sub_questions_fall_back_to_query(mock_config: Dict[str, str],
+                                                    multi_query_settings: Dict[str, Any],
+                                                    monkeypatch: pytest.MonkeyPatch) -> None:
+    # the mock answers the sub-questions prompt with plain text instead of json
+    monkeypatch.setattr(rag.mock.openai_api, "JSON_KEYS", ["rephrased", "search_expression"])
+    search_settings, pipeline_settings, prompts = parse_settings(multi_query_settings)
+    chatbot = create_chatbot(mock_config)
+    chatbot.set_prompts(prompts)
+
+    chat_transaction = chatbot.chat(QUERY, search_settings, pipeline_settings)
+
+    assert [t.text_query for t in chat_transaction.search_transactions] == [QUERY]
+    assert chat_transaction.response
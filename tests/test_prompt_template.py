@@ -0,0 +1,92 @@
+import string
+from typing import Any, Dict, List
+
+import pytest
+
+import rag.mock.openai_api
+from rag.core.context import format_context
+from rag.core.prompts import DEFAULT_PROMPTS, RAG_PROMPT_NAME, REPHRASE_USER_QUERY_PROMPT_NAME
+from rag.utils.config import create_chatbot
+from rag.utils.prompt_pair import PromptTemplate
+from rag.utils.settings_file import parse_prompt, parse_settings
+
+VALUES = {"context": '[{"source": "a.md", "text": "{not a field}"}]', "query": "What is RAG?", "number": 3.14159,
+          "count": 7, "empty": ""}
+
+
+@pytest.mark.parametrize("template", ["Documents: {}", "Documents: {0}", "Documents: {context[0]}",
+                                      "Documents: {context.real}", "Documents: {context:{width}}"])
+def test_unsupported_fields_are_rejected(template: str) -> None:
+    with pytest.raises(ValueError, match="Unsupported"):
+        PromptTemplate(template)
+    with pytest.raises(ValueError, match="Unsupported"):
+        parse_prompt(RAG_PROMPT_NAME, {"system_prompt": template})
+
+
+def test_default_prompts_are_valid_overrides() -> None:
+    for prompt_name, prompt_pair in DEFAULT_PROMPTS.items():
+        parse_prompt(prompt_name, {"system_prompt": prompt_pair.system_prompt, "user_prompt": prompt_pair.user_prompt})
+
+
+def test_user_prompt_fields_are_checked() -> None:
+    with pytest.raises(ValueError, match="Unsupported"):
+        parse_prompt(REPHRASE_USER_QUERY_PROMPT_NAME, {"system_prompt": "Rephrase the query.",
+                                                       "user_prompt": "{chat_history} {0}"})
+
+
+@pytest.mark.parametrize("template", [
+    "",
+    "No fields at all.",
+    "{context}",
+    "Documents: {context}\\nQuery: {query}",
+    "Repeated {query} and {query} again",
+    "{query}{count}{empty}{number}",
+    "Literal braces {{like this}} around {query} and a JSON example {{\"a\": 1}}",
+    "Specs: {number:.2f} {count:>5} {query:^20} {count:05d}",
+    "Conversions: {query!r} {count!s} {query!a} {query!r:>30}",
+    "Unicode: \u00e4\u00f6\u00fc {query} \u2713",
+])
+def test_renders_like_str_format(template: str) -> None:
+    assert PromptTemplate(template).format(**VALUES) == template.format(**VALUES)
+
+
+def test_default_prompts_render_like_str_format() -> None:
+    # the user prompt is rendered if there is one, the system prompt is sent as it is then (e.g. with JSON examples)
+    for prompt_pair in DEFAULT_PROMPTS.values():
+        prompt = prompt_pair.user_prompt or prompt_pair.system_prompt
+        values = {field: f"<{field}>" for _, field, _, _ in string.Formatter().parse(prompt) if field}
+        assert PromptTemplate(prompt).format(**values) == prompt.format(**values)
+
+
+@pytest.mark.parametrize("template", ["Unbalanced {context", "Unbalanced context}", "{context!x}"])
+def test_invalid_templates_are_rejected_like_str_format(template: str) -> None:
+    with pytest.raises(ValueError):
+        template.format(**VALUES)
+    # already when the template is compiled, not with the first request
+    with pytest.raises(ValueError):
+        PromptTemplate(template)
+
+
+def test_missing_values_raise_a_key_error() -> None:
+    with pytest.raises(KeyError, match="query"):
+        PromptTemplate("{context} {query}").format(context="documents")
+
+
+def test_chatbot_renders_the_rag_prompt_override(mock_config: Dict[str, str], settings: Dict[str, Any],
+                                                 monkeypatch: pytest.MonkeyPatch) -> None:
+    template = "Answer {{in JSON}} from these documents only: {context!s:>10}"
+    settings["prompts"] = {RAG_PROMPT_NAME: {"system_prompt": template}}
+    search_settings, pipeline_settings, prompts = parse_settings(settings)
+    chatbot = create_chatbot(mock_config)
+    chatbot.set_prompts(prompts)
+    system_messages: List[str] = []
+    mock_response = rag.mock.openai_api.mock_response
+
+    def recording_response(messages: List[Dict[str, str]], completion_tokens: int) -> str:
+        system_messages.append(messages[0]["content"])
+        return mock_response(messages, completion_tokens)
+
+    monkeypatch.setattr(rag.mock.openai_api, "mock_response", recording_response)
+    chat_transaction = chatbot.chat("What is RAG?", search_settings, pipeline_settings)
+
+    assert system_messages[-1] == template.format(context=format_context(chat_transaction.context.documents))
@@ -0,0 +1,80 @@
+from typing import Any, Dict
+
+import pytest
+from fastapi.testclient import TestClient
+
+from rag.api.server import create_app
+from rag.api.sessions import InMemorySessionStore
+from rag.core.prompts import RAG_PROMPT_NAME
+from rag.utils.config import create_chatbot, create_llm, create_response_cache, create_search_service, load_config
+from rag.utils.settings_file import parse_settings
+from rag.utils.prompt_pair import PromptPair
+
+QUERY = "What is RAG?"
+FOLLOW_UP = "And why?"
+
+
+@pytest.fixture
+def cache_config(mock_config: Dict[str, str], monkeypatch: pytest.MonkeyPatch) -> Dict[str, str]:
+    monkeypatch.setenv("RESPONSE_CACHE_THRESHOLD", "0.95")
+    return load_config()
+
+
+def test_sessions_share_the_response_cache(cache_config: Dict[str, str], settings: Dict[str, Any]) -> None:
+    search_settings, pipeline_settings, prompts = parse_settings(settings)
+    llm = create_llm(cache_config)
+    search = create_search_service(cache_config, llm)
+    response_cache = create_response_cache(cache_config)
+    first, second, other_prompts = [create_chatbot(cache_config, llm=llm, search=search, response_cache=response_cache)
+                                    for _ in range(3)]
+    for chatbot in [first, second, other_prompts]:
+        chatbot.set_prompts(prompts)
+
+    assert not first.chat(QUERY, search_settings, pipeline_settings).cached
+    # another session changing its prompts does not drop the responses of the others
+    other_prompts.set_prompts({**prompts, RAG_PROMPT_NAME: PromptPair("Answer with {context}.")})
+    assert second.chat(QUERY, search_settings, pipeline_settings).cached
+    assert not other_prompts.chat(QUERY, search_settings, pipeline_settings).cached
+
+
+def test_pipeline_settings_are_part_of_the_cache_key(cache_config: Dict[str, str], settings: Dict[str, Any]) -> None:
+    chatbot = create_chatbot(cache_config)
+    search_settings, pipeline_settings, prompts = parse_settings(settings)
+    chatbot.set_prompts(prompts)
+    assert not chatbot.chat(QUERY, search_settings, pipeline_settings).cached
+    chatbot.reset()
+
+    pipeline_settings.rag_temperature = 0.5
+    assert not chatbot.chat(QUERY, search_settings, pipeline_settings).cached
+
+
+def test_follow_up_without_rephrasing_bypasses_the_cache(cache_config: Dict[str, str],
+                                                         settings: Dict[str, Any]) -> None:
+    search_settings, pipeline_settings, prompts = parse_settings(settings)
+    response_cache = create_response_cache(cache_config)
+    first, second = [create_chatbot(cache_config, response_cache=response_cache) for _ in range(2)]
+    for chatbot in [first, second]:
+        chatbot.set_prompts(prompts)
+    assert not second.chat(QUERY, search_settings, pipeline_settings).cached
+
+    # the raw follow-up depends on the history, so it is neither served from the cache nor stored
+    first.chat(QUERY, search_settings, pipeline_settings)
+    lookups = response_cache.hits + response_cache.misses
+    assert not first.chat(FOLLOW_UP, search_settings, pipeline_settings).cached
+    assert response_cache.hits + response_cache.misses == lookups
+    second.reset()
+    assert not second.chat(FOLLOW_UP, search_settings, pipeline_settings).cached
+
+
+def test_invalidate_endpoint_drops_cached_responses(cache_config: Dict[str, str], settings: Dict[str, Any]) -> None:
+    with TestClient(create_app(create_chatbot(cache_config), InMemorySessionStore(), settings)) as client:
+        session_ids = [client.post("/sessions").json()["session_id"] for _ in range(3)]
+        assert not client.post(f"/sessions/{session_ids[0]}/chat", json={"query": QUERY}).json()["cached"]
+        assert client.post(f"/sessions/{session_ids[1]}/chat", json={"query": QUERY}).json()["cached"]
+
+        assert client.post("/cache/invalidate").status_code == 200
+        assert not client.post(f"/sessions/{session_ids[2]}/chat", json={"query": QUERY}).json()["cached"]
+
+
+def test_chatbots_without_shared_cache_have_their_own(cache_config: Dict[str, str]) -> None:
+    assert create_chatbot(cache_config).response_cache is not create_chatbot(cache_config).response_cache
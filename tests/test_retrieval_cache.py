@@ -0,0 +1,189 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List
+
+import pytest
+
+from rag.core import retrieval_cache as retrieval_cache_module
+from rag.core.retrieval_cache import RetrievalCache, retrieval_key
+from rag.utils.config import create_chatbot
+from rag.utils.search_settings import SearchSettings
+from rag.utils.settings_file import parse_settings
+
+DOCUMENTS = [{"path": "document.md", "content": "text", "@search.score": 1.0}]
+
+
+class CountingSearch:
+    """Search function returning `DOCUMENTS` that blocks until released, to let other searches queue up."""
+
+    def __init__(self) -> None:
+        self.calls = 0
+        self.started = threading.Event()
+        self.release = threading.Event()
+
+    def __call__(self) -> List[Dict[str, Any]]:
+        self.calls += 1
+        self.started.set()
+        assert self.release.wait(5)
+        return DOCUMENTS
+
+
+def wait_until(condition: Callable[[], bool], timeout: float = 5.0) -> None:
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.001)
+
+
+def test_retrieval_key_depends_on_the_request_only(settings: Dict[str, Any]) -> None:
+    search_settings = SearchSettings(**settings["search"])
+    key = retrieval_key("mock", "query", [0.1, 0.2], search_settings)
+
+    assert key == retrieval_key("mock", "query", [0.1, 0.2], SearchSettings(**{**settings["search"],
+                                                                               "temperature_kb_query": 1.0}))
+    assert key != retrieval_key("local", "query", [0.1, 0.2], search_settings)
+    assert key != retrieval_key("mock", "other query", [0.1, 0.2], search_settings)
+    assert key != retrieval_key("mock", "query", [0.1, 0.3], search_settings)
+    assert key != retrieval_key("mock", "query", None, search_settings)
+    for name, value in [("top", 8), ("vector_fields", ["titleVector"]), ("select_fields", ["path"])]:
+        assert key != retrieval_key("mock", "query", [0.1, 0.2], SearchSettings(**{**settings["search"],
+                                                                                   name: value}))
+
+
+def test_caches_results_by_key() -> None:
+    cache = RetrievalCache()
+    searches: List[str] = []
+
+    def search() -> List[Dict[str, Any]]:
+        searches.append("search")
+        return DOCUMENTS
+
+    assert cache.get_or_search("a", search) == (DOCUMENTS, False)
+    documents, cached = cache.get_or_search("a", search)
+    # the cached list is not handed out, callers may reorder or extend their copy
+    assert (documents, cached) == (DOCUMENTS, True) and documents is not DOCUMENTS
+    cache.get_or_search("b", search)
+
+    assert len(searches) == 2
+    assert cache.get_metrics() == {"entries": 2, "hits": 1, "misses": 2, "coalesced": 0}
+
+
+def test_evicts_the_least_recently_used_and_expired_entries(monkeypatch: pytest.MonkeyPatch) -> None:
+    now = [1000.0]
+    monkeypatch.setattr(retrieval_cache_module.time, "time", lambda: now[0])
+    cache = RetrievalCache(max_entries=2, ttl_seconds=60)
+    for key in ["a", "b"]:
+        cache.get_or_search(key, lambda: DOCUMENTS)
+
+    cache.get_or_search("a", lambda: DOCUMENTS)
+    cache.get_or_search("c", lambda: DOCUMENTS)
+    assert cache.get_or_search("a", lambda: [])[1] is True
+    assert cache.get_or_search("b", lambda: [])[1] is False
+
+    now[0] += 61
+    assert cache.get_or_search("a", lambda: [])[1] is False
+
+
+def test_coalesces_concurrent_searches() -> None:
+    cache = RetrievalCache()
+    search = CountingSearch()
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        first = executor.submit(cache.get_or_search, "key", search)
+        assert search.started.wait(5)
+        others = [executor.submit(cache.get_or_search, "key", search) for _ in range(3)]
+        wait_until(lambda: cache.get_metrics()["coalesced"] == 3)
+        search.release.set()
+        results = [future.result() for future in [first] + others]
+
+    assert search.calls == 1
+    assert results == [(DOCUMENTS, False)] + [(DOCUMENTS, True)] * 3
+
+
+def test_coalesces_async_and_sync_searches() -> None:
+    cache = RetrievalCache()
+    search = CountingSearch()
+
+    async def asearch() -> List[Dict[str, Any]]:
+        return await asyncio.to_thread(search)
+
+    async def run() -> List[Any]:
+        first = asyncio.create_task(cache.aget_or_search("key", asearch))
+        await asyncio.to_thread(search.started.wait, 5)
+        waiters = [asyncio.create_task(cache.aget_or_search("key", asearch)) for _ in range(2)]
+        sync_waiter = asyncio.create_task(asyncio.to_thread(cache.get_or_search, "key", search))
+        while cache.get_metrics()["coalesced"] < 3:
+            await asyncio.sleep(0.001)
+        search.release.set()
+        return await asyncio.gather(first, *waiters, sync_waiter)
+
+    results = asyncio.run(run())
+
+    assert search.calls == 1
+    assert [cached for _, cached in results] == [False, True, True, True]
+
+
+def test_failed_searches_are_raised_to_all_waiters_and_not_cached() -> None:
+    cache = RetrievalCache()
+    search = CountingSearch()
+
+    def failing_search() -> List[Dict[str, Any]]:
+        search()
+        raise RuntimeError("search failed")
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        first = executor.submit(cache.get_or_search, "key", failing_search)
+        assert search.started.wait(5)
+        other = executor.submit(cache.get_or_search, "key", failing_search)
+        wait_until(lambda: cache.get_metrics()["coalesced"] == 1)
+        search.release.set()
+        for future in [first, other]:
+            with pytest.raises(RuntimeError, match="search failed"):
+                future.result()
+
+    assert cache.get_metrics()["entries"] == 0
+    assert cache.get_or_search("key", lambda: DOCUMENTS) == (DOCUMENTS, False)
+
+
+def test_invalidate_drops_entries_and_results_in_flight() -> None:
+    cache = RetrievalCache()
+    cache.get_or_search("cached", lambda: DOCUMENTS)
+    search = CountingSearch()
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        in_flight = executor.submit(cache.get_or_search, "in flight", search)
+        assert search.started.wait(5)
+        cache.invalidate()
+        search.release.set()
+        assert in_flight.result() == (DOCUMENTS, False)
+
+    assert cache.get_metrics()["entries"] == 0
+    assert cache.get_or_search("cached", lambda: [])[1] is False
+    assert cache.get_or_search("in flight", lambda: [])[1] is False
+
+
+def test_chatbot_searches_repeated_queries_once(mock_config: Dict[str, str], settings: Dict[str, Any],
+                                                monkeypatch: pytest.MonkeyPatch) -> None:
+    search_settings, pipeline_settings, prompts = parse_settings(settings)
+    chatbot = create_chatbot(mock_config)
+    chatbot.set_prompts(prompts)
+    backend = chatbot.search.backend
+    searches: List[str] = []
+
+    def search(text_query: Any, vector: Any, search_settings: SearchSettings) -> List[Dict[str, Any]]:
+        searches.append(text_query)
+        return type(backend).search(backend, text_query, vector, search_settings)
+
+    monkeypatch.setattr(backend, "search", search)
+    chat_transactions = []
+    for invalidate in [False, False, True]:
+        if invalidate:
+            chatbot.search.invalidate_cache()
+        chatbot.reset()  # the same query in a new conversation
+        chat_transactions.append(chatbot.chat("What is RAG?", search_settings, pipeline_settings))
+
+    assert searches == ["What is RAG?"] * 2
+    assert [t.search_transactions[0].cached for t in chat_transactions] == [False, True, False]
+    assert chat_transactions[1].get_documents() == chat_transactions[0].get_documents()
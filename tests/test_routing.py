@@ -0,0 +1,224 @@
+import asyncio
+import json
+from pathlib import Path
+from typing import Any, Dict, List, Set
+
+import openai
+import pytest
+from fastapi.testclient import TestClient
+
+from rag.api.server import create_app
+from rag.api.sessions import InMemorySessionStore
+from rag.core.chatbot import GENERATE_RESPONSE_NAME, KNOWLEDGE_BASE_QUERY_NAME
+from rag.core.llm import LLM
+from rag.core.routing import StageRoute, load_routes
+from rag.evaluation.batch import BatchRunner, Conversation
+from rag.evaluation.benchmark import BenchmarkRunner
+from rag.mock.openai_api import MockChatCompletion, rate_limit_error
+from rag.mock.profile import MockProfile
+from rag.utils.config import AZURE_OPEN_AI_CHAT_DEPLOYMENT, MODEL_ROUTES_PATH, create_chatbot, create_llm
+from rag.utils.settings_file import parse_settings
+
+CHAT_DEPLOYMENT = "chat-deployment"
+RESPONSE_DEPLOYMENT = "response-deployment"
+FALLBACK_DEPLOYMENT = "fallback-deployment"
+
+
+@pytest.fixture
+def routed_chatbot(mock_config: Dict[str, str]) -> Any:
+    chatbot = create_chatbot(mock_config)
+    chatbot.routes = {GENERATE_RESPONSE_NAME: StageRoute(deployment_name=RESPONSE_DEPLOYMENT)}
+    return chatbot
+
+
+@pytest.fixture
+def deployments(routed_chatbot: Any, monkeypatch: pytest.MonkeyPatch) -> List[str]:
+    """Records the deployments of the chat requests to the mock service (installed by `create_chatbot`)."""
+    chat_completion = openai.ChatCompletion
+    deployments = []
+
+    def create(deployment_id: str, **kwargs: Any) -> Any:
+        deployments.append(deployment_id)
+        return type(chat_completion).create(chat_completion, deployment_id, **kwargs)
+
+    async def acreate(deployment_id: str, **kwargs: Any) -> Any:
+        deployments.append(deployment_id)
+        return await type(chat_completion).acreate(chat_completion, deployment_id, **kwargs)
+
+    monkeypatch.setattr(chat_completion, "create", create)
+    monkeypatch.setattr(chat_completion, "acreate", acreate)
+    return deployments
+
+
+def test_copy_keeps_routes(routed_chatbot: Any) -> None:
+    copy = routed_chatbot.copy()
+
+    assert copy.routes == routed_chatbot.routes
+    assert copy.llm is routed_chatbot.llm and copy.search is routed_chatbot.search
+    assert copy.response_cache is routed_chatbot.response_cache
+    assert not copy.memory.turns
+
+
+def test_batch_runner_uses_routes(routed_chatbot: Any, settings: Dict[str, Any], deployments: List[str]) -> None:
+    search_settings, pipeline_settings, prompts = parse_settings(settings)
+
+    BatchRunner(routed_chatbot, search_settings, pipeline_settings, prompts).run([Conversation("1", ["What is RAG?"])])
+
+    assert RESPONSE_DEPLOYMENT in deployments
+
+
+def test_benchmark_uses_routes(routed_chatbot: Any, settings: Dict[str, Any], deployments: List[str]) -> None:
+    search_settings, pipeline_settings, prompts = parse_settings(settings)
+
+    BenchmarkRunner(routed_chatbot, search_settings, pipeline_settings, prompts).run_level(
+        [Conversation("1", ["What is RAG?"])], concurrency=1)
+
+    assert RESPONSE_DEPLOYMENT in deployments
+
+
+def test_api_uses_routes(routed_chatbot: Any, settings: Dict[str, Any], deployments: List[str]) -> None:
+    with TestClient(create_app(routed_chatbot, InMemorySessionStore(), settings)) as client:
+        session_id = client.post("/sessions").json()["session_id"]
+        assert client.post(f"/sessions/{session_id}/chat", json={"query": "What is RAG?"}).status_code == 200
+
+    assert RESPONSE_DEPLOYMENT in deployments
+
+
+class ChatRequests:
+    """Arguments of the chat requests to the mock service, requests to the `throttled` deployments are rate limited."""
+
+    def __init__(self) -> None:
+        self.requests: List[Dict[str, Any]] = []
+        self.throttled: Set[str] = set()
+
+    def record(self, deployment_id: str, kwargs: Dict[str, Any]) -> None:
+        self.requests.append({"deployment_id": deployment_id, **kwargs})
+        if deployment_id in self.throttled:
+            raise rate_limit_error(MockProfile.from_dict({}))
+
+    def get_deployments(self) -> List[str]:
+        return [request["deployment_id"] for request in self.requests]
+
+
+@pytest.fixture
+def chat_requests(mock_config: Dict[str, str], monkeypatch: pytest.MonkeyPatch) -> ChatRequests:
+    """Patches the mock service class, since every client created with the config installs a new instance."""
+    mock_config[AZURE_OPEN_AI_CHAT_DEPLOYMENT] = CHAT_DEPLOYMENT
+    chat_requests = ChatRequests()
+    create, acreate = MockChatCompletion.create, MockChatCompletion.acreate
+
+    def recording_create(self: MockChatCompletion, deployment_id: str, **kwargs: Any) -> Any:
+        chat_requests.record(deployment_id, kwargs)
+        return create(self, deployment_id, **kwargs)
+
+    async def recording_acreate(self: MockChatCompletion, deployment_id: str, **kwargs: Any) -> Any:
+        chat_requests.record(deployment_id, kwargs)
+        return await acreate(self, deployment_id, **kwargs)
+
+    monkeypatch.setattr(MockChatCompletion, "create", recording_create)
+    monkeypatch.setattr(MockChatCompletion, "acreate", recording_acreate)
+    return chat_requests
+
+
+def chat(llm: LLM, mode: str, route: StageRoute) -> Any:
+    if mode == "achat":
+        return asyncio.run(llm.achat("system", "user", max_tokens=100, route=route))
+    if mode == "stream":
+        stream = llm.chat_stream("system", "user", max_tokens=100, route=route)
+        while True:
+            try:
+                next(stream)
+            except StopIteration as stop:
+                return stop.value
+    return llm.chat("system", "user", max_tokens=100, route=route)
+
+
+@pytest.mark.parametrize("mode", ["chat", "achat", "stream"])
+def test_route_overrides_the_request(mock_config: Dict[str, str], chat_requests: ChatRequests, mode: str) -> None:
+    llm = create_llm(mock_config)
+    llm.request_timeout = 30.0
+
+    chat(llm, mode, StageRoute(deployment_name=RESPONSE_DEPLOYMENT, max_tokens=50, request_timeout=5.0))
+    chat(llm, mode, StageRoute(max_tokens=20))
+    chat(llm, mode, None)
+
+    assert [(r["deployment_id"], r["max_tokens"], r["request_timeout"]) for r in chat_requests.requests] == \
+        [(RESPONSE_DEPLOYMENT, 50, 5.0), (CHAT_DEPLOYMENT, 20, 30.0), (CHAT_DEPLOYMENT, 100, 30.0)]
+
+
+@pytest.mark.parametrize("mode", ["chat", "achat", "stream"])
+def test_throttled_requests_go_to_the_fallback_deployment(mock_config: Dict[str, str], chat_requests: ChatRequests,
+                                                          mode: str) -> None:
+    chat_requests.throttled.add(RESPONSE_DEPLOYMENT)
+    llm = create_llm(mock_config)
+
+    completion_transaction = chat(llm, mode, StageRoute(deployment_name=RESPONSE_DEPLOYMENT,
+                                                        fallback_deployment_name=FALLBACK_DEPLOYMENT))
+
+    assert chat_requests.get_deployments() == [RESPONSE_DEPLOYMENT, FALLBACK_DEPLOYMENT]
+    assert completion_transaction.span.attributes["fallback_deployment"] == FALLBACK_DEPLOYMENT
+    assert completion_transaction.span.attributes["deployment"] == RESPONSE_DEPLOYMENT
+    assert completion_transaction.get_response()
+
+
+def test_client_fallback_applies_to_routes_without_one(mock_config: Dict[str, str],
+                                                       chat_requests: ChatRequests) -> None:
+    chat_requests.throttled.add(CHAT_DEPLOYMENT)
+    llm = create_llm(mock_config)
+    llm.fallback_deployment_name = FALLBACK_DEPLOYMENT
+
+    llm.chat("system", "user", route=StageRoute(max_tokens=20))
+
+    assert chat_requests.get_deployments() == [CHAT_DEPLOYMENT, FALLBACK_DEPLOYMENT]
+
+
+def test_fallback_is_not_used_for_other_errors(mock_config: Dict[str, str], chat_requests: ChatRequests,
+                                               monkeypatch: pytest.MonkeyPatch) -> None:
+    llm = create_llm(mock_config)
+    llm.scheduler = None
+    record = chat_requests.record
+
+    def record_invalid(deployment_id: str, kwargs: Dict[str, Any]) -> None:
+        record(deployment_id, kwargs)
+        raise openai.error.InvalidRequestError("Bad request", param=None)
+
+    monkeypatch.setattr(chat_requests, "record", record_invalid)
+    with pytest.raises(openai.error.InvalidRequestError):
+        llm.chat("system", "user", route=StageRoute(fallback_deployment_name=FALLBACK_DEPLOYMENT))
+
+    assert chat_requests.get_deployments() == [CHAT_DEPLOYMENT]
+
+
+def test_chatbot_routes_each_stage(mock_config: Dict[str, str], settings: Dict[str, Any],
+                                   chat_requests: ChatRequests, tmp_path: Path) -> None:
+    routes_path = tmp_path / "routes.json"
+    routes_path.write_text(json.dumps({KNOWLEDGE_BASE_QUERY_NAME: {"deployment_name": "kb-deployment",
+                                                                   "max_tokens": 64},
+                                       GENERATE_RESPONSE_NAME: {"deployment_name": RESPONSE_DEPLOYMENT}}),
+                           encoding="utf-8")
+    mock_config[MODEL_ROUTES_PATH] = str(routes_path)
+    settings["search"]["text_search"] = "kb query"
+    search_settings, pipeline_settings, prompts = parse_settings(settings)
+    chatbot = create_chatbot(mock_config)
+    chatbot.set_prompts(prompts)
+
+    chat_transaction = chatbot.chat("What is RAG?", search_settings, pipeline_settings)
+
+    deployments = {t.name: t.span.attributes["deployment"] for t in chat_transaction.completion_transactions}
+    assert deployments == {KNOWLEDGE_BASE_QUERY_NAME: "kb-deployment", GENERATE_RESPONSE_NAME: RESPONSE_DEPLOYMENT}
+    assert (chat_requests.requests[0]["deployment_id"], chat_requests.requests[0]["max_tokens"]) == \
+        ("kb-deployment", 64)
+
+
+def test_load_routes(tmp_path: Path) -> None:
+    routes_path = tmp_path / "routes.json"
+    routes_path.write_text(json.dumps({GENERATE_RESPONSE_NAME: {"deployment_name": RESPONSE_DEPLOYMENT,
+                                                                "fallback_deployment_name": FALLBACK_DEPLOYMENT}}),
+                           encoding="utf-8")
+
+    routes = load_routes(str(routes_path))
+
+    assert list(routes) == [GENERATE_RESPONSE_NAME]
+    assert vars(routes[GENERATE_RESPONSE_NAME]) == {"deployment_name": RESPONSE_DEPLOYMENT, "max_tokens": None,
+                                                    "request_timeout": None,
+                                                    "fallback_deployment_name": FALLBACK_DEPLOYMENT}
@@ -0,0 +1,154 @@
+import asyncio
+import time
+from typing import Any, Dict, List
+
+import openai
+import pytest
+
+from rag.core import scheduler as scheduler_module
+from rag.core.models.span import Span
+from rag.core.scheduler import Priority, RequestScheduler, get_retry_after
+from rag.mock.openai_api import rate_limit_error
+from rag.mock.profile import MockProfile
+
+
+@pytest.fixture
+def delays(monkeypatch: pytest.MonkeyPatch) -> List[float]:
+    """Records the backoff delays instead of sleeping, the jitter always draws the maximum delay."""
+    recorded: List[float] = []
+    monkeypatch.setattr(scheduler_module.random, "uniform", lambda a, b: b)
+    monkeypatch.setattr(scheduler_module.time, "sleep", recorded.append)
+    return recorded
+
+
+def failing(errors: List[Exception], result: Any = "ok") -> Any:
+    """Returns a request that raises the errors one after the other and then returns the result."""
+    errors = list(errors)
+
+    def request() -> Any:
+        if errors:
+            raise errors.pop(0)
+        return result
+    return request
+
+
+def service_unavailable() -> Exception:
+    return openai.error.ServiceUnavailableError("Mock service unavailable", http_status=503)
+
+
+def test_retries_transient_errors_with_exponential_backoff(delays: List[float]) -> None:
+    scheduler = RequestScheduler(max_retries=3, backoff_base=0.5, backoff_max=1.5)
+
+    with Span("Completion") as span:
+        result = scheduler.run(failing([service_unavailable()] * 3), cost=1, span=span)
+
+    assert result == "ok"
+    assert delays == [0.5, 1.0, 1.5]
+    assert span.attributes["retries"] == 3
+    assert scheduler.get_metrics()["retries"] == 3 and scheduler.get_metrics()["failures"] == 0
+
+
+def test_gives_up_after_max_retries(delays: List[float]) -> None:
+    scheduler = RequestScheduler(max_retries=2)
+
+    with pytest.raises(openai.error.ServiceUnavailableError):
+        scheduler.run(failing([service_unavailable()] * 3), cost=1)
+
+    assert len(delays) == 2
+    assert scheduler.get_metrics()["failures"] == 1
+
+
+def test_does_not_retry_client_errors(delays: List[float]) -> None:
+    scheduler = RequestScheduler()
+
+    with pytest.raises(openai.error.InvalidRequestError):
+        scheduler.run(failing([openai.error.InvalidRequestError("Bad request", param=None)]), cost=1)
+
+    assert delays == []
+    assert scheduler.get_metrics()["retries"] == 0 and scheduler.get_metrics()["failures"] == 1
+
+
+def test_retries_server_side_api_errors(delays: List[float]) -> None:
+    scheduler = RequestScheduler()
+
+    assert scheduler.run(failing([openai.error.APIError("Internal error", http_status=500)]), cost=1) == "ok"
+    with pytest.raises(openai.error.APIError):
+        scheduler.run(failing([openai.error.APIError("Conflict", http_status=409)]), cost=1)
+
+
+@pytest.mark.parametrize("headers, expected", [
+    ({"retry-after-ms": "250"}, 0.25),
+    ({"retry-after": "2"}, 2.0),
+    ({"retry-after-ms": "250", "retry-after": "2"}, 0.25),
+    ({"retry-after": "Wed, 21 Oct 2015 07:28:00 GMT"}, None),
+    ({}, None),
+])
+def test_get_retry_after(headers: Dict[str, str], expected: Any) -> None:
+    error = openai.error.RateLimitError("Rate limited", http_status=429, headers=headers)
+
+    assert get_retry_after(error) == expected
+
+
+def test_retry_after_pauses_all_requests() -> None:
+    scheduler = RequestScheduler(backoff_base=0.01)
+    profile = MockProfile.from_dict({"retry_after_ms": 200})
+    throttled = asyncio.Event()
+
+    async def request() -> str:
+        if not throttled.is_set():
+            throttled.set()
+            raise rate_limit_error(profile)
+        return "ok"
+
+    async def other_request() -> float:
+        await throttled.wait()
+        start = time.monotonic()
+        await scheduler.aacquire(1, Priority.BACKGROUND)
+        return time.monotonic() - start
+
+    async def run() -> List[Any]:
+        return await asyncio.gather(scheduler.arun(request, cost=1), other_request())
+
+    result, other_wait = asyncio.run(run())
+
+    assert result == "ok"
+    # the other request was not throttled itself, it waits for the Retry-After of the throttled one
+    assert other_wait >= 0.19
+    assert scheduler.get_metrics()["rate_limited"] == 1
+
+
+def test_throttled_request_runs_the_fallback_instead_of_retrying(delays: List[float]) -> None:
+    scheduler = RequestScheduler()
+    profile = MockProfile.from_dict({"retry_after_ms": 10_000})
+
+    result = scheduler.run(failing([rate_limit_error(profile)]), cost=1, fallback=failing([], "fallback"))
+
+    assert result == "fallback"
+    assert delays == [0.0]
+    assert scheduler.get_metrics()["fallbacks"] == 1
+
+
+def test_serves_waiting_requests_by_priority() -> None:
+    # an empty bucket refilled with 10 requests per second, so all requests are queued before the first one starts
+    scheduler = RequestScheduler(requests_per_minute=600)
+    scheduler.request_bucket.level = 0
+    order: List[Priority] = []
+
+    async def request(priority: Priority) -> None:
+        await scheduler.aacquire(1, priority)
+        order.append(priority)
+
+    async def run() -> None:
+        await asyncio.gather(request(Priority.BACKGROUND), request(Priority.BATCH), request(Priority.INTERACTIVE))
+
+    asyncio.run(run())
+
+    assert order == [Priority.INTERACTIVE, Priority.BATCH, Priority.BACKGROUND]
+
+
+def test_token_bucket_delays_requests_beyond_the_budget() -> None:
+    scheduler = RequestScheduler(tokens_per_minute=600)
+
+    assert scheduler.acquire(600) < 0.05
+    # the bucket refills at 10 tokens per second
+    assert scheduler.acquire(2) >= 0.15
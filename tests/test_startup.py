@@ -0,0 +1,75 @@
+import os
+from pathlib import Path
+from typing import Dict, List
+
+import pytest
+
+from rag.utils.import_profile import get_total_us, profile_imports, run_importtime
+
+SRC_PATH = Path(__file__).resolve().parent.parent / "src"
+# modules imported by app.py before the first page is rendered (see profile_startup.py)
+APP_MODULES = ["streamlit", "rag.ui.chat", "rag.ui.settings", "rag.utils.config"]
+# SDKs that are only loaded when the first client is created
+DEFERRED_PACKAGES = ["openai", "azure", "aiohttp", "requests", "dotenv", "pyarrow"]
+
+
+@pytest.fixture(autouse=True)
+def python_path(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Lets the interpreters started by the import profile import the package from the source directory."""
+    monkeypatch.setenv("PYTHONPATH", os.pathsep.join([str(SRC_PATH), os.environ.get("PYTHONPATH", "")]))
+
+
+def imported_packages(modules: List[str]) -> List[str]:
+    return sorted({t.get_package() for t in profile_imports(modules)})
+
+
+def test_app_startup_does_not_import_the_sdks() -> None:
+    pytest.importorskip("streamlit")
+
+    assert not set(imported_packages(APP_MODULES)) & set(DEFERRED_PACKAGES)
+
+
+@pytest.mark.parametrize("module, deferred", [
+    ("rag.utils.config", DEFERRED_PACKAGES),
+    ("rag.core.scheduler", DEFERRED_PACKAGES),
+    ("rag.core.clients", DEFERRED_PACKAGES),
+    # the pipeline needs the openai library, the results are written with pyarrow only at the end
+    ("rag.evaluation.batch", ["azure", "pyarrow"]),
+])
+def test_modules_defer_the_sdk_imports(module: str, deferred: List[str]) -> None:
+    packages = imported_packages([module])
+
+    assert "rag" in packages
+    assert not set(packages) & set(deferred)
+
+
+def test_run_importtime_reports_the_import_tree() -> None:
+    import_times = run_importtime("import json")
+
+    json_time = next(t for t in import_times if t.module == "json")
+    assert json_time.depth == 0 and json_time.cumulative_us >= json_time.self_us
+    assert any(t.module == "json.decoder" and t.depth > 0 for t in import_times)
+    assert get_total_us(import_times) >= json_time.cumulative_us
+
+
+def test_profile_imports_excludes_the_interpreter_startup() -> None:
+    import_times = profile_imports(["json"])
+
+    assert "json" in [t.module for t in import_times]
+    assert "encodings" not in [t.module for t in import_times]
+
+
+def test_run_importtime_fails_on_errors() -> None:
+    with pytest.raises(RuntimeError, match="missing_module"):
+        run_importtime("import missing_module")
+
+
+def test_sdks_are_imported_with_the_first_client(mock_config: Dict[str, str]) -> None:
+    # the mock backends are configured by the environment of the fixture, which the interpreter inherits
+    code = "; ".join(["import sys",
+                      "from rag.utils.config import create_chatbot, load_config",
+                      "assert 'openai' not in sys.modules",
+                      "create_chatbot(load_config())",
+                      "assert 'openai' in sys.modules"])
+
+    assert "openai" in [t.module for t in run_importtime(code)]
@@ -0,0 +1,53 @@
+from typing import Any, Dict, List
+
+from rag.core.chatbot import GENERATE_RESPONSE_NAME
+from rag.core.models.span import Span
+from rag.utils.config import create_chatbot
+from rag.utils.settings_file import parse_settings
+
+
+class RecordingExporter:
+    def __init__(self) -> None:
+        self.spans: List[Span] = []
+
+    def export(self, span: Span) -> None:
+        self.spans.append(span)
+
+
+def create_streaming_chatbot(mock_config: Dict[str, str], settings: Dict[str, Any]) -> Any:
+    search_settings, pipeline_settings, prompts = parse_settings(settings)
+    chatbot = create_chatbot(mock_config)
+    chatbot.set_prompts(prompts)
+    chatbot.span_exporter = RecordingExporter()
+    return chatbot, chatbot.chat_stream("What is RAG?", search_settings, pipeline_settings)
+
+
+def test_closed_stream_ends_and_exports_span(mock_config: Dict[str, str], settings: Dict[str, Any]) -> None:
+    chatbot, stream = create_streaming_chatbot(mock_config, settings)
+
+    assert next(stream)
+    stream.close()
+
+    [span] = chatbot.span_exporter.spans
+    assert span.end_time_ns is not None
+    assert span.attributes["incomplete"] is True
+    assert not chatbot.memory.turns
+
+
+def test_exhausted_stream_exports_span_once(mock_config: Dict[str, str], settings: Dict[str, Any]) -> None:
+    chatbot, stream = create_streaming_chatbot(mock_config, settings)
+
+    deltas = []
+    while True:
+        try:
+            deltas.append(next(stream))
+        except StopIteration as stop:
+            chat_transaction = stop.value
+            break
+
+    assert chat_transaction.response == "".join(deltas)
+    [span] = chatbot.span_exporter.spans
+    assert "incomplete" not in span.attributes
+    assert GENERATE_RESPONSE_NAME in [child.name for child in span.children]
+    assert all(child.end_time_ns is not None for child in span.children)
+    assert chatbot.memory.turns
@@ -0,0 +1,23 @@
+from types import SimpleNamespace
+from typing import Iterator
+
+import pytest
+
+from rag.core import tokens
+
+
+@pytest.fixture
+def clear_encoding() -> Iterator[None]:
+    tokens.get_encoding.cache_clear()
+    yield
+    tokens.get_encoding.cache_clear()
+
+
+def test_failed_encoding_download_falls_back_to_estimate(clear_encoding: None, monkeypatch: pytest.MonkeyPatch) -> None:
+    def get_encoding(name: str) -> None:
+        raise ConnectionError(f"cannot download {name}")
+
+    monkeypatch.setattr(tokens, "tiktoken", SimpleNamespace(get_encoding=get_encoding))
+
+    assert tokens.get_encoding() is None
+    assert tokens.count_tokens("x" * 40) == 40 // tokens.CHARACTERS_PER_TOKEN
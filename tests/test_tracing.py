@@ -0,0 +1,67 @@
+import json
+from pathlib import Path
+from typing import Any, Dict
+
+import pytest
+
+from rag.core.chatbot import GENERATE_RESPONSE_NAME, KNOWLEDGE_BASE_QUERY_NAME
+from rag.core.models.chat_transaction import CHAT_SPAN_NAME
+from rag.core.models.span import Span
+from rag.core.search import EMBEDDING_SPAN_NAME, SEARCH_REQUEST_SPAN_NAME, SEARCH_SPAN_NAME
+from rag.utils.config import create_chatbot, load_config
+from rag.utils.settings_file import parse_settings
+
+STAGES = [KNOWLEDGE_BASE_QUERY_NAME, SEARCH_SPAN_NAME, EMBEDDING_SPAN_NAME, SEARCH_REQUEST_SPAN_NAME,
+          GENERATE_RESPONSE_NAME]
+
+
+@pytest.fixture
+def trace_path(mock_config: Dict[str, str], tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Path:
+    path = tmp_path / "traces.jsonl"
+    monkeypatch.setenv("TRACE_EXPORT_PATH", str(path))
+    return path
+
+
+def test_stages_are_recorded_as_nested_spans(trace_path: Path, settings: Dict[str, Any]) -> None:
+    settings["search"]["text_search"] = "kb query"
+    search_settings, pipeline_settings, prompts = parse_settings(settings)
+    chatbot = create_chatbot(load_config())
+    chatbot.set_prompts(prompts)
+
+    chat_transaction = chatbot.chat("What is RAG?", search_settings, pipeline_settings)
+
+    root = chat_transaction.span
+    assert root.name == CHAT_SPAN_NAME
+    for name in STAGES:
+        assert chat_transaction.get_latency(name) is not None, name
+    for _, span in root.walk():
+        assert span.end_time_ns is not None
+        assert all(child.get_duration() <= span.get_duration() for child in span.children)
+
+
+def test_chat_spans_are_exported_as_otlp(trace_path: Path, settings: Dict[str, Any]) -> None:
+    search_settings, pipeline_settings, prompts = parse_settings(settings)
+    chatbot = create_chatbot(load_config())
+    chatbot.set_prompts(prompts)
+
+    for query in ["What is RAG?", "And why?"]:
+        chatbot.chat(query, search_settings, pipeline_settings)
+
+    traces = [json.loads(line) for line in trace_path.read_text(encoding="utf-8").splitlines()]
+    assert len(traces) == 2
+    spans = traces[0]["resourceSpans"][0]["scopeSpans"][0]["spans"]
+    [root] = [span for span in spans if "parentSpanId" not in span]
+    assert root["name"] == CHAT_SPAN_NAME
+    span_ids = {span["spanId"] for span in spans}
+    assert all(span["parentSpanId"] in span_ids for span in spans if span is not root)
+    assert {span["traceId"] for span in spans} == {root["traceId"]}
+    assert GENERATE_RESPONSE_NAME in [span["name"] for span in spans]
+
+
+def test_failed_operation_is_recorded_on_its_span() -> None:
+    with pytest.raises(RuntimeError):
+        with Span("Search") as span:
+            raise RuntimeError("service unavailable")
+
+    assert span.end_time_ns is not None
+    assert "service unavailable" in span.attributes["error"]
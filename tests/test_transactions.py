@@ -0,0 +1,41 @@
+from typing import Any, Dict
+
+import pytest
+
+from rag.core.context import format_context
+from rag.core.models.completion_transaction import CONTEXT_REFERENCE
+from rag.core.models.search_transaction import is_vector
+from rag.core.prompts import KNOWLEDGE_BASE_QUERY_PROMPT_NAME
+from rag.utils.config import create_chatbot
+from rag.utils.settings_file import parse_settings
+
+
+def test_compacted_messages_share_the_prompts_of_the_chatbot(mock_config: Dict[str, str],
+                                                             settings: Dict[str, Any]) -> None:
+    settings["search"]["text_search"] = "kb query"
+    search_settings, pipeline_settings, prompts = parse_settings(settings)
+    chatbot = create_chatbot(mock_config)
+    chatbot.set_prompts(prompts)
+
+    chat_transaction = chatbot.chat("What is RAG?", search_settings, pipeline_settings)
+
+    kb_query_messages = chat_transaction.completion_transactions[0].messages
+    assert kb_query_messages[0]["content"] is prompts[KNOWLEDGE_BASE_QUERY_PROMPT_NAME].system_prompt
+    assert set(chat_transaction.completion_transactions[0].completion) == {"model", "choices", "usage"}
+
+
+@pytest.mark.parametrize("prefix_stable_layout", [False, True])
+def test_compacted_response_generation_references_the_documents(mock_config: Dict[str, str], settings: Dict[str, Any],
+                                                                prefix_stable_layout: bool) -> None:
+    settings["pipeline"]["prefix_stable_layout"] = prefix_stable_layout
+    search_settings, pipeline_settings, prompts = parse_settings(settings)
+    chatbot = create_chatbot(mock_config)
+    chatbot.set_prompts(prompts)
+
+    chat_transaction = chatbot.chat("What is RAG?", search_settings, pipeline_settings)
+
+    documents = chat_transaction.context.documents
+    assert documents and not any(is_vector(value) for document in documents for value in document.values())
+    contents = [message["content"] for message in chat_transaction.completion_transactions[-1].messages]
+    assert sum(CONTEXT_REFERENCE in content for content in contents) == 1
+    assert not any(format_context(documents[:1])[1:-1] in content for content in contents)
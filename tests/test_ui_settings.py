@@ -0,0 +1,21 @@
+from streamlit.testing.v1 import AppTest
+
+from rag.core.prompts import DEFAULT_PROMPTS
+
+
+def render_prompt_settings() -> None:
+    from rag.ui.settings import display_prompt_settings
+    display_prompt_settings()
+
+
+def test_prompt_settings_render_all_default_prompts() -> None:
+    app = AppTest.from_function(render_prompt_settings).run()
+
+    assert not app.exception
+    expected = [pair.system_prompt for pair in DEFAULT_PROMPTS.values()] \
+        + [pair.user_prompt for pair in DEFAULT_PROMPTS.values() if pair.user_prompt]
+    assert sorted(text_area.value for text_area in app.text_area) == sorted(expected)
+    for prompt_name, prompt_pair in DEFAULT_PROMPTS.items():
+        assert app.text_area(key=f"{prompt_name}_system").value == prompt_pair.system_prompt
+        if prompt_pair.user_prompt:
+            assert app.text_area(key=f"{prompt_name}_user").value == prompt_pair.user_prompt